@@ -1,24 +1,71 @@
-import multiprocessing
-from config import app, socketio, ProcessManager, ThreadPoolManager, ResourceMonitor
+import sys
+import time
+
+# Tiempo de cada fase del arranque (python app.py --startup-report)
+_startup_phases = []
+_phase_started = time.perf_counter()
+
+def _mark_phase(name):
+    global _phase_started
+    now = time.perf_counter()
+    _startup_phases.append((name, now - _phase_started))
+    _phase_started = now
+
+from config import app, socketio, get_process_manager, get_thread_pool, get_resource_monitor
+_mark_phase('config (Flask, SQLAlchemy, SocketIO, logging)')
 
 # Importar todos los módulos para registrar las rutas y funcionalidades
 import models
-import routes  
+_mark_phase('models')
+import routes
+_mark_phase('routes')
 import utils
+_mark_phase('utils (SocketIO, tareas, sistema)')
+import changes
+import metrics
+import compression
+import assets
+import schema
+_mark_phase('changes, metrics, compression, assets, schema')
+
+# Arranque liviano: solo se verifica la versión del esquema (python schema.py upgrade aplica las migraciones)
+with app.app_context():
+    schema.check_schema()
+_mark_phase('verificación del esquema')
+
+def startup_report():
+    """Imprime el desglose del arranque en frío y la latencia de la primera petición"""
+    client = app.test_client()
+    started = time.perf_counter()
+    status = client.get('/').status_code
+    first_request = time.perf_counter() - started
+
+    total = sum(elapsed for _, elapsed in _startup_phases)
+    print(f"{'fase':<48} {'ms':>9}")
+    print('-' * 58)
+    for name, elapsed in _startup_phases:
+        print(f"{name:<48} {elapsed * 1000:>9.1f}")
+    print('-' * 58)
+    print(f"{'total importando app.py':<48} {total * 1000:>9.1f}")
+    print(f"{f'primera petición (GET / -> {status})':<48} {first_request * 1000:>9.1f}")
+
+    # Subsistemas que se crean en el primer uso, no al arrancar
+    process_manager = get_process_manager()
+    thread_pool = get_thread_pool()
+    print(f"\npool de procesos ({process_manager.max_workers} workers): {'creado' if process_manager.is_started() else 'diferido'}")
+    print(f"pool de hilos ({thread_pool.max_workers} workers): {'creado' if thread_pool.is_started() else 'diferido'}")
 
 if __name__ == '__main__':
+    if '--startup-report' in sys.argv:
+        startup_report()
+        sys.exit(0)
+
     # Configurar multiprocessing para Windows
+    import multiprocessing
     multiprocessing.freeze_support()
-    
-    # Inicializar gestores de concurrencia y asignar a variables globales en utils
-    utils.process_manager = ProcessManager()
-    utils.thread_pool = ThreadPoolManager()
-    utils.resource_monitor = ResourceMonitor()
-    
-    # Iniciar monitoreo de recursos (desactivado temporalmente)
-    # utils.resource_monitor.start_monitoring()
-    
-    print("Gestores de concurrencia inicializados correctamente")
-    
+
+    # Los pools de procesos e hilos se crean en el primer uso; el monitoreo arranca con el servidor
+    get_resource_monitor().start_monitoring()
+
     # Iniciar el servidor
     socketio.run(app, debug=True, host='0.0.0.0', port=5002)
@@ -0,0 +1,196 @@
+"""Estáticos con huella de contenido (fingerprinting)
+
+`python assets.py build` copia cada archivo de frontend/static a
+static/dist/ con un hash del contenido en el nombre (css/style.css ->
+dist/css/style.3f2a1b9c0d.css) y escribe el manifiesto con la
+correspondencia. Las plantillas referencian los estáticos con
+asset_url('css/style.css'), que devuelve la versión con huella si hay
+manifiesto y el archivo original si no (desarrollo sin build).
+
+Como el nombre cambia cuando cambia el contenido, los archivos de dist/ se
+sirven con Cache-Control inmutable de un año: el navegador no vuelve a pedirlos
+hasta el próximo despliegue que los modifique.
+
+Uso:
+    python assets.py build              # huellas + variantes .gz/.br (compression.py)
+    python assets.py build --minify     # además minifica JS/CSS si rjsmin/rcssmin están instalados
+    python assets.py build --no-compress
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+from flask import request, url_for
+from config import app
+from compression import STATIC_ENCODINGS, build_static
+
+DIST_DIR = 'dist'
+
+_manifest = None
+
+def manifest_path():
+    return app.config.get('ASSET_MANIFEST') or os.path.join(app.static_folder, DIST_DIR, 'manifest.json')
+
+def load_manifest():
+    """Lee el manifiesto del último build; vacío si no hay (se sirven los originales)"""
+    global _manifest
+    try:
+        with open(manifest_path(), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    except ValueError as e:
+        app.logger.error(f"Manifiesto de estáticos inválido, se usan los originales: {str(e)}")
+        manifest = {}
+    _manifest = manifest
+    return manifest
+
+def asset_url(filename):
+    """URL de un estático, con huella si está en el manifiesto"""
+    manifest = _manifest if _manifest is not None else load_manifest()
+    return url_for('static', filename=manifest.get(filename, filename))
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+@app.after_request
+def _immutable_assets(response):
+    filename = (request.view_args or {}).get('filename', '') if request.endpoint == 'static' else ''
+    if filename.startswith(DIST_DIR + '/') and response.status_code in (200, 304):
+        max_age = app.config.get('ASSET_MAX_AGE', 365 * 24 * 3600)
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    return response
+
+# Build
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+def _fingerprint(relpath, data):
+    digest = hashlib.sha256(data).hexdigest()[:app.config.get('ASSET_HASH_LENGTH', 10)]
+    base, extension = posixpath.splitext(relpath)
+    return posixpath.join(DIST_DIR, f"{base}.{digest}{extension}")
+
+def _rewrite_css(relpath, text, manifest):
+    """Apunta los url() relativos de un CSS a la versión con huella (o al original si no está en el build)"""
+    hashed_dir = posixpath.dirname(posixpath.join(DIST_DIR, relpath))
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('/', '#', 'data:')) or '://' in target:
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', target).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(relpath), path))
+        new_target = posixpath.relpath(manifest.get(resolved, resolved), hashed_dir)
+        return f"url({quote}{new_target}{suffix}{quote})"
+
+    return _CSS_URL.sub(replace, text)
+
+def _minifiers(log):
+    minifiers = {}
+    try:
+        import rjsmin
+        minifiers['.js'] = rjsmin.jsmin
+    except ImportError:
+        log("  rjsmin no instalado: los JS se copian sin minificar")
+    try:
+        import rcssmin
+        minifiers['.css'] = rcssmin.cssmin
+    except ImportError:
+        log("  rcssmin no instalado: los CSS se copian sin minificar")
+    return minifiers
+
+def build_assets(minify=False, compress=True, log=print):
+    """Genera dist/ y el manifiesto. Conserva los archivos del build anterior para páginas ya servidas"""
+    static_folder = app.static_folder
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    skipped = tuple(extension for _, extension in STATIC_ENCODINGS) + ('.gitignore',)
+    minifiers = _minifiers(log) if minify else {}
+
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist_folder)
+        for name in sorted(files):
+            if not name.endswith(skipped):
+                sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+
+    # Los CSS al final: sus url() apuntan a imágenes que ya deben tener huella
+    sources.sort(key=lambda relpath: relpath.endswith('.css'))
+
+    previous = load_manifest()
+    manifest = {}
+    original_size = built_size = 0
+    for relpath in sources:
+        with open(os.path.join(static_folder, relpath), 'rb') as f:
+            data = f.read()
+        original_size += len(data)
+        extension = posixpath.splitext(relpath)[1]
+        if extension == '.css':
+            data = _rewrite_css(relpath, data.decode('utf-8'), manifest).encode('utf-8')
+        if extension in minifiers:
+            data = minifiers[extension](data.decode('utf-8')).encode('utf-8')
+        built_size += len(data)
+
+        hashed = _fingerprint(relpath, data)
+        target = os.path.join(static_folder, hashed)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+        manifest[relpath] = hashed
+        log(f"  {relpath} -> {hashed}")
+
+    # Borrar builds más viejos que el anterior (y sus variantes comprimidas)
+    keep = set(manifest.values()) | set(previous.values())
+    removed = 0
+    for root, _, files in os.walk(dist_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            for _, extension in STATIC_ENCODINGS:
+                if relpath.endswith(extension):
+                    relpath = relpath[:-len(extension)]
+            if relpath not in keep and not path.startswith(manifest_path()):
+                os.remove(path)
+                removed += 1
+
+    os.makedirs(os.path.dirname(manifest_path()), exist_ok=True)
+    tmp_path = manifest_path() + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path())
+    load_manifest()
+
+    log(f"{len(manifest)} archivos con huella ({original_size:,} -> {built_size:,} bytes), {removed} viejos eliminados")
+    if compress:
+        build_static(log=log)
+    return manifest
+
+def clean_assets(log=print):
+    dist_folder = os.path.join(app.static_folder, DIST_DIR)
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+    if os.path.exists(manifest_path()):
+        os.remove(manifest_path())
+    load_manifest()
+    log("Build de estáticos eliminado")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Generar los estáticos con huella y el manifiesto')
+    build_parser.add_argument('--minify', action='store_true', help='Minificar JS/CSS (requiere rjsmin/rcssmin)')
+    build_parser.add_argument('--no-compress', action='store_true', help='No generar variantes .gz/.br')
+    subparsers.add_parser('clean', help='Eliminar dist/ y el manifiesto')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_assets(minify=args.minify, compress=not args.no_compress)
+    else:
+        clean_assets()
+
+if __name__ == '__main__':
+    main()
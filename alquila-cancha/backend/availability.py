@@ -0,0 +1,116 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import threading
+from config import app, socketio
+from models import Booking
+
+def court_room(court_id, booking_date):
+    """Nombre de la sala de disponibilidad de una cancha para un día"""
+    return f"court_{court_id}_{booking_date}"
+
+def _slot(booking):
+    return (booking.court_id, booking.booking_date, booking.start_time, booking.end_time)
+
+class SlotUpdateCoalescer:
+    """Agrupa los cambios de ocupación por sala y los emite una vez por ventana"""
+
+    def __init__(self, window=None):
+        self.window = window or app.config.get('SLOT_UPDATE_WINDOW', 0.15)
+        self._pending = {}  # sala -> {'court_id', 'date', 'added': set, 'removed': set}
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'changes': 0, 'emits': 0}
+
+    def push(self, changes):
+        """Registra cambios confirmados: (court_id, fecha, inicio, fin, ocupado)"""
+        with self._lock:
+            for court_id, booking_date, start_time, end_time, occupied in changes:
+                room = court_room(court_id, booking_date)
+                entry = self._pending.setdefault(room, {
+                    'court_id': court_id,
+                    'date': booking_date,
+                    'added': set(),
+                    'removed': set()
+                })
+                interval = (start_time, end_time)
+                # Un alta y una baja del mismo horario en la misma ventana se anulan
+                if occupied:
+                    if interval in entry['removed']:
+                        entry['removed'].discard(interval)
+                    else:
+                        entry['added'].add(interval)
+                else:
+                    if interval in entry['added']:
+                        entry['added'].discard(interval)
+                    else:
+                        entry['removed'].add(interval)
+                self.stats['changes'] += 1
+
+            if not self.running:
+                self.running = True
+                socketio.start_background_task(self._run)
+
+    def _run(self):
+        while self.running:
+            socketio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                app.logger.error(f"Error emitiendo disponibilidad: {str(e)}")
+
+    def flush(self):
+        """Emite un único mensaje por sala con los cambios acumulados"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for room, entry in pending.items():
+            if not entry['added'] and not entry['removed']:
+                continue
+            socketio.emit('slot_update', {
+                'court_id': entry['court_id'],
+                'date': entry['date'].strftime('%Y-%m-%d'),
+                'added': [[s.strftime('%H:%M'), e.strftime('%H:%M')] for s, e in sorted(entry['added'])],
+                'removed': [[s.strftime('%H:%M'), e.strftime('%H:%M')] for s, e in sorted(entry['removed'])]
+            }, room=room)
+            self.stats['emits'] += 1
+
+slot_updates = SlotUpdateCoalescer()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_slot_changes(session, flush_context):
+    """Detecta altas, bajas y cancelaciones de reservas en cada flush"""
+    changes = []
+
+    for obj in session.new:
+        if isinstance(obj, Booking) and obj.status != 'cancelled':
+            changes.append(_slot(obj) + (True,))
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            history = inspect(obj).attrs.status.history
+            status = history.deleted[0] if history.deleted else obj.status
+            if status != 'cancelled':
+                changes.append(_slot(obj) + (False,))
+
+    for obj in session.dirty:
+        if isinstance(obj, Booking):
+            history = inspect(obj).attrs.status.history
+            if not history.deleted:
+                continue
+            was_active = history.deleted[0] != 'cancelled'
+            is_active = obj.status != 'cancelled'
+            if was_active != is_active:
+                changes.append(_slot(obj) + (is_active,))
+
+    if changes:
+        session.info.setdefault('slot_changes', []).extend(changes)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_slot_changes(session):
+    changes = session.info.pop('slot_changes', None)
+    if changes:
+        slot_updates.push(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_slot_changes(session):
+    session.info.pop('slot_changes', None)
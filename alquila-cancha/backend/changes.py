@@ -0,0 +1,97 @@
+from flask import request, session, jsonify
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from config import app, db
+from models import User, Court, Booking, Payment, ChangeLog
+from routes import login_required
+from read_routing import read_only
+import serializers
+
+def compact_change_log(retention=None):
+    """Elimina entradas reemplazadas por otra más reciente del mismo recurso y las más antiguas que la retención
+
+    La ejecuta el trabajo programado expiry_sweep (jobs.py), fuera de las peticiones.
+    """
+    retention = retention or app.config.get('CHANGE_LOG_RETENTION', 7 * 24 * 3600)
+    table = ChangeLog.__table__
+
+    latest_per_resource = db.select(func.max(table.c.id)).group_by(table.c.resource_type, table.c.resource_id)
+    superseded = db.session.execute(table.delete().where(table.c.id.not_in(latest_per_resource))).rowcount
+
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    expired = db.session.execute(table.delete().where(table.c.timestamp < cutoff)).rowcount
+
+    db.session.commit()
+    return {'superseded': superseded, 'expired': expired}
+
+@app.route('/api/changes', methods=['GET'])
+@read_only
+@login_required
+def get_changes():
+    """Devuelve las filas de reservas, canchas, usuarios y pagos modificadas desde un cursor"""
+    since = request.args.get('since', type=int)
+    limit = max(1, min(request.args.get('limit', 1000, type=int), 5000))
+
+    oldest, latest = db.session.query(func.min(ChangeLog.id), func.max(ChangeLog.id)).one()
+    latest = latest or 0
+
+    # Sin cursor, o con uno anterior a lo compactado: el cliente debe recargar todo
+    if since is None or (oldest is not None and since < oldest - 1) or since > latest:
+        return jsonify({
+            'success': True,
+            'reset': True,
+            'cursor': latest,
+            'has_more': False,
+            'changes': {'bookings': [], 'courts': [], 'users': [], 'payments': []},
+            'deleted': {'bookings': [], 'courts': [], 'users': [], 'payments': []}
+        })
+
+    entries = db.session.query(
+        ChangeLog.id, ChangeLog.resource_type, ChangeLog.resource_id, ChangeLog.action
+    ).filter(ChangeLog.id > since).order_by(ChangeLog.id).limit(limit).all()
+
+    # Quedarse solo con la última acción de cada recurso
+    last_action = {}
+    for _, resource_type, resource_id, action in entries:
+        last_action[(resource_type, resource_id)] = action
+
+    upserted = {'booking': set(), 'court': set(), 'user': set(), 'payment': set()}
+    deleted = {'booking': set(), 'court': set(), 'user': set(), 'payment': set()}
+    for (resource_type, resource_id), action in last_action.items():
+        if resource_type in upserted:
+            (deleted if action == 'delete' else upserted)[resource_type].add(resource_id)
+
+    user = User.query.get(session['user_id'])
+    changes = {'bookings': [], 'courts': [], 'users': [], 'payments': []}
+
+    if upserted['booking']:
+        query = serializers.BOOKING.select().where(Booking.id.in_(upserted['booking']))
+        if not user.is_admin() and not user.is_operator():
+            query = query.where((Booking.user_id == user.id) | (Booking.user_name == user.username))
+        changes['bookings'] = serializers.BOOKING.all(query)
+
+    if upserted['court']:
+        changes['courts'] = serializers.COURT.all(serializers.COURT.select().where(Court.id.in_(upserted['court'])))
+
+    if upserted['user'] and user.is_admin():
+        changes['users'] = serializers.USER.all(serializers.USER.select().where(User.id.in_(upserted['user'])))
+
+    if upserted['payment']:
+        query = serializers.PAYMENT.select().where(Payment.id.in_(upserted['payment']))
+        if not user.is_admin():
+            query = query.where(Payment.user_id == user.id)
+        changes['payments'] = serializers.PAYMENT.all(query)
+
+    return jsonify({
+        'success': True,
+        'reset': False,
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': len(entries) == limit,
+        'changes': changes,
+        'deleted': {
+            'bookings': sorted(deleted['booking']),
+            'courts': sorted(deleted['court']),
+            'users': sorted(deleted['user']) if user.is_admin() else [],
+            'payments': sorted(deleted['payment'])
+        }
+    })
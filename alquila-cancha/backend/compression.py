@@ -0,0 +1,234 @@
+"""Compresión de respuestas y GET condicional
+
+- Las respuestas de texto (JSON, HTML, métricas) de más de COMPRESS_MIN_SIZE
+  bytes se comprimen con brotli (si el módulo está instalado y el cliente lo
+  acepta) o gzip.
+- Los archivos estáticos se comprimen una vez por despliegue con
+  `python compression.py build`, que deja .gz y .br junto a cada archivo; la
+  vista de estáticos sirve la variante comprimida que el cliente acepte.
+- Los GET con respuesta JSON llevan un ETag débil calculado sobre el cuerpo y
+  responden 304 si el cliente ya tiene esa versión. Los listados decorados con
+  @conditional_get calculan el validador antes de ejecutar la vista (a partir
+  de change_log o de los ids de la tabla) y responden 304 sin consultar los datos.
+- Canchas y reservas tienen columna version: el GET individual la usa como
+  ETag y los PUT con If-Match responden 412 si el registro cambió.
+
+Uso:
+    python compression.py build   # genera las variantes comprimidas de frontend/static
+    python compression.py clean   # las elimina
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+from datetime import timezone
+from functools import wraps
+from flask import request, session, make_response, send_from_directory
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from config import app, db
+from models import ChangeLog, AuditLog
+
+try:
+    import brotli
+except ImportError:
+    # brotli es opcional: sin él solo se usa gzip (los .br ya generados se siguen sirviendo)
+    brotli = None
+
+# Extensión de la variante precomprimida por codificación, en orden de preferencia
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+def _compress(data, encoding):
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def _pick_encoding():
+    if brotli is not None and _accepts('br'):
+        return 'br'
+    if _accepts('gzip'):
+        return 'gzip'
+    return None
+
+@app.after_request
+def _compress_response(response):
+    if request.method == 'GET' and response.status_code == 200 and response.is_json \
+            and not response.direct_passthrough and app.config.get('JSON_ETAGS', True):
+        # Validador sobre el cuerpo sin comprimir: débil porque cambia la codificación
+        if 'ETag' not in response.headers:
+            response.add_etag(weak=True)
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+        response.make_conditional(request)
+
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed \
+            or 'Content-Encoding' in response.headers \
+            or response.mimetype not in app.config.get('COMPRESS_MIMETYPES', ()):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < app.config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+
+    encoding = _pick_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def send_static(filename):
+    """Vista de estáticos: sirve la variante .br/.gz generada en el build si el cliente la acepta"""
+    static_folder = app.static_folder
+    source = safe_join(static_folder, filename)
+    if source and os.path.isfile(source):
+        for encoding, extension in STATIC_ENCODINGS:
+            variant = source + extension
+            if _accepts(encoding) and os.path.isfile(variant) and os.path.getmtime(variant) >= os.path.getmtime(source):
+                response = send_from_directory(
+                    static_folder, filename + extension,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    max_age=app.get_send_file_max_age(filename)
+                )
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+    return app.send_static_file(filename)
+
+app.view_functions['static'] = send_static
+
+# Validadores previos a la vista para listados (@conditional_get)
+def changes_validator(*resource_types):
+    """Último cambio registrado en change_log para los tipos de recurso dados"""
+    def validator():
+        row = db.session.query(db.func.max(ChangeLog.id), db.func.max(ChangeLog.timestamp)).filter(
+            ChangeLog.resource_type.in_(resource_types)
+        ).one()
+        return f"changes-{row[0] or 0}", row[1]
+    return validator
+
+def audit_log_validator():
+    """La auditoría solo agrega filas y la limpieza borra las más antiguas: alcanzan el primer y último id"""
+    first, last = db.session.query(db.func.min(AuditLog.id), db.func.max(AuditLog.id)).one()
+    return f"audit-{first or 0}-{last or 0}", None
+
+def conditional_get(validator):
+    """Responde 304 sin ejecutar la vista si el validador no cambió desde la versión que tiene el cliente
+
+    El validador devuelve (versión, última modificación o None). El ETag combina
+    la versión con el usuario de la sesión y la URL, porque el contenido
+    depende de ambos.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+
+            version, last_modified = validator()
+            scope = f"{version}:{session.get('user_id')}:{request.full_path}"
+            etag = hashlib.sha1(scope.encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+# Recursos versionados (columna version): ETag en GET, If-Match en PUT
+def version_etag(version):
+    return f"v{version}"
+
+def if_match_failed(version):
+    """True si la petición trae If-Match y ninguna etiqueta corresponde a la versión actual (412)"""
+    if not request.if_match:
+        return False
+    # Comparación débil: la compresión convierte el ETag en débil (W/"v3")
+    return not request.if_match.contains_weak(version_etag(version))
+
+# Build de estáticos precomprimidos
+def build_static(static_folder=None, log=print):
+    """Genera .gz (y .br si brotli está instalado) para los estáticos comprimibles"""
+    static_folder = static_folder or app.static_folder
+    extensions = app.config.get('COMPRESS_STATIC_EXTENSIONS', ())
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    encodings = [('gzip', '.gz')] + ([('br', '.br')] if brotli is not None else [])
+    totals = {'files': 0, 'original': 0, 'gzip': 0, 'br': 0}
+
+    for root, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            if os.path.splitext(name)[1] not in extensions:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+
+            totals['files'] += 1
+            totals['original'] += len(data)
+            sizes = []
+            for encoding, extension in encodings:
+                compressed = _compress_static(data, encoding)
+                if len(compressed) >= len(data):
+                    continue
+                with open(path + extension, 'wb') as f:
+                    f.write(compressed)
+                totals[encoding] += len(compressed)
+                sizes.append(f"{encoding} {len(compressed):,}")
+            log(f"  {os.path.relpath(path, static_folder)}: {len(data):,} -> {', '.join(sizes) or 'sin ganancia'}")
+
+    log(f"{totals['files']} archivos, {totals['original']:,} bytes -> gzip {totals['gzip']:,}"
+        + (f", br {totals['br']:,}" if brotli is not None else ' (brotli no instalado)'))
+    return totals
+
+def _compress_static(data, encoding):
+    # En el build se usa el nivel máximo: se comprime una vez y se sirve muchas
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def clean_static(static_folder=None, log=print):
+    static_folder = static_folder or app.static_folder
+    removed = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if name.endswith(tuple(extension for _, extension in STATIC_ENCODINGS)):
+                os.remove(os.path.join(root, name))
+                removed += 1
+    log(f"{removed} variantes comprimidas eliminadas")
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help='Generar .gz/.br de los estáticos')
+    subparsers.add_parser('clean', help='Eliminar los .gz/.br generados')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_static()
+    else:
+        clean_static()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import os
+import threading
+import uuid
+from config import app, db, socketio
+from models import User, ConnectionInvalidation
+
+class ConnectionIdentity:
+    """Identidad de una conexión SocketIO (copia liviana del usuario al conectar)"""
+    __slots__ = ('user_id', 'username', 'role', 'login_id')
+
+    def __init__(self, user_id, username, role, login_id=None):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.login_id = login_id
+
+    def is_admin(self):
+        return self.role == 'administrador'
+
+    def is_operator(self):
+        return self.role == 'operador'
+
+class ConnectionRegistry:
+    """Resuelve identidad y rol una sola vez por sid para que los eventos no consulten la base"""
+
+    def __init__(self):
+        self._by_sid = {}         # sid -> ConnectionIdentity o None (anónimo)
+        self._sids_by_user = {}   # user_id -> set(sid)
+        self._lock = threading.Lock()
+        self.stats = {'connects': 0, 'lookups': 0, 'invalidations': 0}
+
+    def register(self, sid, user, login_id=None):
+        """Guarda la identidad de la conexión (user puede ser None)"""
+        identity = ConnectionIdentity(user.id, user.username, user.role, login_id) if user else None
+        with self._lock:
+            self._by_sid[sid] = identity
+            if identity:
+                self._sids_by_user.setdefault(identity.user_id, set()).add(sid)
+            self.stats['connects'] += 1
+        return identity
+
+    def get(self, sid):
+        """Identidad cacheada de la conexión, o None si es anónima o fue invalidada"""
+        self.stats['lookups'] += 1
+        return self._by_sid.get(sid)
+
+    def remove(self, sid):
+        with self._lock:
+            identity = self._by_sid.pop(sid, None)
+            if identity:
+                sids = self._sids_by_user.get(identity.user_id)
+                if sids:
+                    sids.discard(sid)
+                    if not sids:
+                        del self._sids_by_user[identity.user_id]
+
+    def invalidate_user(self, user_id):
+        """Deja anónimas todas las conexiones del usuario (baja de la cuenta). Devuelve sus sids"""
+        with self._lock:
+            sids = list(self._sids_by_user.pop(user_id, ()))
+            for sid in sids:
+                self._by_sid[sid] = None
+            self.stats['invalidations'] += 1
+        return sids
+
+    def invalidate_login(self, login_id):
+        """Deja anónimas las conexiones abiertas desde un login (logout). Devuelve sus sids"""
+        invalidated = []
+        with self._lock:
+            for sid, identity in self._by_sid.items():
+                if identity and identity.login_id == login_id:
+                    self._by_sid[sid] = None
+                    invalidated.append(sid)
+                    sids = self._sids_by_user.get(identity.user_id)
+                    if sids:
+                        sids.discard(sid)
+                        if not sids:
+                            del self._sids_by_user[identity.user_id]
+            self.stats['invalidations'] += 1
+        return invalidated
+
+    def update_role(self, user_id, role):
+        """Aplica un cambio de rol a las conexiones abiertas del usuario. Devuelve (sid, identidad)"""
+        updated = []
+        with self._lock:
+            for sid in self._sids_by_user.get(user_id, ()):
+                identity = self._by_sid.get(sid)
+                if identity:
+                    identity.role = role
+                    updated.append((sid, identity))
+            self.stats['invalidations'] += 1
+        return updated
+
+    def active_count(self):
+        return len(self._by_sid)
+
+connection_registry = ConnectionRegistry()
+
+def _leave_private_rooms(sid, identity=None):
+    """Saca la conexión de admin_room y de las salas user_* que su identidad (o su falta) ya no permite"""
+    for room in socketio.server.rooms(sid, namespace='/'):
+        if room == 'admin_room':
+            allowed = identity is not None and identity.is_admin()
+        elif room.startswith('user_'):
+            allowed = identity is not None and (identity.is_admin() or room == f'user_{identity.user_id}')
+        else:
+            continue
+        if not allowed:
+            socketio.server.leave_room(sid, room, namespace='/')
+
+def _apply_invalidation(message):
+    """Aplica una invalidación a las conexiones de este worker"""
+    if message['kind'] == 'login':
+        for sid in connection_registry.invalidate_login(message['login_id']):
+            _leave_private_rooms(sid)
+    elif message['kind'] == 'user':
+        for sid in connection_registry.invalidate_user(message['user_id']):
+            _leave_private_rooms(sid)
+    elif message['kind'] == 'role':
+        for sid, identity in connection_registry.update_role(message['user_id'], message['role']):
+            _leave_private_rooms(sid, identity)
+
+class InvalidationFeed:
+    """Reparte logout y cambios de rol entre workers con una tabla que cada uno sondea
+
+    SocketIO solo entrega a clientes lo que llega por la cola de mensajes (un handler
+    @socketio.on no lo recibe), así que las invalidaciones van a connection_invalidation.
+    El worker que publica la aplica en el momento; los demás la leen en el siguiente
+    sondeo. Solo se usa con SOCKETIO_MESSAGE_QUEUE (varios workers).
+    """
+
+    def __init__(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval = app.config.get('CONNECTION_INVALIDATION_POLL_INTERVAL', 0.5)
+        self.last_id = None
+        self.running = False
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'received': 0}
+
+    def enabled(self):
+        return bool(app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+
+    def start(self):
+        """Empieza a sondear desde la última invalidación existente (una vez por worker)"""
+        with self._lock:
+            if self.running or not self.enabled():
+                return
+            table = ConnectionInvalidation.__table__
+            with db.engine.connect() as conn:
+                self.last_id = conn.execute(db.select(db.func.coalesce(db.func.max(table.c.id), 0))).scalar()
+            self.running = True
+        socketio.start_background_task(self._run)
+
+    def publish(self, message):
+        _apply_invalidation(message)
+        if not self.enabled():
+            return
+        table = ConnectionInvalidation.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(origin=self.origin, **message))
+        self.stats['published'] += 1
+
+    def _run(self):
+        while self.running:
+            socketio.sleep(self.poll_interval)
+            try:
+                with app.app_context():
+                    self.poll()
+            except Exception as e:
+                app.logger.error(f"Error leyendo invalidaciones de conexiones: {str(e)}")
+
+    def poll(self):
+        """Aplica a las conexiones de este worker las invalidaciones publicadas por otros"""
+        table = ConnectionInvalidation.__table__
+        with db.engine.connect() as conn:
+            rows = conn.execute(db.select(table).where(table.c.id > self.last_id).order_by(table.c.id)).all()
+        for row in rows:
+            self.last_id = row.id
+            if row.origin != self.origin:
+                _apply_invalidation({'kind': row.kind, 'login_id': row.login_id,
+                                     'user_id': row.user_id, 'role': row.role})
+                self.stats['received'] += 1
+
+invalidation_feed = InvalidationFeed()
+
+def _publish_invalidation(message):
+    try:
+        invalidation_feed.publish(message)
+    except Exception as e:
+        app.logger.error(f"Error publicando invalidación de conexiones: {str(e)}")
+
+def invalidate_login(login_id):
+    """Logout: las conexiones de ese login quedan anónimas y fuera de las salas privadas, en todos los workers"""
+    _publish_invalidation({'kind': 'login', 'login_id': login_id})
+
+def invalidate_user(user_id):
+    _publish_invalidation({'kind': 'user', 'user_id': user_id})
+
+def update_role(user_id, role):
+    _publish_invalidation({'kind': 'role', 'user_id': user_id, 'role': role})
+
+@event.listens_for(Session, 'after_flush')
+def _collect_identity_changes(session, flush_context):
+    """Detecta cambios de rol y bajas de usuarios en cada flush"""
+    changes = []
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.role.history.deleted:
+            changes.append((obj.id, obj.role))
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changes.append((obj.id, None))
+
+    if changes:
+        session.info.setdefault('identity_changes', []).extend(changes)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_identity_changes(session):
+    for user_id, role in session.info.pop('identity_changes', ()):
+        if role is None:
+            invalidate_user(user_id)
+        else:
+            update_role(user_id, role)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_changes(session):
+    session.info.pop('identity_changes', None)
@@ -0,0 +1,205 @@
+from flask import request, session, make_response, Response
+from functools import wraps
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from sqlalchemy import exc
+import hashlib
+import threading
+import time
+from config import app, db
+from models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+class IdempotencyStore:
+    """Guarda respuestas por clave de idempotencia (memoria + SQLite) con TTL
+
+    La clave se reserva insertando una fila sin respuesta (status_code NULL): la
+    clave primaria garantiza un solo dueño entre todos los procesos. El dueño
+    completa la fila con la respuesta; los reintentos esperan a que aparezca.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl or app.config.get('IDEMPOTENCY_TTL', 24 * 3600)
+        self.max_entries = max_entries or app.config.get('IDEMPOTENCY_MAX_ENTRIES', 10000)
+        self._cache = OrderedDict()  # clave -> (expira, fingerprint, status, mimetype, body)
+        self._in_flight = {}  # clave -> threading.Event (dueños de este proceso)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Obtiene una respuesta guardada o None si no existe, expiró o sigue en curso"""
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._cache.move_to_end(key)
+                    return entry
+                del self._cache[key]
+
+        # Buscar en SQLite (respuestas de otro proceso o anteriores a un reinicio)
+        table = IdempotencyRecord.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(table.c.expires_at, table.c.fingerprint, table.c.status_code,
+                          table.c.mimetype, table.c.body).where(table.c.key == key)
+            ).first()
+
+        if not row or row.status_code is None or row.expires_at <= datetime.utcnow():
+            return None
+
+        entry = (now + (row.expires_at - datetime.utcnow()).total_seconds(),
+                 row.fingerprint, row.status_code, row.mimetype, row.body)
+        self._remember(key, entry)
+        return entry
+
+    def reserve(self, key, fingerprint):
+        """Reserva la clave para esta petición. False si otra (de cualquier proceso) la tiene"""
+        now = datetime.utcnow()
+        table = IdempotencyRecord.__table__
+        values = dict(key=key, fingerprint=fingerprint, created_at=now,
+                      expires_at=now + timedelta(seconds=app.config.get('IDEMPOTENCY_PENDING_TIMEOUT', 120)))
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(**values))
+        except exc.IntegrityError:
+            # Respuesta guardada o petición en curso; solo se toma una fila vencida
+            # (reserva de un dueño caído o respuesta que expiry_sweep aún no borró)
+            with db.engine.begin() as conn:
+                taken = conn.execute(table.delete().where(
+                    table.c.key == key, table.c.expires_at <= now
+                )).rowcount
+                if not taken:
+                    return False
+                conn.execute(table.insert().values(**values))
+
+        with self._lock:
+            self._in_flight[key] = threading.Event()
+        return True
+
+    def put(self, key, fingerprint, status_code, mimetype, body):
+        """Completa la reserva con la respuesta, en SQLite y en memoria"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        table = IdempotencyRecord.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key == key).values(
+                fingerprint=fingerprint,
+                status_code=status_code,
+                mimetype=mimetype,
+                body=body,
+                expires_at=expires_at
+            ))
+        self._remember(key, (time.time() + self.ttl, fingerprint, status_code, mimetype, body))
+        # Las entradas vencidas las borra el trabajo programado expiry_sweep (jobs.py)
+
+    def release(self, key):
+        """Libera una reserva sin respuesta (error 5xx o excepción): el cliente puede reintentar"""
+        table = IdempotencyRecord.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key, table.c.status_code.is_(None)))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def wait(self, key, timeout):
+        """Espera la respuesta de la petición en curso con la misma clave; None si no llega a tiempo"""
+        deadline = time.time() + timeout
+        poll_interval = app.config.get('IDEMPOTENCY_POLL_INTERVAL', 0.1)
+        while True:
+            entry = self.get(key)
+            remaining = deadline - time.time()
+            if entry or remaining <= 0:
+                return entry
+            with self._lock:
+                event = self._in_flight.get(key)
+            # Dueño en este proceso: despierta al terminar; en otro proceso, sondeo de la base
+            if event is not None:
+                event.wait(min(remaining, 1))
+            else:
+                time.sleep(min(remaining, poll_interval))
+
+    def finish(self, key):
+        """Despierta a los reintentos de este proceso que esperan la respuesta"""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+idempotency_store = IdempotencyStore()
+
+def _request_fingerprint():
+    return hashlib.sha256(request.get_data() or b'').hexdigest()
+
+def _replay(entry):
+    response = Response(entry[4], status=entry[2], mimetype=entry[3])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _mismatch():
+    return make_response({
+        'success': False,
+        'message': 'La clave de idempotencia ya fue usada con otros datos'
+    }, 422)
+
+def idempotent(f):
+    """Responde reintentos con la misma cabecera Idempotency-Key desde la caché"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not client_key:
+            return f(*args, **kwargs)
+
+        if len(client_key) > 128:
+            return make_response({
+                'success': False,
+                'message': 'Idempotency-Key demasiado larga (máximo 128 caracteres)'
+            }, 400)
+
+        # La clave se limita al endpoint y al usuario (o IP si es anónimo)
+        scope = session.get('user_id') or request.remote_addr
+        key = f"{request.endpoint}:{scope}:{client_key}"
+        fingerprint = _request_fingerprint()
+
+        entry = idempotency_store.get(key)
+        if entry:
+            return _replay(entry) if entry[1] == fingerprint else _mismatch()
+
+        if not idempotency_store.reserve(key, fingerprint):
+            # Otra petición con la misma clave terminó o está en curso (en este u otro proceso)
+            entry = idempotency_store.wait(key, app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+            if entry:
+                return _replay(entry) if entry[1] == fingerprint else _mismatch()
+            return make_response({
+                'success': False,
+                'message': 'Hay una petición en curso con la misma Idempotency-Key'
+            }, 409)
+
+        stored = False
+        try:
+            response = make_response(f(*args, **kwargs))
+
+            # Los errores 5xx son transitorios: el cliente debe poder reintentar
+            if response.status_code < 500:
+                try:
+                    idempotency_store.put(key, fingerprint, response.status_code,
+                                          response.mimetype, response.get_data(as_text=True))
+                    stored = True
+                except Exception as e:
+                    app.logger.error(f"Error guardando respuesta idempotente: {str(e)}")
+            return response
+        finally:
+            if not stored:
+                try:
+                    # Descartar lo que el handler dejó sin confirmar: su transacción bloquearía el borrado
+                    db.session.rollback()
+                    idempotency_store.release(key)
+                except Exception as e:
+                    app.logger.error(f"Error liberando clave idempotente: {str(e)}")
+            idempotency_store.finish(key)
+    return decorated_function
@@ -0,0 +1,464 @@
+from datetime import datetime, timedelta, time as dtime
+from sqlalchemy import exc, func
+import json
+import os
+import threading
+import time
+import uuid
+from config import app, db, socketio, get_process_manager, get_thread_pool
+from config import data_integrity_check_task, statistics_calculation_task
+from models import Job, JobSchedule, IdempotencyRecord, OutboxEvent, ConnectionInvalidation, run_integrity_check
+
+# Cron de 5 campos: minuto hora día-del-mes mes día-de-la-semana (0 o 7 = domingo)
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *'
+}
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(f"Paso inválido en '{field}'")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Valor fuera de rango en '{field}' ({low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """Expresión cron de 5 campos; calcula la próxima ejecución"""
+
+    def __init__(self, expression):
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expresión cron inválida: '{expression}'")
+        self.minutes = sorted(_parse_cron_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_cron_field(fields[1], 0, 23))
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {0 if day == 7 else day for day in _parse_cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        by_day = day.day in self.days
+        by_weekday = day.isoweekday() % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return by_weekday
+        if self.any_weekday:
+            return by_day
+        # Como en cron: con ambos campos restringidos alcanza con que coincida uno
+        return by_day or by_weekday
+
+    def next_after(self, moment):
+        """Próxima ejecución estrictamente posterior a `moment`"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 8):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.combine(day, dtime(hour, minute))
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError('La expresión cron no tiene ejecuciones')
+
+# Tipos de trabajo: función, pool donde corre y límites
+class JobType:
+    __slots__ = ('name', 'func', 'executor', 'concurrency', 'max_attempts', 'priority')
+
+    def __init__(self, name, func, executor='thread', concurrency=1, max_attempts=3, priority=100):
+        self.name = name
+        self.func = func
+        self.executor = executor  # 'process' (CPU, función importable) o 'thread' (E/S, con app context)
+        self.concurrency = concurrency  # máximo en ejecución a la vez, entre todos los procesos
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+JOB_TYPES = {}
+
+def register_job_type(name, func, **options):
+    JOB_TYPES[name] = JobType(name, func, **options)
+
+def integrity_check_job():
+    """Verificación de integridad sobre la base (run_integrity_check)"""
+    result = run_integrity_check()
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'Verificación de integridad fallida'))
+    return {'issues_found': result['issues_found']}
+
+def expiry_sweep_job():
+    """Elimina datos vencidos: claves de idempotencia, change_log compactado, outbox enviado e invalidaciones"""
+    from changes import compact_change_log
+    now = datetime.utcnow()
+    idempotency = IdempotencyRecord.__table__
+    outbox = OutboxEvent.__table__
+    invalidation = ConnectionInvalidation.__table__
+    outbox_cutoff = now - timedelta(seconds=app.config.get('OUTBOX_SENT_RETENTION', 3600))
+    invalidation_cutoff = now - timedelta(seconds=app.config.get('CONNECTION_INVALIDATION_RETENTION', 3600))
+    with db.engine.begin() as conn:
+        idempotency_keys = conn.execute(idempotency.delete().where(idempotency.c.expires_at <= now)).rowcount
+        outbox_sent = conn.execute(outbox.delete().where(
+            outbox.c.status == 'sent', outbox.c.sent_at < outbox_cutoff
+        )).rowcount
+        invalidations = conn.execute(invalidation.delete().where(invalidation.c.created_at < invalidation_cutoff)).rowcount
+    return dict(compact_change_log(), idempotency_keys=idempotency_keys, outbox_sent=outbox_sent,
+                connection_invalidations=invalidations)
+
+register_job_type('data_integrity', data_integrity_check_task, executor='process')
+register_job_type('statistics', statistics_calculation_task, executor='process')
+register_job_type('integrity_check', integrity_check_job, priority=50)
+register_job_type('expiry_sweep', expiry_sweep_job, priority=200, max_attempts=1)
+
+def _run_with_app_context(func, payload):
+    with app.app_context():
+        try:
+            return func(**payload)
+        finally:
+            db.session.remove()
+
+def enqueue_job(job_type, payload=None, priority=None, run_at=None, created_by=None, schedule_name=None):
+    """Agrega un trabajo a la cola persistente y despierta al planificador. Devuelve el Job"""
+    spec = JOB_TYPES.get(job_type)
+    if spec is None:
+        raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+    job = Job(
+        job_type=job_type,
+        payload=json.dumps(payload or {}, default=str),
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=run_at or datetime.utcnow(),
+        created_by=created_by,
+        schedule_name=schedule_name
+    )
+    db.session.add(job)
+    db.session.commit()
+    job_scheduler.notify()
+    return job
+
+def cancel_job(job_id):
+    """Cancela un trabajo pendiente, o uno de este proceso que aún no empezó en el pool"""
+    table = Job.__table__
+    now = datetime.utcnow()
+    values = dict(status='cancelled', finished_at=now, claimed_by=None,
+                  expires_at=now + timedelta(seconds=job_scheduler.result_ttl))
+    with db.engine.begin() as conn:
+        if conn.execute(table.update().where(table.c.id == job_id, table.c.status == 'pending').values(**values)).rowcount:
+            return True
+    if job_scheduler.cancel_in_flight(job_id):
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id, table.c.status == 'running').values(**values))
+        return True
+    return False
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'payload': json.loads(job.payload) if job.payload else {},
+        'schedule': job.schedule_name,
+        'created_by': job.created_by,
+        'created_at': _iso(job.created_at),
+        'run_at': _iso(job.run_at),
+        'started_at': _iso(job.started_at),
+        'finished_at': _iso(job.finished_at),
+        'expires_at': _iso(job.expires_at),
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.last_error
+    }
+
+def serialize_schedule(schedule):
+    return {
+        'name': schedule.name,
+        'job_type': schedule.job_type,
+        'cron': schedule.cron,
+        'priority': schedule.priority,
+        'enabled': schedule.enabled,
+        'next_run_at': _iso(schedule.next_run_at),
+        'last_run_at': _iso(schedule.last_run_at)
+    }
+
+class JobScheduler:
+    """Ejecuta los trabajos de la tabla job por prioridad, con límites por tipo, reintentos y recurrentes"""
+
+    def __init__(self):
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 1.0)
+        self.max_running = app.config.get('JOB_MAX_RUNNING', 4)
+        self.retry_base = app.config.get('JOB_RETRY_BASE', 30)
+        self.retry_max = app.config.get('JOB_RETRY_MAX', 3600)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', 3600)
+        self.result_ttl = app.config.get('JOB_RESULT_TTL', 24 * 3600)
+        self.running = False
+        self._wakeup = False
+        self._lock = threading.Lock()
+        self._in_flight = {}  # id de trabajo -> (tipo, id en el pool, future, intento, máximo de intentos)
+        self._last_cleanup = 0
+        self.stats = {'started': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'scheduled': 0, 'evicted': 0, 'recovered': 0}
+
+    def start(self):
+        """Inicia el planificador si todavía no está corriendo"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+        socketio.start_background_task(self._run)
+
+    def stop(self):
+        self.running = False
+
+    def notify(self):
+        """Despierta al planificador después de encolar un trabajo"""
+        self._wakeup = True
+        if not self.running and app.config.get('JOB_SCHEDULER_ENABLED', True):
+            self.start()
+
+    def _run(self):
+        with app.app_context():
+            try:
+                self.sync_schedules()
+            except Exception as e:
+                app.logger.error(f"Error sincronizando trabajos recurrentes: {str(e)}")
+        last_tick = 0
+        while self.running:
+            finished = any(flight[2].done() for flight in list(self._in_flight.values()))
+            if self._wakeup or finished or time.time() - last_tick >= self.poll_interval:
+                self._wakeup = False
+                last_tick = time.time()
+                try:
+                    with app.app_context():
+                        self.tick()
+                except Exception as e:
+                    app.logger.error(f"Error en planificador de trabajos: {str(e)}")
+            socketio.sleep(0.05)
+
+    def tick(self):
+        self._collect_finished()
+        self._enqueue_due_schedules()
+        self._claim_and_start()
+        self._cleanup()
+
+    def sync_schedules(self):
+        """Crea o actualiza en job_schedule los recurrentes de JOB_SCHEDULES (conserva enabled)"""
+        table = JobSchedule.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                existing = {row.name: row for row in conn.execute(db.select(table)).all()}
+                for name, definition in app.config.get('JOB_SCHEDULES', {}).items():
+                    cron = CronSchedule(definition['cron'])
+                    values = dict(
+                        job_type=definition['job_type'],
+                        cron=definition['cron'],
+                        payload=json.dumps(definition.get('payload', {})),
+                        priority=definition.get('priority', JOB_TYPES[definition['job_type']].priority)
+                    )
+                    row = existing.get(name)
+                    if row is None:
+                        conn.execute(table.insert().values(name=name, enabled=True, next_run_at=cron.next_after(now), **values))
+                    elif (row.job_type, row.cron, row.payload, row.priority) != tuple(values.values()):
+                        conn.execute(table.update().where(table.c.name == name).values(
+                            next_run_at=cron.next_after(now), **values
+                        ))
+        except exc.IntegrityError:
+            # Otro proceso los creó al mismo tiempo
+            pass
+
+    def _enqueue_due_schedules(self):
+        schedules = JobSchedule.__table__
+        jobs = Job.__table__
+        now = datetime.utcnow()
+        with db.engine.connect() as conn:
+            due = conn.execute(db.select(schedules).where(
+                schedules.c.enabled.is_(True),
+                schedules.c.next_run_at <= now
+            )).all()
+
+        for schedule in due:
+            spec = JOB_TYPES.get(schedule.job_type)
+            if spec is None:
+                continue
+            with db.engine.begin() as conn:
+                # Solo un proceso gana el turno: el que avanza next_run_at desde el valor leído
+                won = conn.execute(schedules.update().where(
+                    schedules.c.name == schedule.name,
+                    schedules.c.next_run_at == schedule.next_run_at
+                ).values(next_run_at=CronSchedule(schedule.cron).next_after(now), last_run_at=now)).rowcount
+                if not won:
+                    continue
+                # No acumular ejecuciones si la anterior sigue pendiente o corriendo
+                active = conn.execute(db.select(func.count()).select_from(jobs).where(
+                    jobs.c.schedule_name == schedule.name,
+                    jobs.c.status.in_(['pending', 'running'])
+                )).scalar()
+                if active:
+                    continue
+                conn.execute(jobs.insert().values(
+                    job_type=schedule.job_type,
+                    payload=schedule.payload,
+                    priority=schedule.priority,
+                    max_attempts=spec.max_attempts,
+                    schedule_name=schedule.name,
+                    created_by='scheduler',
+                    run_at=now
+                ))
+                self.stats['scheduled'] += 1
+
+    def _claim_and_start(self):
+        free = self.max_running - len(self._in_flight)
+        if free <= 0:
+            return
+        table = Job.__table__
+        now = datetime.utcnow()
+        with db.engine.connect() as conn:
+            candidates = conn.execute(db.select(
+                table.c.id, table.c.job_type, table.c.payload, table.c.attempts, table.c.max_attempts
+            ).where(
+                table.c.status == 'pending',
+                table.c.run_at <= now,
+                table.c.job_type.in_(list(JOB_TYPES))
+            ).order_by(table.c.priority, table.c.run_at, table.c.id).limit(free * 4)).all()
+
+        running = table.alias('running_jobs')
+        for row in candidates:
+            if free <= 0:
+                break
+            spec = JOB_TYPES[row.job_type]
+            running_of_type = db.select(func.count()).select_from(running).where(
+                running.c.job_type == row.job_type,
+                running.c.status == 'running'
+            ).scalar_subquery()
+            with db.engine.begin() as conn:
+                # Reservar y respetar el límite por tipo en una sola sentencia
+                claimed = conn.execute(table.update().where(
+                    table.c.id == row.id,
+                    table.c.status == 'pending',
+                    running_of_type < spec.concurrency
+                ).values(
+                    status='running', claimed_by=self.token, started_at=now, attempts=table.c.attempts + 1
+                )).rowcount
+            if claimed:
+                self._start(row.id, spec, json.loads(row.payload or '{}'), row.attempts + 1, row.max_attempts)
+                free -= 1
+
+    def _start(self, job_id, spec, payload, attempt, max_attempts):
+        pool_id = f"job_{job_id}"
+        try:
+            if spec.executor == 'process':
+                manager = get_process_manager()
+                started, message = manager.start_background_task(spec.func, pool_id, **payload)
+                if not started:
+                    raise RuntimeError(message)
+                future = manager.processes[pool_id]['future']
+            else:
+                pool_id, future = get_thread_pool().submit(_run_with_app_context, spec.func, payload)
+        except Exception as e:
+            self._finish(job_id, attempt, max_attempts, error=f"No se pudo iniciar: {str(e)}")
+            return
+        self._in_flight[job_id] = (spec, pool_id, future, attempt, max_attempts)
+        self.stats['started'] += 1
+
+    def _collect_finished(self):
+        for job_id, (spec, pool_id, future, attempt, max_attempts) in list(self._in_flight.items()):
+            if not future.done():
+                continue
+            del self._in_flight[job_id]
+            # El pool de procesos solo guarda lo que está en curso; el historial queda en la tabla job
+            if spec.executor == 'process':
+                get_process_manager().processes.pop(pool_id, None)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is None:
+                self._finish(job_id, attempt, max_attempts, result=future.result())
+            else:
+                self._finish(job_id, attempt, max_attempts, error=f"{type(error).__name__}: {error}")
+
+    def _finish(self, job_id, attempt, max_attempts, result=None, error=None):
+        table = Job.__table__
+        now = datetime.utcnow()
+        if error is None:
+            values = dict(status='completed', result=json.dumps(result, default=str), last_error=None,
+                          finished_at=now, expires_at=now + timedelta(seconds=self.result_ttl))
+            self.stats['completed'] += 1
+        elif attempt < max_attempts:
+            # Reintento con espera exponencial
+            delay = min(self.retry_base * 2 ** (attempt - 1), self.retry_max)
+            values = dict(status='pending', run_at=now + timedelta(seconds=delay), last_error=error)
+            self.stats['retried'] += 1
+        else:
+            values = dict(status='failed', last_error=error, finished_at=now,
+                          expires_at=now + timedelta(seconds=self.result_ttl))
+            self.stats['failed'] += 1
+            app.logger.error(f"Trabajo {job_id} falló tras {attempt} intentos: {error}")
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id, table.c.status == 'running').values(
+                claimed_by=None, **values
+            ))
+
+    def cancel_in_flight(self, job_id):
+        flight = self._in_flight.get(job_id)
+        return bool(flight and flight[2].cancel())
+
+    def _cleanup(self):
+        """Recupera trabajos de procesos caídos y elimina los terminados cuyo TTL venció"""
+        if time.time() - self._last_cleanup < 60:
+            return
+        self._last_cleanup = time.time()
+        table = Job.__table__
+        now = datetime.utcnow()
+        stale = [
+            table.c.status == 'running',
+            table.c.claimed_by != self.token,
+            table.c.started_at < now - timedelta(seconds=self.stale_after)
+        ]
+        with db.engine.begin() as conn:
+            recovered = conn.execute(table.update().where(*stale, table.c.attempts < table.c.max_attempts).values(
+                status='pending', claimed_by=None, run_at=now, last_error='Recuperado de un proceso que no terminó'
+            )).rowcount
+            conn.execute(table.update().where(*stale).values(
+                status='failed', claimed_by=None, finished_at=now, last_error='El proceso que lo ejecutaba no terminó',
+                expires_at=now + timedelta(seconds=self.result_ttl)
+            ))
+            evicted = conn.execute(table.delete().where(
+                table.c.status.in_(['completed', 'failed', 'cancelled']),
+                table.c.expires_at < now
+            )).rowcount
+        self.stats['recovered'] += recovered
+        self.stats['evicted'] += evicted
+
+    def summary(self):
+        return dict(self.stats, running=self.running, in_flight=len(self._in_flight), max_running=self.max_running)
+
+job_scheduler = JobScheduler()
+
+@app.before_request
+def _start_job_scheduler():
+    # Arranque diferido: el planificador se inicia con la primera petición de cada proceso
+    if not job_scheduler.running and app.config.get('JOB_SCHEDULER_ENABLED', True):
+        job_scheduler.start()
@@ -0,0 +1,108 @@
+import copy
+import json
+import logging
+import os
+import queue
+import atexit
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Atributos estándar de LogRecord; el resto (extra={...}) se agrega al JSON
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'destination'}
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos pasados en extra={...}"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DestinationQueueHandler(QueueHandler):
+    """Encola el registro marcado con su destino; el listener lo entrega solo a los handlers de ese destino"""
+
+    def __init__(self, log_queue, destination):
+        super().__init__(log_queue)
+        self.destination = destination
+
+    def prepare(self, record):
+        # Mensaje y traceback se resuelven acá (los argumentos pueden cambiar después); el formato, en el listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.destination = self.destination
+        return record
+
+class _DestinationFilter(logging.Filter):
+    def __init__(self, destination):
+        super().__init__()
+        self.destination = destination
+
+    def filter(self, record):
+        return getattr(record, 'destination', None) == self.destination
+
+class LogQueue:
+    """Handlers de archivo y consola detrás de una cola: el hilo que loguea solo encola
+
+    La escritura, el formateo JSON y la rotación corren en el hilo del
+    QueueListener. Después de un fork (workers del pool de procesos) el hijo
+    arranca su propia cola y listener.
+    """
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.handlers = []
+        self.queue_handlers = []
+        self.listener = None
+
+    def add_handler(self, destination, handler):
+        handler.addFilter(_DestinationFilter(destination))
+        self.handlers.append(handler)
+
+    def attach(self, logger, destination, level=logging.NOTSET):
+        queue_handler = DestinationQueueHandler(self.queue, destination)
+        queue_handler.setLevel(level)
+        logger.addHandler(queue_handler)
+        self.queue_handlers.append(queue_handler)
+        return queue_handler
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def stop(self):
+        """Vacía la cola y detiene el listener"""
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.stop()
+
+    def _restart_in_child(self):
+        # El hilo del listener no sobrevive al fork: cola y listener nuevos
+        self.queue = queue.SimpleQueue()
+        for queue_handler in self.queue_handlers:
+            queue_handler.queue = self.queue
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+def rotating_json_handler(path, level, max_bytes, backup_count):
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(level)
+    return handler
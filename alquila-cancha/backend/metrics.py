@@ -0,0 +1,285 @@
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import deque
+import heapq
+import logging
+import random
+import re
+import threading
+import time
+from config import app
+
+slow_query_logger = logging.getLogger('slow_queries')
+
+# Literales de texto y números en SQL armado a mano (los parámetros ligados ya viajan aparte)
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Límites de los histogramas de latencia (segundos, estilo Prometheus)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class SQLTimer:
+    """Acumula el tiempo pasado dentro de la base de datos"""
+
+    def __init__(self):
+        self.total_time = 0.0
+        self.queries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self._lock:
+            self.total_time += elapsed
+            self.queries += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+sql_timer = SQLTimer()
+
+def redact_statement(statement):
+    """Colapsa espacios y reemplaza literales por ? para no registrar datos"""
+    return _SQL_LITERALS.sub('?', ' '.join(statement.split()))
+
+def _describe_parameters(parameters, executemany):
+    """Solo tipos de los parámetros, nunca sus valores"""
+    if executemany:
+        return f"{len(parameters)} filas"
+    if isinstance(parameters, dict):
+        return ', '.join(f"{key}=<{type(value).__name__}>" for key, value in parameters.items())
+    return ', '.join(f"<{type(value).__name__}>" for value in (parameters or ()))
+
+class SQLProfiler:
+    """Perfil SQL de una muestra de peticiones: cantidad, tiempo y consultas más lentas"""
+
+    def __init__(self):
+        self.recent = deque(maxlen=app.config.get('SQL_PROFILE_HISTORY', 200))
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def record_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def should_sample(self):
+        rate = app.config.get('SQL_PROFILE_SAMPLE_RATE', 0)
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def start(self):
+        g.sql_profile = {'count': 0, 'time': 0.0, 'slowest': []}
+
+    def record(self, statement, elapsed):
+        profile = g.get('sql_profile')
+        if profile is None:
+            return
+        profile['count'] += 1
+        profile['time'] += elapsed
+        top_n = app.config.get('SQL_PROFILE_TOP_N', 5)
+        item = (elapsed, profile['count'], statement)
+        if len(profile['slowest']) < top_n:
+            heapq.heappush(profile['slowest'], item)
+        elif elapsed > profile['slowest'][0][0]:
+            heapq.heapreplace(profile['slowest'], item)
+
+    def finish(self, method, route, status, elapsed):
+        """Cierra el perfil de la petición y lo guarda; devuelve None si no fue muestreada"""
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return None
+        result = {
+            'method': method,
+            'route': route,
+            'status': status,
+            'timestamp': time.time(),
+            'total_ms': round(elapsed * 1000, 2),
+            'db_ms': round(profile['time'] * 1000, 2),
+            'queries': profile['count'],
+            'slowest': [
+                {'ms': round(ms * 1000, 2), 'statement': redact_statement(statement)}
+                for ms, _, statement in sorted(profile['slowest'], reverse=True)
+            ]
+        }
+        self.recent.append(result)
+        return result
+
+sql_profiler = SQLProfiler()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    sql_timer.record(elapsed)
+
+    if has_request_context():
+        sql_profiler.record(statement, elapsed)
+
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 0)
+    if threshold and elapsed * 1000 >= threshold:
+        sql_profiler.record_slow_query()
+        route = request.path if has_request_context() else '-'
+        slow_query_logger.warning(
+            f"{elapsed * 1000:.1f}ms route={route} sql={redact_statement(statement)} "
+            f"params=[{_describe_parameters(parameters, executemany)}]",
+            extra={'duration_ms': round(elapsed * 1000, 1), 'route': route}
+        )
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(exception_context):
+    starts = exception_context.connection.info.get('query_start_time') if exception_context.connection else None
+    if starts:
+        starts.pop()
+    sql_timer.record_error()
+
+class RequestMetrics:
+    """Cantidad de peticiones y latencias por endpoint"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._endpoints = {}  # (método, ruta) -> contadores
+        self._lock = threading.Lock()
+
+    def record(self, method, route, status, elapsed):
+        with self._lock:
+            entry = self._endpoints.get((method, route))
+            if entry is None:
+                entry = self._endpoints[(method, route)] = {
+                    'count': 0,
+                    'errors': 0,
+                    'sum': 0.0,
+                    'max': 0.0,
+                    'statuses': {},
+                    'buckets': [0] * len(self.buckets)
+                }
+            entry['count'] += 1
+            entry['sum'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            if status >= 500:
+                entry['errors'] += 1
+            status_class = f"{status // 100}xx"
+            entry['statuses'][status_class] = entry['statuses'].get(status_class, 0) + 1
+            for i, bound in enumerate(self.buckets):
+                if elapsed <= bound:
+                    entry['buckets'][i] += 1
+                    break
+
+    def _quantile(self, entry, q):
+        """Estima un cuantil a partir del histograma (límite superior del bucket, acotado al máximo)"""
+        target = entry['count'] * q
+        seen = 0
+        for bound, count in zip(self.buckets, entry['buckets']):
+            seen += count
+            if seen >= target:
+                return min(bound, entry['max'])
+        return entry['max']
+
+    def snapshot(self):
+        """Copia de los contadores para exponer en JSON o texto Prometheus"""
+        with self._lock:
+            return {key: dict(entry, statuses=dict(entry['statuses']), buckets=list(entry['buckets']))
+                    for key, entry in self._endpoints.items()}
+
+    def summary(self):
+        """Resumen por endpoint, ordenado por tiempo total"""
+        rows = []
+        for (method, route), entry in self.snapshot().items():
+            rows.append({
+                'method': method,
+                'route': route,
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'statuses': entry['statuses'],
+                'total_ms': round(entry['sum'] * 1000, 1),
+                'avg_ms': round(entry['sum'] / entry['count'] * 1000, 2),
+                'p50_ms': round(self._quantile(entry, 0.50) * 1000, 1),
+                'p95_ms': round(self._quantile(entry, 0.95) * 1000, 1),
+                'max_ms': round(entry['max'] * 1000, 1)
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+request_metrics = RequestMetrics()
+
+def route_label():
+    """Plantilla de la ruta atendida (/api/bookings/<int:booking_id>), para agrupar métricas"""
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    if sql_profiler.should_sample():
+        sql_profiler.start()
+
+@app.after_request
+def _record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        request_metrics.record(request.method, route_label(), response.status_code, elapsed)
+
+        profile = sql_profiler.finish(request.method, route_label(), response.status_code, elapsed)
+        if profile:
+            response.headers.add('Server-Timing', f'db;dur={profile["db_ms"]};desc="{profile["queries"]} queries"')
+            response.headers.add('Server-Timing', f'app;dur={profile["total_ms"]}')
+    return response
+
+@app.teardown_request
+def _record_failed_request(exc):
+    # Excepciones no manejadas no pasan por after_request
+    start = g.pop('request_start', None)
+    if start is not None and exc is not None:
+        elapsed = time.perf_counter() - start
+        request_metrics.record(request.method, route_label(), 500, elapsed)
+        sql_profiler.finish(request.method, route_label(), 500, elapsed)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus(resource_monitor=None, extra_gauges=None):
+    """Genera las métricas en formato de texto de Prometheus"""
+    lines = []
+
+    lines.append('# HELP golistica_http_requests_total Peticiones HTTP por endpoint y clase de estado')
+    lines.append('# TYPE golistica_http_requests_total counter')
+    snapshot = request_metrics.snapshot()
+    for (method, route), entry in sorted(snapshot.items()):
+        for status_class, count in sorted(entry['statuses'].items()):
+            lines.append(f'golistica_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status_class}"}} {count}')
+
+    lines.append('# HELP golistica_http_request_duration_seconds Latencia de peticiones HTTP')
+    lines.append('# TYPE golistica_http_request_duration_seconds histogram')
+    for (method, route), entry in sorted(snapshot.items()):
+        labels = f'method="{method}",route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(request_metrics.buckets, entry['buckets']):
+            cumulative += count
+            lines.append(f'golistica_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'golistica_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+        lines.append(f'golistica_http_request_duration_seconds_sum{{{labels}}} {entry["sum"]:.6f}')
+        lines.append(f'golistica_http_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+
+    lines.append('# HELP golistica_db_queries_total Consultas ejecutadas en la base de datos')
+    lines.append('# TYPE golistica_db_queries_total counter')
+    lines.append(f'golistica_db_queries_total {sql_timer.queries}')
+    lines.append('# HELP golistica_db_errors_total Consultas que fallaron')
+    lines.append('# TYPE golistica_db_errors_total counter')
+    lines.append(f'golistica_db_errors_total {sql_timer.errors}')
+    lines.append('# HELP golistica_db_time_seconds_total Tiempo acumulado dentro de la base de datos')
+    lines.append('# TYPE golistica_db_time_seconds_total counter')
+    lines.append(f'golistica_db_time_seconds_total {sql_timer.total_time:.6f}')
+
+    if resource_monitor:
+        for name, value in resource_monitor.get_stats().items():
+            if name in resource_monitor.SERIES and value is not None:
+                lines.append(f'# TYPE golistica_{name} gauge')
+                lines.append(f'golistica_{name} {value}')
+
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f'# TYPE golistica_{name} gauge')
+        lines.append(f'golistica_{name} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,11 @@
-from flask import session, request, flash, redirect, url_for
+from flask import session, request, flash, redirect, url_for, has_request_context
 from flask_socketio import emit
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from sqlalchemy import or_, and_, exc
+from sqlalchemy import or_, and_, exc, event, DDL
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.orm import Session
 from contextlib import contextmanager
 import threading
 import time
@@ -52,7 +54,9 @@ class CriticalEvent(db.Model):
     ip_address = db.Column(db.String(45), nullable=True)
     user_agent = db.Column(db.Text, nullable=True)
     additional_data = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # primera ocurrencia
+    occurrences = db.Column(db.Integer, nullable=False, default=1)  # repeticiones agrupadas en esta fila
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # última ocurrencia
     resolved = db.Column(db.Boolean, default=False)
     resolved_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     resolved_at = db.Column(db.DateTime, nullable=True)
@@ -83,16 +87,14 @@ class User(db.Model):
     @staticmethod
     def get_role_from_email(email):
         """Asignar rol según el dominio del email"""
-        print(f"EMAIL DEBUG - Email recibido: {email}")
         if email.endswith('@golistica.com'):
-            print(f"EMAIL DEBUG - Asignando rol: administrador")
-            return 'administrador'
+            role = 'administrador'
         elif email.endswith('@operador.golistica.com'):
-            print(f"EMAIL DEBUG - Asignando rol: operador")
-            return 'operador'
+            role = 'operador'
         else:
-            print(f"EMAIL DEBUG - Asignando rol: visitante")
-            return 'visitante'
+            role = 'visitante'
+        app.logger.debug("Rol asignado por email: %s -> %s", email, role)
+        return role
 
 class Court(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -104,6 +106,10 @@ class Court(db.Model):
     image = db.Column(db.String(300))
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # control de concurrencia optimista (ETag / If-Match)
+
+    # Cada UPDATE del ORM compara la versión cargada y la incrementa (StaleDataError si cambió)
+    __mapper_args__ = {'version_id_col': version}
 
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -119,12 +125,59 @@ class Booking(db.Model):
     payment_status = db.Column(db.String(20), default='pending')  # pending, paid, refunded
     total_amount = db.Column(db.Float, nullable=False)
     deposit_amount = db.Column(db.Float, nullable=False)
-    
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # control de concurrencia optimista (ETag / If-Match)
+
+    # Índice para las búsquedas de solapamiento por cancha y fecha
+    __table_args__ = (db.Index('ix_booking_court_date', 'court_id', 'booking_date'),)
+    __mapper_args__ = {'version_id_col': version}
+
     # Relaciones
     user = db.relationship('User', backref='bookings')
     court = db.relationship('Court', backref='bookings')
     payments = db.relationship('Payment', backref='booking', lazy=True)
 
+# La base rechaza reservas activas solapadas de la misma cancha (IntegrityError -> 409), también
+# entre procesos distintos: restricción de exclusión en PostgreSQL, trigger en SQLite
+booking_no_overlap = ExcludeConstraint(
+    (Booking.court_id, '='),
+    (db.func.tsrange(Booking.booking_date + Booking.start_time, Booking.booking_date + Booking.end_time), '&&'),
+    name='booking_no_overlap',
+    using='gist',
+    where=db.text("status <> 'cancelled'")
+).ddl_if(dialect='postgresql')
+Booking.__table__.append_constraint(booking_no_overlap)
+event.listen(Booking.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+# SQLite serializa las escrituras: la verificación del trigger y el INSERT/UPDATE no pueden intercalarse con otro proceso
+booking_no_overlap_trigger = DDL("""
+CREATE TRIGGER IF NOT EXISTS booking_no_overlap BEFORE INSERT ON booking
+WHEN NEW.status IS NOT 'cancelled'
+BEGIN
+    SELECT RAISE(ABORT, 'booking_no_overlap') WHERE EXISTS (
+        SELECT 1 FROM booking
+        WHERE court_id = NEW.court_id AND booking_date = NEW.booking_date AND status IS NOT 'cancelled'
+          AND start_time < NEW.end_time AND end_time > NEW.start_time
+    );
+END
+""").execute_if(dialect='sqlite')
+event.listen(Booking.__table__, 'after_create', booking_no_overlap_trigger)
+
+# Reactivar una reserva cancelada o moverla de horario/cancha pasa por la misma verificación
+booking_no_overlap_update_trigger = DDL("""
+CREATE TRIGGER IF NOT EXISTS booking_no_overlap_update
+BEFORE UPDATE OF status, court_id, booking_date, start_time, end_time ON booking
+WHEN NEW.status IS NOT 'cancelled'
+BEGIN
+    SELECT RAISE(ABORT, 'booking_no_overlap') WHERE EXISTS (
+        SELECT 1 FROM booking
+        WHERE id <> NEW.id AND court_id = NEW.court_id AND booking_date = NEW.booking_date
+          AND status IS NOT 'cancelled' AND start_time < NEW.end_time AND end_time > NEW.start_time
+    );
+END
+""").execute_if(dialect='sqlite')
+event.listen(Booking.__table__, 'after_create', booking_no_overlap_update_trigger)
+
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
@@ -141,6 +194,116 @@ class Payment(db.Model):
     # Relaciones
     user = db.relationship('User', backref='payments')
 
+class IdempotencyRecord(db.Model):
+    key = db.Column(db.String(255), primary_key=True)  # endpoint:scope:Idempotency-Key
+    fingerprint = db.Column(db.String(64), nullable=False)  # Hash del cuerpo de la petición
+    status_code = db.Column(db.Integer, nullable=True)  # NULL mientras la petición está en curso (reserva de la clave)
+    mimetype = db.Column(db.String(100), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ChangeLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Cursor monotónico para /api/changes
+    resource_type = db.Column(db.String(20), nullable=False)  # booking, court, user, payment
+    resource_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # upsert, delete
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class OutboxEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    room = db.Column(db.String(100), nullable=False, index=True)
+    event = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    sequence = db.Column(db.Integer, nullable=True)  # Número de secuencia por sala, asignado al despachar
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, dispatching, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(50), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+class OutboxSequence(db.Model):
+    room = db.Column(db.String(100), primary_key=True)
+    last_sequence = db.Column(db.Integer, nullable=False, default=0)
+
+class ConnectionInvalidation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # login, user, role
+    login_id = db.Column(db.String(32), nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    role = db.Column(db.String(20), nullable=True)
+    origin = db.Column(db.String(50), nullable=False)  # Worker que la publicó (ya la aplicó)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)  # Migraciones aplicadas (ver schema.py)
+    description = db.Column(db.String(200), nullable=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)  # ver JOB_TYPES en jobs.py
+    payload = db.Column(db.Text, nullable=True)  # JSON con los argumentos
+    priority = db.Column(db.Integer, default=100)  # menor = se ejecuta antes
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, running, completed, failed, cancelled
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # no antes de esta fecha (reintentos con espera)
+    schedule_name = db.Column(db.String(100), nullable=True, index=True)  # recurrente que lo generó
+    created_by = db.Column(db.String(80), nullable=True)
+    claimed_by = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # se elimina pasado este momento
+    result = db.Column(db.Text, nullable=True)  # JSON
+    last_error = db.Column(db.Text, nullable=True)
+
+class JobSchedule(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    cron = db.Column(db.String(100), nullable=False)  # minuto hora día mes día-de-semana, en UTC
+    payload = db.Column(db.Text, nullable=True)
+    priority = db.Column(db.Integer, default=100)
+    enabled = db.Column(db.Boolean, default=True)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+
+# Registro de cambios para sincronización incremental de los dashboards
+CHANGE_TRACKED_MODELS = {
+    Booking: 'booking',
+    Court: 'court',
+    User: 'user',
+    Payment: 'payment'
+}
+
+@event.listens_for(Session, 'after_flush')
+def record_changes(session, flush_context):
+    """Escribe en change_log, dentro de la misma transacción, las filas modificadas"""
+    rows = []
+    now = datetime.utcnow()
+
+    for obj in session.new:
+        resource_type = CHANGE_TRACKED_MODELS.get(type(obj))
+        if resource_type:
+            rows.append({'resource_type': resource_type, 'resource_id': obj.id, 'action': 'upsert', 'timestamp': now})
+
+    for obj in session.dirty:
+        resource_type = CHANGE_TRACKED_MODELS.get(type(obj))
+        if resource_type and session.is_modified(obj, include_collections=False):
+            rows.append({'resource_type': resource_type, 'resource_id': obj.id, 'action': 'upsert', 'timestamp': now})
+
+    for obj in session.deleted:
+        resource_type = CHANGE_TRACKED_MODELS.get(type(obj))
+        if resource_type:
+            rows.append({'resource_type': resource_type, 'resource_id': obj.id, 'action': 'delete', 'timestamp': now})
+
+    if rows:
+        session.connection().execute(ChangeLog.__table__.insert(), rows)
+
 # Gestor de transacciones para concurrencia
 @contextmanager
 def transaction_scope():
@@ -159,30 +322,26 @@ def transaction_scope():
 # Lock manager para recursos críticos
 class LockManager:
     _locks = {}
-    _lock = threading.Lock()
+    _lock = threading.Condition()
     
     @classmethod
     def acquire_lock(cls, resource_id, timeout=30):
         """Adquiere un bloqueo para un recurso"""
         with cls._lock:
-            if resource_id in cls._locks:
-                # Esperar a que se libere el bloqueo
-                start_time = time.time()
-                while resource_id in cls._locks and (time.time() - start_time) < timeout:
-                    time.sleep(0.1)
-                
-                if resource_id in cls._locks:
-                    raise TimeoutError(f"No se pudo adquirir bloqueo para {resource_id}")
+            # Esperar a que se libere el bloqueo (wait_for suelta la condición mientras espera)
+            if not cls._lock.wait_for(lambda: resource_id not in cls._locks, timeout):
+                raise TimeoutError(f"No se pudo adquirir bloqueo para {resource_id}")
             
             cls._locks[resource_id] = threading.current_thread().ident
             return True
     
     @classmethod
     def release_lock(cls, resource_id):
-        """Libera un bloqueo"""
+        """Libera un bloqueo (solo si lo tiene el hilo actual)"""
         with cls._lock:
-            if resource_id in cls._locks:
+            if cls._locks.get(resource_id) == threading.current_thread().ident:
                 del cls._locks[resource_id]
+                cls._lock.notify_all()
 
 # Funciones de integridad de datos
 def check_foreign_keys():
@@ -416,8 +575,10 @@ def fix_integrity_issue(issue_id, auto_fix=False):
 def log_audit(action, resource_type=None, resource_id=None, details=None, success=True, error_message=None):
     """Registra acciones de auditoría"""
     try:
-        user_id = session.get('user_id') if 'user_id' in session else None
-        username = session.get('username') if 'username' in session else None
+        # Fuera de una petición (trabajos en segundo plano) no hay sesión ni cliente
+        in_request = has_request_context()
+        user_id = session.get('user_id') if in_request and 'user_id' in session else None
+        username = session.get('username') if in_request and 'username' in session else None
         
         audit_log = AuditLog(
             user_id=user_id,
@@ -426,8 +587,8 @@ def log_audit(action, resource_type=None, resource_id=None, details=None, succes
             resource_type=resource_type,
             resource_id=resource_id,
             details=details,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent', ''),
+            ip_address=request.remote_addr if in_request else None,
+            user_agent=request.headers.get('User-Agent', '') if in_request else None,
             success=success,
             error_message=error_message
         )
@@ -444,42 +605,221 @@ def log_audit(action, resource_type=None, resource_id=None, details=None, succes
         if not success:
             log_message += f" - FAILED: {error_message}"
             
-        app.logger.info(log_message)
+        app.logger.info(log_message, extra={
+            'audit_action': action,
+            'user_id': user_id,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'success': success
+        })
         
     except Exception as e:
         app.logger.error(f"Error en auditoría: {str(e)}")
 
-def log_critical_event(event_type, description, severity='HIGH', additional_data=None):
-    """Registra eventos críticos y envía notificaciones"""
-    try:
-        critical_event = CriticalEvent(
-            event_type=event_type,
-            description=description,
-            severity=severity,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent', ''),
-            additional_data=json.dumps(additional_data) if additional_data else None
-        )
-        
-        db.session.add(critical_event)
-        db.session.commit()
-        
-        # Registrar en log crítico
-        critical_logger.critical(f"{event_type}: {description}")
-        
-        # Enviar notificación en tiempo real a administradores
+class CriticalEventAggregator:
+    """Agrupa eventos críticos repetidos por (tipo, IP, severidad) en una fila por ventana
+
+    La primera ocurrencia de la ventana inserta la fila (o reutiliza la que abrió
+    otro proceso), se loguea y se notifica a admin_room en el momento. Las
+    repeticiones solo se cuentan en memoria; un hilo de fondo suma los contadores
+    a la fila cada CRITICAL_EVENT_FLUSH_INTERVAL segundos y notifica como mucho
+    una vez cada CRITICAL_EVENT_NOTIFY_INTERVAL por clave.
+    """
+
+    def __init__(self, window=None, flush_interval=None, notify_interval=None):
+        self.window = window or app.config.get('CRITICAL_EVENT_WINDOW', 60)
+        self.flush_interval = flush_interval or app.config.get('CRITICAL_EVENT_FLUSH_INTERVAL', 5)
+        self.notify_interval = notify_interval or app.config.get('CRITICAL_EVENT_NOTIFY_INTERVAL', 30)
+        self._entries = {}  # (tipo, ip, severidad) -> fila abierta (row_id None mientras se abre) y repeticiones sin volcar
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'events': 0, 'rows': 0, 'aggregated': 0, 'flushes': 0, 'notifications': 0, 'suppressed': 0}
+
+    def record(self, event_type, description, severity, ip_address, user_agent, additional_data):
+        """Registra una ocurrencia. Devuelve el id de la fila que la agrupa"""
+        now = datetime.utcnow()
+        key = (event_type, ip_address, severity)
+        with self._lock:
+            self.stats['events'] += 1
+            entry = self._entries.get(key)
+            if entry and now - entry['opened_at'] < timedelta(seconds=self.window):
+                entry['pending'] += 1
+                entry['unnotified'] += 1
+                entry['occurrences'] += 1
+                entry['last_seen'] = now
+                entry['description'] = description
+                entry['additional_data'] = additional_data
+                self.stats['aggregated'] += 1
+            else:
+                # Primera ocurrencia en la ventana: se reserva la clave y la fila se abre fuera
+                # del lock, para que la base no frene a las demás claves
+                entry = None
+                placeholder = {
+                    'row_id': None,
+                    'opened': threading.Event(),
+                    'opened_at': now,
+                    'last_seen': now,
+                    'pending': 0,
+                    'unnotified': 0,
+                    'occurrences': 1,
+                    'last_notified': now,
+                    'description': description,
+                    'additional_data': additional_data
+                }
+                self._entries[key] = placeholder
+
+        if entry is not None:
+            # Repetición: si la fila de la ventana se está abriendo, solo se espera a esa clave
+            entry['opened'].wait(self.flush_interval)
+            return entry['row_id']
+
+        try:
+            row_id, occurrences = self._open_row(event_type, description, severity, ip_address,
+                                                 user_agent, additional_data, now)
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is placeholder:
+                    del self._entries[key]
+            placeholder['opened'].set()
+            raise
+
+        with self._lock:
+            # Las repeticiones que llegaron mientras se abría la fila quedan en pending
+            placeholder['row_id'] = row_id
+            placeholder['occurrences'] += occurrences - 1
+            if occurrences == 1:
+                self.stats['rows'] += 1
+            if not self.running:
+                self.running = True
+                socketio.start_background_task(self._run)
+        placeholder['opened'].set()
+
+        critical_logger.critical(f"{event_type}: {description}", extra={
+            'event_type': event_type,
+            'severity': severity,
+            'ip_address': ip_address
+        })
+        self._notify(key, description, now, occurrences)
+        if severity in ['HIGH', 'CRITICAL']:
+            app.logger.critical(f"CRITICAL EVENT: {event_type} - {description}")
+        return row_id
+
+    def _open_row(self, event_type, description, severity, ip_address, user_agent, additional_data, now):
+        table = CriticalEvent.__table__
+        with db.engine.begin() as conn:
+            existing = conn.execute(db.select(table.c.id, table.c.occurrences).where(
+                table.c.event_type == event_type,
+                table.c.ip_address == ip_address,
+                table.c.severity == severity,
+                table.c.resolved == False,
+                table.c.last_seen >= now - timedelta(seconds=self.window)
+            ).order_by(table.c.id.desc()).limit(1)).first()
+            if existing:
+                conn.execute(table.update().where(table.c.id == existing.id).values(
+                    occurrences=table.c.occurrences + 1,
+                    last_seen=now,
+                    description=description,
+                    additional_data=additional_data
+                ))
+                return existing.id, existing.occurrences + 1
+
+            result = conn.execute(table.insert().values(
+                event_type=event_type,
+                description=description,
+                severity=severity,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                additional_data=additional_data,
+                timestamp=now,
+                last_seen=now,
+                occurrences=1,
+                resolved=False
+            ))
+            return result.inserted_primary_key[0], 1
+
+    def pending(self, ip_address, event_type):
+        """Repeticiones contadas en memoria y todavía no sumadas a la base"""
+        with self._lock:
+            return sum(entry['pending'] for (kind, ip, _), entry in self._entries.items()
+                       if kind == event_type and ip == ip_address)
+
+    def _run(self):
+        while self.running:
+            socketio.sleep(self.flush_interval)
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception as e:
+                app.logger.error(f"Error volcando eventos críticos: {str(e)}")
+
+    def flush(self):
+        """Suma las repeticiones a sus filas, notifica las acumuladas y cierra las ventanas vencidas"""
+        now = datetime.utcnow()
+        updates, notifications = [], []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry['row_id'] is None:
+                    continue  # Fila todavía abriéndose en record()
+                if entry['pending']:
+                    updates.append((key, entry['row_id'], entry['pending'], entry['last_seen'],
+                                    entry['description'], entry['additional_data']))
+                    entry['pending'] = 0
+                expired = now - entry['opened_at'] >= timedelta(seconds=self.window)
+                if entry['unnotified'] and (expired or now - entry['last_notified'] >= timedelta(seconds=self.notify_interval)):
+                    notifications.append((key, entry['description'], entry['last_seen'], entry['occurrences']))
+                    entry['unnotified'] = 0
+                    entry['last_notified'] = now
+                if expired:
+                    del self._entries[key]
+
+        if updates:
+            table = CriticalEvent.__table__
+            with db.engine.begin() as conn:
+                for _, row_id, count, last_seen, description, additional_data in updates:
+                    conn.execute(table.update().where(table.c.id == row_id).values(
+                        occurrences=table.c.occurrences + count,
+                        last_seen=last_seen,
+                        description=description,
+                        additional_data=additional_data
+                    ))
+            self.stats['flushes'] += 1
+
+        for (event_type, ip_address, severity), _, count, _, _, _ in updates:
+            critical_logger.critical(f"{event_type}: {count} repeticiones más desde {ip_address}", extra={
+                'event_type': event_type,
+                'severity': severity,
+                'ip_address': ip_address,
+                'repeated': count
+            })
+        for key, description, last_seen, occurrences in notifications:
+            self._notify(key, description, last_seen, occurrences)
+
+    def _notify(self, key, description, timestamp, occurrences):
+        event_type, ip_address, severity = key
         socketio.emit('critical_event', {
             'event_type': event_type,
             'description': description,
             'severity': severity,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'ip_address': request.remote_addr
+            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'ip_address': ip_address,
+            'occurrences': occurrences
         }, room='admin_room')
-        
-        # Si es crítico, también enviar al log principal
-        if severity in ['HIGH', 'CRITICAL']:
-            app.logger.critical(f"CRITICAL EVENT: {event_type} - {description}")
-            
+        self.stats['notifications'] += 1
+        self.stats['suppressed'] = self.stats['events'] - self.stats['notifications']
+
+critical_events = CriticalEventAggregator()
+
+def log_critical_event(event_type, description, severity='HIGH', additional_data=None):
+    """Registra eventos críticos (agrupados por ventana) y envía notificaciones"""
+    try:
+        critical_events.record(
+            event_type,
+            description,
+            severity,
+            request.remote_addr,
+            request.headers.get('User-Agent', ''),
+            json.dumps(additional_data) if additional_data else None
+        )
     except Exception as e:
         app.logger.error(f"Error en evento crítico: {str(e)}")
 
@@ -488,12 +828,12 @@ def detect_suspicious_activity(ip_address, event_type, threshold=5, time_window=
     try:
         time_threshold = datetime.utcnow() - timedelta(seconds=time_window)
         
-        # Contar eventos recientes desde la misma IP
-        recent_events = CriticalEvent.query.filter(
+        # Contar eventos recientes desde la misma IP (filas agrupadas + repeticiones aún en memoria)
+        recent_events = db.session.query(db.func.coalesce(db.func.sum(CriticalEvent.occurrences), 0)).filter(
             CriticalEvent.ip_address == ip_address,
             CriticalEvent.event_type == event_type,
-            CriticalEvent.timestamp >= time_threshold
-        ).count()
+            CriticalEvent.last_seen >= time_threshold
+        ).scalar() + critical_events.pending(ip_address, event_type)
         
         if recent_events >= threshold:
             log_critical_event(
@@ -747,16 +1087,7 @@ def add_sample_courts():
             }
         ]
         
-        for court_data in sample_courts:
-            court = Court(**court_data)
-            db.session.add(court)
-        
+        # Un único insert por lotes en lugar de un objeto ORM por cancha
+        db.session.execute(Court.__table__.insert(), sample_courts)
         db.session.commit()
         print('Canchas de ejemplo agregadas')
-
-# Crear tablas de base de datos
-with app.app_context():
-    db.create_all()
-    create_admin_user()
-    add_sample_courts()
-    print('Base de datos inicializada correctamente')
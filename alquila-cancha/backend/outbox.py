@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import json
+import os
+import threading
+import time
+import uuid
+from config import app, db, socketio
+from models import OutboxEvent, OutboxSequence
+
+def enqueue_event(event_name, payload, room):
+    """Agrega una notificación al outbox dentro de la transacción actual (no hace commit)"""
+    db.session.add(OutboxEvent(
+        room=room,
+        event=event_name,
+        payload=json.dumps(payload, default=str)
+    ))
+    db.session.info['outbox_pending'] = True
+
+class OutboxDispatcher:
+    """Despacha en segundo plano los eventos del outbox agrupados por sala, con reintentos"""
+
+    def __init__(self):
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.batch_size = app.config.get('OUTBOX_BATCH_SIZE', 200)
+        self.max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', 10)
+        self.poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', 1.0)
+        self.claim_timeout = app.config.get('OUTBOX_CLAIM_TIMEOUT', 60)
+        self.running = False
+        self._wakeup = False
+        self._lock = threading.Lock()
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'batches': 0}
+
+    def start(self):
+        """Inicia el despachador si todavía no está corriendo"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+        socketio.start_background_task(self._run)
+
+    def stop(self):
+        self.running = False
+
+    def notify(self):
+        """Despierta al despachador después de un commit con eventos nuevos"""
+        self._wakeup = True
+        if not self.running:
+            self.start()
+
+    def _run(self):
+        last_dispatch = 0
+        while self.running:
+            if self._wakeup or time.time() - last_dispatch >= self.poll_interval:
+                self._wakeup = False
+                last_dispatch = time.time()
+                try:
+                    with app.app_context():
+                        # Seguir despachando mientras haya lotes completos
+                        while self.dispatch_pending() >= self.batch_size:
+                            pass
+                except Exception as e:
+                    app.logger.error(f"Error en despachador de outbox: {str(e)}")
+            socketio.sleep(0.05)
+
+    def _claim(self):
+        """Reserva un lote de eventos y asigna números de secuencia por sala en una transacción"""
+        table = OutboxEvent.__table__
+        sequences = OutboxSequence.__table__
+        now = datetime.utcnow()
+
+        with db.engine.begin() as conn:
+            # Recuperar eventos reservados por un proceso que murió (entrega al menos una vez)
+            conn.execute(table.update().where(
+                table.c.status == 'dispatching',
+                table.c.claimed_at < now - timedelta(seconds=self.claim_timeout)
+            ).values(status='pending', claimed_by=None))
+
+            # PostgreSQL: SKIP LOCKED reparte lotes distintos entre despachadores sin que se esperen
+            # (SQLite ignora FOR UPDATE: ahí las escrituras ya son de a una)
+            pending_ids = db.select(table.c.id).where(
+                table.c.status == 'pending',
+                table.c.next_attempt_at <= now
+            ).order_by(table.c.id).limit(self.batch_size).with_for_update(skip_locked=True)
+
+            conn.execute(table.update().where(
+                table.c.id.in_(pending_ids),
+                table.c.status == 'pending'
+            ).values(status='dispatching', claimed_by=self.token, claimed_at=now))
+
+            rows = conn.execute(db.select(
+                table.c.id, table.c.room, table.c.event, table.c.payload,
+                table.c.sequence, table.c.attempts
+            ).where(
+                table.c.status == 'dispatching',
+                table.c.claimed_by == self.token
+            ).order_by(table.c.id)).all()
+
+            # Asignar secuencias a los eventos que aún no la tienen
+            needs_sequence = {}
+            for row in rows:
+                if row.sequence is None:
+                    needs_sequence.setdefault(row.room, []).append(row.id)
+
+            assigned = {}
+            for room, event_ids in needs_sequence.items():
+                # Bloquear la fila de la sala hasta el commit para no repetir números entre procesos
+                last = conn.execute(db.select(sequences.c.last_sequence).where(
+                    sequences.c.room == room
+                ).with_for_update()).scalar()
+                if last is None:
+                    last = 0
+                    conn.execute(sequences.insert().values(room=room, last_sequence=0))
+                for event_id in event_ids:
+                    last += 1
+                    assigned[event_id] = last
+                    conn.execute(table.update().where(table.c.id == event_id).values(sequence=last))
+                conn.execute(sequences.update().where(sequences.c.room == room).values(last_sequence=last))
+
+        return [
+            (row.id, row.room, row.event, row.payload, assigned.get(row.id, row.sequence), row.attempts)
+            for row in rows
+        ]
+
+    def dispatch_pending(self):
+        """Envía un lote de eventos pendientes. Devuelve la cantidad procesada"""
+        batch = self._claim()
+        if not batch:
+            return 0
+
+        by_room = {}
+        for item in batch:
+            by_room.setdefault(item[1], []).append(item)
+
+        sent_ids = []
+        retries = []
+        failures = []
+        for room, items in by_room.items():
+            for position, (event_id, _, event_name, payload, sequence, attempts) in enumerate(items):
+                data = json.loads(payload)
+                data['sequence'] = sequence
+                try:
+                    socketio.emit(event_name, data, room=room)
+                    sent_ids.append(event_id)
+                except Exception as e:
+                    # Mantener el orden de la sala: reintentar este evento y los siguientes
+                    for pending in items[position:]:
+                        if pending[5] + 1 >= self.max_attempts:
+                            failures.append((pending[0], str(e)))
+                        else:
+                            retries.append((pending[0], pending[5] + 1, str(e)))
+                    break
+
+        table = OutboxEvent.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            if sent_ids:
+                conn.execute(table.update().where(table.c.id.in_(sent_ids)).values(
+                    status='sent', sent_at=now, claimed_by=None
+                ))
+            for event_id, attempts, error in retries:
+                conn.execute(table.update().where(table.c.id == event_id).values(
+                    status='pending',
+                    attempts=attempts,
+                    next_attempt_at=now + timedelta(seconds=min(2 ** attempts, 60)),
+                    claimed_by=None,
+                    last_error=error
+                ))
+            for event_id, error in failures:
+                conn.execute(table.update().where(table.c.id == event_id).values(
+                    status='failed', claimed_by=None, last_error=error
+                ))
+
+        self.stats['sent'] += len(sent_ids)
+        self.stats['retried'] += len(retries)
+        self.stats['failed'] += len(failures)
+        self.stats['batches'] += 1
+        return len(batch)
+
+outbox_dispatcher = OutboxDispatcher()
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('outbox_pending', False):
+        outbox_dispatcher.notify()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_flag(session):
+    session.info.pop('outbox_pending', None)
@@ -0,0 +1,147 @@
+from flask import g
+from collections import Counter
+import os
+import random
+import sys
+import threading
+import time
+from config import app, socketio
+from metrics import route_label
+
+class RequestProfiler:
+    """Profiler estadístico: muestrea las pilas de los hilos que atienden peticiones seleccionadas"""
+
+    MAX_DEPTH = 128
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.1)
+        self.interval = app.config.get('PROFILE_INTERVAL_MS', 5) / 1000
+        self.max_stacks = app.config.get('PROFILE_MAX_STACKS', 5000)
+        self._active = {}   # id de hilo -> ruta
+        self._stacks = {}   # ruta -> Counter(pila colapsada -> muestras)
+        self._requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = None
+        self.samples = 0
+
+    def supported(self):
+        """Las muestras se asocian a la petición por id de hilo: con eventlet/gevent todas
+        las peticiones comparten hilos y las pilas no corresponderían a su ruta"""
+        return socketio.async_mode == 'threading'
+
+    def start(self, sample_rate=None, interval_ms=None):
+        """Activa el muestreo de peticiones"""
+        if not self.supported():
+            raise RuntimeError(f"El profiler requiere async_mode 'threading' (actual: {socketio.async_mode})")
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            self.interval = interval_ms / 1000
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        with self._lock:
+            self._active.clear()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._requests.clear()
+            self.samples = 0
+        self.started_at = time.time() if self.enabled else None
+
+    def begin_request(self, route):
+        if self.enabled and random.random() < self.sample_rate:
+            with self._lock:
+                self._active[threading.get_ident()] = route
+                self._requests[route] += 1
+            g.profiled = True
+
+    def end_request(self):
+        if g.pop('profiled', False):
+            with self._lock:
+                self._active.pop(threading.get_ident(), None)
+
+    def _collapse(self, frame):
+        """Pila en formato colapsado (raíz primero, separada por ;)"""
+        names = []
+        while frame is not None and len(names) < self.MAX_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while self.enabled:
+            with self._lock:
+                active = list(self._active.items())
+            if active:
+                frames = sys._current_frames()
+                collapsed = [(route, self._collapse(frames[tid])) for tid, route in active
+                             if tid != own_id and tid in frames]
+                with self._lock:
+                    for route, stack in collapsed:
+                        stacks = self._stacks.setdefault(route, Counter())
+                        # Acotar memoria: las pilas nuevas se cuentan en un único nodo
+                        if stack not in stacks and len(stacks) >= self.max_stacks:
+                            stack = 'otras pilas'
+                        stacks[stack] += 1
+                        self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self, route=None):
+        """Texto colapsado compatible con flamegraph.pl y speedscope (una pila por línea)"""
+        lines = []
+        with self._lock:
+            for stack_route, stacks in sorted(self._stacks.items()):
+                if route and stack_route != route:
+                    continue
+                for stack, count in stacks.most_common():
+                    # Con todas las rutas, la ruta es el primer nivel del flamegraph
+                    prefix = '' if route else f"{stack_route};"
+                    lines.append(f"{prefix}{stack} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'supported': self.supported(),
+                'async_mode': socketio.async_mode,
+                'sample_rate': self.sample_rate,
+                'interval_ms': self.interval * 1000,
+                'started_at': self.started_at,
+                'samples': self.samples,
+                'routes': [
+                    {
+                        'route': stack_route,
+                        'profiled_requests': self._requests[stack_route],
+                        'samples': sum(stacks.values()),
+                        'stacks': len(stacks)
+                    }
+                    for stack_route, stacks in sorted(self._stacks.items(), key=lambda item: -sum(item[1].values()))
+                ]
+            }
+
+request_profiler = RequestProfiler()
+
+@app.before_request
+def _begin_profiled_request():
+    if request_profiler.enabled:
+        request_profiler.begin_request(route_label())
+
+@app.teardown_request
+def _end_profiled_request(exc):
+    request_profiler.end_request()
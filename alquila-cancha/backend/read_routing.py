@@ -0,0 +1,85 @@
+"""Enrutamiento de lecturas a un motor separado
+
+Las vistas decoradas con @read_only consultan el motor 'read' (bind de
+SQLALCHEMY_BINDS): una réplica si DATABASE_READ_URL está definida o, con
+SQLite, un segundo pool de conexiones sobre el mismo archivo en modo WAL, donde
+las lecturas no esperan a las escrituras de book_court ni de log_audit.
+
+Las escrituras (flush, INSERT/UPDATE/DELETE explícitos y db.engine) siempre van
+al motor principal. Después de confirmar una escritura propia, el cliente queda
+fijado al principal durante READ_YOUR_WRITES_WINDOW segundos para que sus
+lecturas no devuelvan datos anteriores a lo que acaba de escribir (réplicas con
+retraso).
+"""
+import time
+from functools import wraps
+from flask import g, session, current_app, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+READ_BIND = 'read'
+PIN_KEY = '_read_primary_until'
+
+stats = {'read': 0, 'pinned': 0}
+
+class RoutingSession(Session):
+    """Session que manda las consultas de vistas @read_only al motor de lecturas"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and has_app_context() and g.get('_read_only'):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only(f):
+    """Las consultas de la vista van al motor de lecturas, salvo justo después de una escritura del mismo cliente"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        pinned = session.get(PIN_KEY, 0) > time.time()
+        g._read_only = not pinned
+        stats['pinned' if pinned else 'read'] += 1
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Lectura de lo propio: fijar al principal tras confirmar una escritura en una petición
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_write(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(OrmSession, 'after_commit')
+def _pin_after_write(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context() \
+            and READ_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        session[PIN_KEY] = time.time() + current_app.config.get('READ_YOUR_WRITES_WINDOW', 5)
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _forget_write(db_session):
+    db_session.info.pop('wrote', None)
+
+def read_database_url(primary_url, replica_url=None):
+    """URL del motor de lecturas: la réplica o, con un archivo SQLite, el mismo archivo; None = sin enrutamiento"""
+    if replica_url:
+        return replica_url
+    if primary_url.startswith('sqlite:///') and ':memory:' not in primary_url:
+        return primary_url
+    return None
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    # Persistente en el archivo: lectores y el escritor dejan de bloquearse entre sí
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+def _sqlite_query_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only=ON')
+
+def setup_engines(db):
+    """WAL en el principal y conexiones de solo lectura en el motor de lecturas (SQLite)"""
+    engines = db.engines
+    read_engine = engines.get(READ_BIND)
+    if read_engine is None or read_engine.dialect.name != 'sqlite':
+        return
+    event.listen(engines[None], 'connect', _sqlite_wal)
+    event.listen(read_engine, 'connect', _sqlite_wal)
+    event.listen(read_engine, 'connect', _sqlite_query_only)
@@ -1,29 +1,36 @@
 import os
-import sqlite3
 from config import app, db
-from models import create_admin_user, add_sample_courts
+from schema import upgrade
 
 def reset_database():
     """Elimina y recrea la base de datos"""
-    db_path = 'instance/alquila_cancha.db'
-    
-    # Cerrar conexión si existe
-    if os.path.exists(db_path):
-        try:
-            os.remove(db_path)
-            print("Base de datos eliminada")
-        except Exception as e:
-            print(f"Error eliminando base de datos: {e}")
-            return False
+    if db.engine.dialect.name == 'sqlite':
+        db_path = db.engine.url.database
+        db.engine.dispose()
+        
+        # Cerrar conexión si existe
+        if db_path and os.path.exists(db_path):
+            try:
+                os.remove(db_path)
+                # Archivos del modo WAL (motor de lecturas)
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+                print("Base de datos eliminada")
+            except Exception as e:
+                print(f"Error eliminando base de datos: {e}")
+                return False
+    else:
+        # Servidor de base (PostgreSQL): borrar las tablas, la base la administra el servidor
+        db.metadata.drop_all(bind=db.engine)
+        print("Tablas eliminadas")
     
     # Crear nueva base de datos
-    with app.app_context():
-        db.create_all()
-        create_admin_user()
-        add_sample_courts()
-        print("Nueva base de datos creada con todos los campos")
+    upgrade()
+    print("Nueva base de datos creada con todos los campos")
     
     return True
 
 if __name__ == '__main__':
-    reset_database()
+    with app.app_context():
+        reset_database()
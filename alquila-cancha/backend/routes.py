@@ -1,11 +1,19 @@
-from flask import render_template, jsonify, redirect, url_for, session, flash, request
+from flask import render_template, jsonify, redirect, url_for, session, flash, request, abort
 from functools import wraps
+import uuid
 from datetime import datetime, date, timedelta
 from sqlalchemy import or_, and_, exc
+from sqlalchemy.orm.exc import StaleDataError
 from config import app, db, socketio
 from models import User, Court, Booking, AuditLog, CriticalEvent, DataIntegrityReport, Payment
 from models import log_audit, log_critical_event, detect_suspicious_activity
-from models import LockManager, transaction_scope, add_sample_courts
+from models import LockManager, transaction_scope
+from idempotency import idempotent
+from outbox import enqueue_event
+from connections import invalidate_login
+import serializers
+from compression import conditional_get, changes_validator, audit_log_validator, version_etag, if_match_failed
+from read_routing import read_only
 
 # Decoradores de autenticación
 def login_required(f):
@@ -45,6 +53,21 @@ def operator_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Concurrencia optimista
+COURT_CONFLICT_MESSAGE = 'La cancha fue modificada por otro usuario. Recargá los datos e intentá nuevamente.'
+BOOKING_CONFLICT_MESSAGE = 'La reserva fue modificada por otro usuario. Recargá los datos e intentá nuevamente.'
+
+def version_conflict(model, resource_id, message):
+    """412 con la versión vigente (ETag) para que el cliente recargue antes de reintentar"""
+    db.session.rollback()
+    current = db.session.query(model.version).filter(model.id == resource_id).scalar()
+    if current is None:
+        return jsonify({'success': False, 'message': 'El registro fue eliminado'}), 404
+    response = jsonify({'success': False, 'message': message, 'version': current})
+    response.status_code = 412
+    response.set_etag(version_etag(current))
+    return response
+
 # Rutas
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -66,11 +89,9 @@ def login():
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
+            session['login_id'] = uuid.uuid4().hex
             
-            # Debug: imprimir información del usuario al hacer login
-            print(f"LOGIN DEBUG - Usuario: {user.username}")
-            print(f"LOGIN DEBUG - Rol asignado: {user.role}")
-            print(f"LOGIN DEBUG - Email: {user.email}")
+            app.logger.debug("Login: usuario=%s rol=%s email=%s", user.username, user.role, user.email)
             
             # Registrar auditoría
             log_audit(
@@ -142,64 +163,47 @@ def register():
 
 @app.route('/logout')
 def logout():
+    # Las conexiones SocketIO abiertas desde este login dejan de estar autenticadas
+    if 'login_id' in session:
+        invalidate_login(session['login_id'])
     session.clear()
     flash('Has cerrado sesión correctamente.', 'info')
     return redirect(url_for('index'))
 
 @app.route('/')
+@read_only
 def index():
     # Obtener canchas destacadas (en una aplicación real, podrías implementar lógica de destacados)
     featured_courts = Court.query.limit(4).all()
-    
-    # Si no hay canchas en la base de datos, agregar datos de ejemplo
-    if not featured_courts:
-        add_sample_courts()
-        featured_courts = Court.query.limit(4).all()
-    
     return render_template('index.html', courts=featured_courts)
 
 @app.route('/api/courts')
+@read_only
+@conditional_get(changes_validator('court'))
 def get_courts():
-    courts = Court.query.all()
-    return jsonify([{
-        'id': court.id,
-        'name': court.name,
-        'location': court.location,
-        'type': court.court_type,
-        'price': court.price,
-        'rating': court.rating,
-        'image': court.image
-    } for court in courts])
+    return jsonify(serializers.COURT.all(serializers.COURT.select()))
 
 @app.route('/search')
+@read_only
 def search():
     query = request.args.get('q', '')
     location = request.args.get('location', '')
     court_type = request.args.get('type', '')
     
     # Construir consulta
-    query_builder = Court.query
+    query_builder = serializers.COURT.select()
     
     if query:
-        query_builder = query_builder.filter(Court.name.ilike(f'%{query}%'))
+        query_builder = query_builder.where(Court.name.ilike(f'%{query}%'))
     if location:
-        query_builder = query_builder.filter(Court.location.ilike(f'%{location}%'))
+        query_builder = query_builder.where(Court.location.ilike(f'%{location}%'))
     if court_type:
-        query_builder = query_builder.filter(Court.court_type.ilike(f'%{court_type}%'))
-    
-    courts = query_builder.all()
+        query_builder = query_builder.where(Court.court_type.ilike(f'%{court_type}%'))
     
-    return jsonify([{
-        'id': court.id,
-        'name': court.name,
-        'location': court.location,
-        'type': court.court_type,
-        'price': court.price,
-        'rating': court.rating,
-        'image': court.image
-    } for court in courts])
+    return jsonify(serializers.COURT.all(query_builder))
 
 @app.route('/book', methods=['POST'])
+@idempotent
 def book_court():
     data = request.get_json()
     court_id = data['court_id']
@@ -207,8 +211,8 @@ def book_court():
     start_time = datetime.strptime(data['start_time'], '%H:%M').time()
     end_time = datetime.strptime(data['end_time'], '%H:%M').time()
     
-    # Resource ID para bloqueo
-    resource_id = f"court_{court_id}_{booking_date}_{start_time}"
+    # Resource ID para bloqueo: cancha y día, para que dos turnos solapados con distinto inicio no se verifiquen a la vez
+    resource_id = f"court_{court_id}_{booking_date}"
     
     try:
         # Adquirir bloqueo para evitar reservas simultáneas
@@ -272,18 +276,8 @@ def book_court():
         db.session.add(booking)
         db.session.flush()  # Obtener ID sin commit final
         
-        # Registrar auditoría
-        log_audit(
-            'create_booking',
-            resource_type='booking',
-            resource_id=booking.id,
-            details=f'Reserva #{booking.id} para {court.name} el {booking_date} de {start_time} a {end_time}'
-        )
-        
-        db.session.commit()
-        
-        # Emitir notificación en tiempo real
-        socketio.emit('new_booking', {
+        # Notificación en tiempo real (outbox, se confirma junto con la reserva)
+        enqueue_event('new_booking', {
             'booking_id': booking.id,
             'court_id': booking.court_id,
             'court_name': court.name,
@@ -294,6 +288,16 @@ def book_court():
             'created_at': booking.created_at.isoformat()
         }, room='admin_room')
         
+        # Registrar auditoría
+        log_audit(
+            'create_booking',
+            resource_type='booking',
+            resource_id=booking.id,
+            details=f'Reserva #{booking.id} para {court.name} el {booking_date} de {start_time} a {end_time}'
+        )
+        
+        db.session.commit()
+        
         return jsonify({
             'success': True,
             'message': 'Reserva creada correctamente',
@@ -334,17 +338,226 @@ def book_court():
         # Liberar el bloqueo
         LockManager.release_lock(resource_id)
 
+def _expand_bulk_slots(data):
+    """Convierte una regla de recurrencia o una lista de horarios en (court_id, fecha, inicio, fin)"""
+    max_slots = app.config.get('BULK_BOOKING_MAX_SLOTS', 400)
+    default_court = data.get('court_id')
+    slots = []
+
+    if data.get('slots'):
+        for slot in data['slots']:
+            slots.append((
+                int(slot.get('court_id', default_court)),
+                datetime.strptime(slot['date'], '%Y-%m-%d').date(),
+                datetime.strptime(slot.get('start_time', data.get('start_time')), '%H:%M').time(),
+                datetime.strptime(slot.get('end_time', data.get('end_time')), '%H:%M').time()
+            ))
+    elif data.get('recurrence'):
+        rule = data['recurrence']
+        step = {'daily': 1, 'weekly': 7}.get(rule.get('frequency', 'weekly'))
+        if not step:
+            raise ValueError('Frecuencia inválida (usar daily o weekly)')
+        step *= int(rule.get('interval', 1))
+        if step <= 0:
+            raise ValueError('Intervalo inválido')
+
+        current = datetime.strptime(rule['start_date'], '%Y-%m-%d').date()
+        until = datetime.strptime(rule['until'], '%Y-%m-%d').date() if rule.get('until') else None
+        count = int(rule['count']) if rule.get('count') else None
+        if until is None and count is None:
+            raise ValueError('La recurrencia requiere count o until')
+        if count is not None and count > max_slots:
+            raise ValueError(f'Máximo {max_slots} horarios por petición')
+
+        start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+        end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+        while (count is None or len(slots) < count) and (until is None or current <= until):
+            if len(slots) >= max_slots:
+                # until abarca más horarios que el máximo: rechazar en vez de reservar una parte
+                raise ValueError(f'Máximo {max_slots} horarios por petición')
+            slots.append((int(default_court), current, start_time, end_time))
+            current += timedelta(days=step)
+    else:
+        raise ValueError('Se requiere slots o recurrence')
+
+    if not slots:
+        raise ValueError('No hay horarios para reservar')
+    if len(slots) > max_slots:
+        raise ValueError(f'Máximo {max_slots} horarios por petición')
+    for _, _, start_time, end_time in slots:
+        if end_time <= start_time:
+            raise ValueError('La hora de fin debe ser posterior a la de inicio')
+
+    return slots
+
+@app.route('/api/bookings/bulk', methods=['POST'])
+@login_required
+@idempotent
+def bulk_book_courts():
+    """Crea varias reservas (lista de horarios o recurrencia) en una sola transacción"""
+    data = request.get_json() or {}
+    mode = data.get('mode', 'all_or_nothing')  # all_or_nothing, best_effort
+
+    if mode not in ('all_or_nothing', 'best_effort'):
+        return jsonify({'success': False, 'message': 'Modo inválido'}), 400
+
+    try:
+        slots = _expand_bulk_slots(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Datos inválidos: {str(e)}'}), 400
+
+    # Mismas claves de bloqueo que /book, adquiridas en orden para evitar interbloqueos
+    resource_ids = sorted({f"court_{c}_{d}" for c, d, _, _ in slots})
+    acquired = []
+
+    try:
+        for resource_id in resource_ids:
+            LockManager.acquire_lock(resource_id)
+            acquired.append(resource_id)
+
+        court_ids = {slot[0] for slot in slots}
+        courts = {court.id: court for court in Court.query.filter(Court.id.in_(court_ids)).all()}
+        missing = court_ids - set(courts)
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': f'Cancha no encontrada: {", ".join(str(c) for c in sorted(missing))}'
+            }), 404
+
+        # Una sola consulta para todas las reservas que podrían solaparse
+        dates = {slot[1] for slot in slots}
+        occupied = {}
+        for court_id, booking_date, start_time, end_time in db.session.query(
+            Booking.court_id, Booking.booking_date, Booking.start_time, Booking.end_time
+        ).filter(
+            Booking.court_id.in_(court_ids),
+            Booking.booking_date.in_(dates),
+            Booking.status != 'cancelled'
+        ):
+            occupied.setdefault((court_id, booking_date), []).append((start_time, end_time))
+
+        accepted = []
+        conflicts = []
+        for court_id, booking_date, start_time, end_time in sorted(slots):
+            taken = occupied.setdefault((court_id, booking_date), [])
+            if any(s < end_time and e > start_time for s, e in taken):
+                conflicts.append({
+                    'court_id': court_id,
+                    'date': booking_date.strftime('%Y-%m-%d'),
+                    'start_time': start_time.strftime('%H:%M'),
+                    'end_time': end_time.strftime('%H:%M')
+                })
+                continue
+            # Evitar también solapamientos dentro de la misma petición
+            taken.append((start_time, end_time))
+            accepted.append((court_id, booking_date, start_time, end_time))
+
+        if conflicts and mode == 'all_or_nothing':
+            return jsonify({
+                'success': False,
+                'message': f'{len(conflicts)} horarios ya están reservados',
+                'conflicts': conflicts
+            }), 409
+
+        user = User.query.get(session['user_id'])
+
+        bookings = []
+        for court_id, booking_date, start_time, end_time in accepted:
+            duration_hours = (datetime.combine(booking_date, end_time) -
+                              datetime.combine(booking_date, start_time)).total_seconds() / 3600
+            total_amount = courts[court_id].price * duration_hours
+            bookings.append(Booking(
+                court_id=court_id,
+                user_id=user.id,
+                user_name=user.username,
+                user_email=user.email,
+                booking_date=booking_date,
+                start_time=start_time,
+                end_time=end_time,
+                status='pending',
+                total_amount=total_amount,
+                deposit_amount=total_amount * 0.5
+            ))
+
+        if bookings:
+            db.session.add_all(bookings)
+            db.session.flush()
+
+            # Una sola notificación agregada
+            enqueue_event('bulk_booking', {
+                'count': len(bookings),
+                'booking_ids': [booking.id for booking in bookings],
+                'court_ids': sorted({booking.court_id for booking in bookings}),
+                'user_name': user.username,
+                'first_date': min(booking.booking_date for booking in bookings).strftime('%Y-%m-%d'),
+                'last_date': max(booking.booking_date for booking in bookings).strftime('%Y-%m-%d')
+            }, room='admin_room')
+
+            # Un único registro de auditoría (confirma la transacción)
+            log_audit(
+                'create_bulk_booking',
+                resource_type='booking',
+                details=f'{len(bookings)} reservas creadas ({bookings[0].id}-{bookings[-1].id}), '
+                        f'{len(conflicts)} conflictos, modo {mode}'
+            )
+            db.session.commit()
+
+        return jsonify({
+            'success': bool(bookings),
+            'message': f'{len(bookings)} reservas creadas',
+            'created': [{
+                'booking_id': booking.id,
+                'court_id': booking.court_id,
+                'date': booking.booking_date.strftime('%Y-%m-%d'),
+                'start_time': booking.start_time.strftime('%H:%M'),
+                'end_time': booking.end_time.strftime('%H:%M'),
+                'total_amount': booking.total_amount,
+                'deposit_amount': booking.deposit_amount
+            } for booking in bookings],
+            'conflicts': conflicts,
+            'total_amount': sum(booking.total_amount for booking in bookings),
+            'deposit_amount': sum(booking.deposit_amount for booking in bookings)
+        }), 200 if bookings else 409
+
+    except TimeoutError:
+        return jsonify({
+            'success': False,
+            'message': 'El sistema está ocupado, por favor intenta nuevamente en unos segundos'
+        }), 503
+
+    except exc.IntegrityError:
+        # Otro proceso reservó alguno de los horarios (booking_no_overlap: exclusión o trigger)
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Alguno de los horarios acaba de ser reservado, por favor intenta nuevamente'
+        }), 409
+
+    except Exception as e:
+        db.session.rollback()
+        log_audit(
+            'create_bulk_booking_failed',
+            resource_type='booking',
+            details=f'Error al crear reservas masivas: {str(e)}',
+            success=False,
+            error_message=str(e)
+        )
+        return jsonify({
+            'success': False,
+            'message': 'Error al procesar las reservas'
+        }), 500
+
+    finally:
+        for resource_id in acquired:
+            LockManager.release_lock(resource_id)
+
 # Rutas adicionales según rol
 @app.route('/dashboard')
 @login_required
 def dashboard():
     user = User.query.get(session['user_id'])
     
-    # Debug: imprimir información del usuario
-    print(f"DEBUG - Usuario: {user.username if user else 'None'}")
-    print(f"DEBUG - Rol: {user.role if user else 'None'}")
-    print(f"DEBUG - is_admin: {user.is_admin() if user else 'None'}")
-    print(f"DEBUG - is_operator: {user.is_operator() if user else 'None'}")
+    app.logger.debug("Dashboard: usuario=%s rol=%s", user.username if user else None, user.role if user else None)
     
     # Verificar si el usuario existe
     if not user:
@@ -383,6 +596,8 @@ def update_court(court_id):
         court = Court.query.get(court_id)
         if not court:
             return jsonify({'success': False, 'message': 'Cancha no encontrada'}), 404
+        if if_match_failed(court.version):
+            return version_conflict(Court, court_id, COURT_CONFLICT_MESSAGE)
         
         # Actualizar campos
         if 'name' in data:
@@ -398,6 +613,7 @@ def update_court(court_id):
         if 'image' in data:
             court.image = data['image']
         
+        # UPDATE ... WHERE version = versión leída: falla si otro operador la modificó en el medio
         db.session.commit()
         
         # Registrar auditoría
@@ -408,7 +624,7 @@ def update_court(court_id):
             details=f'Cancha "{court.name}" actualizada'
         )
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'message': 'Cancha actualizada correctamente',
             'court': {
@@ -418,13 +634,19 @@ def update_court(court_id):
                 'type': court.court_type,
                 'price': court.price,
                 'description': court.description,
-                'image': court.image
+                'image': court.image,
+                'version': court.version
             }
         })
+        response.set_etag(version_etag(court.version))
+        return response
+        
+    except StaleDataError:
+        return version_conflict(Court, court_id, COURT_CONFLICT_MESSAGE)
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error actualizando cancha: {e}")
+        app.logger.error(f"Error actualizando cancha: {e}")
         return jsonify({'success': False, 'message': 'Error al actualizar cancha'}), 500
 
 @app.route('/api/courts/<int:court_id>', methods=['DELETE'])
@@ -468,7 +690,7 @@ def delete_court(court_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error eliminando cancha: {e}")
+        app.logger.error(f"Error eliminando cancha: {e}")
         return jsonify({'success': False, 'message': 'Error al eliminar cancha'}), 500
 
 @app.route('/api/courts', methods=['POST'])
@@ -503,6 +725,15 @@ def create_court():
         )
         
         db.session.add(court)
+        db.session.flush()
+        
+        # Notificar a administradores
+        enqueue_event('court_added', {
+            'court_id': court.id,
+            'court_name': court.name,
+            'added_by': session.get('username', 'Unknown')
+        }, room='admin_room')
+        
         db.session.commit()
         
         # Registrar auditoría
@@ -513,13 +744,6 @@ def create_court():
             details=f'Cancha "{court.name}" creada en {court.location}'
         )
         
-        # Notificar a administradores
-        socketio.emit('court_added', {
-            'court_id': court.id,
-            'court_name': court.name,
-            'added_by': session.get('username', 'Unknown')
-        }, room='admin_room')
-        
         return jsonify({
             'success': True,
             'message': 'Cancha agregada correctamente',
@@ -550,20 +774,17 @@ def create_court():
         }), 400
 
 @app.route('/api/courts/<int:court_id>', methods=['GET'])
+@read_only
 def get_court(court_id):
-    court = Court.query.get_or_404(court_id)
-    return jsonify({
-        'id': court.id,
-        'name': court.name,
-        'location': court.location,
-        'type': court.court_type,
-        'price': court.price,
-        'rating': court.rating,
-        'image': court.image,
-        'description': court.description
-    })
+    court = serializers.COURT_DETAIL.first(serializers.COURT_DETAIL.select().where(Court.id == court_id))
+    if court is None:
+        abort(404)
+    response = jsonify(court)
+    response.set_etag(version_etag(court['version']))
+    return response
 
 @app.route('/api/courts/<int:court_id>/schedule', methods=['GET'])
+@read_only
 @operator_required
 def get_court_schedule(court_id):
     """Obtiene el horario de una cancha específica"""
@@ -572,32 +793,18 @@ def get_court_schedule(court_id):
         today = date.today()
         end_date = today + timedelta(days=7)
         
-        # Obtener todas las reservas de la cancha en los próximos 7 días
-        bookings = Booking.query.filter(
-            Booking.court_id == court_id,
-            Booking.booking_date >= today,
-            Booking.booking_date <= end_date,
-            Booking.status != 'cancelled'
-        ).order_by(Booking.booking_date, Booking.start_time).all()
-        
         # Obtener información de la cancha
         court = Court.query.get(court_id)
         if not court:
             return jsonify({'success': False, 'message': 'Cancha no encontrada'}), 404
         
-        # Formatear las reservas
-        schedule = []
-        for booking in bookings:
-            schedule.append({
-                'id': booking.id,
-                'date': booking.booking_date.strftime('%Y-%m-%d'),
-                'start_time': booking.start_time.strftime('%H:%M'),
-                'end_time': booking.end_time.strftime('%H:%M'),
-                'user_name': booking.user_name,
-                'user_email': booking.user_email,
-                'status': booking.status,
-                'payment_status': booking.payment_status
-            })
+        # Todas las reservas de la cancha en los próximos 7 días
+        schedule = serializers.BOOKING_SCHEDULE.all(serializers.BOOKING_SCHEDULE.select().where(
+            Booking.court_id == court_id,
+            Booking.booking_date >= today,
+            Booking.booking_date <= end_date,
+            Booking.status != 'cancelled'
+        ).order_by(Booking.booking_date, Booking.start_time))
         
         return jsonify({
             'success': True,
@@ -614,62 +821,65 @@ def get_court_schedule(court_id):
         })
         
     except Exception as e:
-        print(f"Error obteniendo horario de cancha: {e}")
+        app.logger.error(f"Error obteniendo horario de cancha: {e}")
         return jsonify({'success': False, 'message': 'Error al obtener horario'}), 500
 
 @app.route('/api/bookings', methods=['GET'])
+@read_only
 @login_required
+@conditional_get(changes_validator('booking', 'court', 'user'))
 def get_bookings():
     user = User.query.get(session['user_id'])
     
-    if user.is_admin():
-        bookings = Booking.query.all()
-    elif user.is_operator():
-        bookings = Booking.query.all()
-    else:
+    query = serializers.BOOKING.select()
+    if not user.is_admin() and not user.is_operator():
         # Buscar reservas por user_id o por user_name (para compatibilidad)
-        bookings = Booking.query.filter(
+        query = query.where(
             (Booking.user_id == user.id) | 
             (Booking.user_name == user.username)
-        ).all()
+        )
     
-    return jsonify([{
-        'id': booking.id,
-        'court_id': booking.court_id,
-        'court_name': booking.court.name if booking.court else 'N/A',
-        'user_name': booking.user_name,
-        'user_email': booking.user_email,
-        'date': booking.booking_date.strftime('%Y-%m-%d'),
-        'start_time': booking.start_time.strftime('%H:%M'),
-        'end_time': booking.end_time.strftime('%H:%M'),
-        'status': booking.status,
-        'payment_status': booking.payment_status,
-        'total_amount': booking.total_amount,
-        'deposit_amount': booking.deposit_amount,
-        'created_at': booking.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    } for booking in bookings])
+    return jsonify(serializers.BOOKING.all(query))
 
 @app.route('/api/bookings/<int:booking_id>', methods=['PUT'])
 @operator_required
 def update_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     data = request.get_json()
+    if if_match_failed(booking.version):
+        return version_conflict(Booking, booking_id, BOOKING_CONFLICT_MESSAGE)
     
     if 'status' in data:
-        booking.status = data['status']
-        db.session.commit()
-        
-        # Emitir notificación de actualización
-        socketio.emit('booking_updated', {
-            'booking_id': booking.id,
-            'status': booking.status,
-            'court_name': booking.court.name if booking.court else 'N/A'
-        }, room='admin_room')
+        # UPDATE ... WHERE version = versión leída (en el autoflush o en el commit):
+        # falla si la reserva cambió en el medio
+        try:
+            booking.status = data['status']
+            
+            # Emitir notificación de actualización
+            enqueue_event('booking_updated', {
+                'booking_id': booking.id,
+                'status': booking.status,
+                'court_name': booking.court.name if booking.court else 'N/A'
+            }, room='admin_room')
+            
+            db.session.commit()
+        except StaleDataError:
+            return version_conflict(Booking, booking_id, BOOKING_CONFLICT_MESSAGE)
+        except exc.IntegrityError:
+            # Reactivar una reserva cancelada cuyo horario ya ocupó otra (booking_no_overlap)
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'El horario de esta reserva ya está ocupado por otra reserva activa'
+            }), 409
         
-        return jsonify({
+        response = jsonify({
             'success': True,
-            'message': 'Reserva actualizada correctamente'
+            'message': 'Reserva actualizada correctamente',
+            'version': booking.version
         })
+        response.set_etag(version_etag(booking.version))
+        return response
     
     return jsonify({
         'success': False,
@@ -700,10 +910,9 @@ def delete_booking(booking_id):
         )
         
         db.session.delete(booking)
-        db.session.commit()
         
         # Notificar eliminación
-        socketio.emit('booking_deleted', {
+        enqueue_event('booking_deleted', {
             'booking_id': booking_info['booking_id'],
             'user_name': booking_info['user_name'],
             'court_name': booking_info['court_name'],
@@ -712,6 +921,8 @@ def delete_booking(booking_id):
             'deleted_by': session.get('username', 'Admin')
         }, room='admin_room')
         
+        db.session.commit()
+        
         return jsonify({
             'success': True,
             'message': 'Reserva eliminada correctamente'
@@ -733,45 +944,29 @@ def delete_booking(booking_id):
         }), 400
 
 @app.route('/api/audit-logs', methods=['GET'])
+@read_only
 @admin_required
+@conditional_get(audit_log_validator)
 def get_audit_logs():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     
     # Filtrar por usuario si se especifica
     user_filter = request.args.get('user_id')
-    query = AuditLog.query
+    query = serializers.AUDIT_LOG.select()
     
     if user_filter:
-        query = query.filter(AuditLog.user_id == user_filter)
+        query = query.where(AuditLog.user_id == user_filter)
     
     # Ordenar por fecha descendente
-    logs = query.order_by(AuditLog.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    logs, pagination = serializers.AUDIT_LOG.paginate(
+        query.order_by(AuditLog.timestamp.desc()), page, per_page
     )
     
-    return jsonify({
-        'logs': [{
-            'id': log.id,
-            'username': log.username,
-            'action': log.action,
-            'resource_type': log.resource_type,
-            'resource_id': log.resource_id,
-            'details': log.details,
-            'ip_address': log.ip_address,
-            'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'success': log.success,
-            'error_message': log.error_message
-        } for log in logs.items],
-        'pagination': {
-            'page': logs.page,
-            'pages': logs.pages,
-            'per_page': logs.per_page,
-            'total': logs.total
-        }
-    })
+    return jsonify({'logs': logs, 'pagination': pagination})
 
 @app.route('/api/critical-events', methods=['GET'])
+@read_only
 @admin_required
 def get_critical_events():
     page = request.args.get('page', 1, type=int)
@@ -779,36 +974,17 @@ def get_critical_events():
     
     # Filtrar por tipo si se especifica
     event_type = request.args.get('event_type')
-    query = CriticalEvent.query
+    query = serializers.CRITICAL_EVENT.select()
     
     if event_type:
-        query = query.filter(CriticalEvent.event_type == event_type)
+        query = query.where(CriticalEvent.event_type == event_type)
     
-    # Ordenar por fecha descendente
-    events = query.order_by(CriticalEvent.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    # Ordenar por última ocurrencia descendente
+    events, pagination = serializers.CRITICAL_EVENT.paginate(
+        query.order_by(CriticalEvent.last_seen.desc()), page, per_page
     )
     
-    return jsonify({
-        'events': [{
-            'id': event.id,
-            'event_type': event.event_type,
-            'description': event.description,
-            'severity': event.severity,
-            'ip_address': event.ip_address,
-            'timestamp': event.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'resolved': event.resolved,
-            'resolved_by': event.resolver.username if event.resolver else None,
-            'resolved_at': event.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if event.resolved_at else None,
-            'additional_data': json.loads(event.additional_data) if event.additional_data else None
-        } for event in events.items],
-        'pagination': {
-            'page': events.page,
-            'pages': events.pages,
-            'per_page': events.per_page,
-            'total': events.total
-        }
-    })
+    return jsonify({'events': events, 'pagination': pagination})
 
 @app.route('/api/integrity-check', methods=['POST'])
 @admin_required
@@ -933,19 +1109,13 @@ def get_integrity_stats():
 def get_current_user():
     """Obtiene información del usuario actual"""
     try:
-        user = User.query.get(session['user_id'])
+        user = serializers.USER.first(serializers.USER.select().where(User.id == session['user_id']))
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
         return jsonify({
             'success': True,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'created_at': user.created_at.strftime('%Y-%m-%d %H:%M:%S') if user.created_at else None
-            }
+            'user': user
         })
     except Exception as e:
         return jsonify({
@@ -954,19 +1124,14 @@ def get_current_user():
         }), 400
 
 @app.route('/api/users', methods=['GET'])
+@read_only
 @admin_required
+@conditional_get(changes_validator('user'))
 def get_users():
     """Obtiene lista de usuarios"""
     try:
-        users = User.query.all()
         return jsonify({
-            'users': [{
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'created_at': user.created_at.strftime('%Y-%m-%d %H:%M:%S') if user.created_at else None
-            } for user in users]
+            'users': serializers.USER.all(serializers.USER.select())
         })
     except Exception as e:
         return jsonify({
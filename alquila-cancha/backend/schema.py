@@ -0,0 +1,176 @@
+"""Versionado del esquema de la base de datos
+
+La app no crea tablas ni carga datos al importarse: las migraciones se aplican
+con este comando (una vez por despliegue) y al arrancar cada worker solo se
+verifica la versión con una consulta.
+
+Uso:
+    python schema.py upgrade                     # crea o actualiza el esquema
+    python schema.py upgrade --no-sample-courts  # base nueva sin canchas de ejemplo
+    python schema.py status
+"""
+import argparse
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.schema import AddConstraint
+from config import app, db
+from models import SchemaVersion, Job, JobSchedule, CriticalEvent, IdempotencyRecord, ConnectionInvalidation, booking_no_overlap, booking_no_overlap_trigger, booking_no_overlap_update_trigger, create_admin_user, add_sample_courts
+
+class SchemaError(RuntimeError):
+    pass
+
+def _baseline(conn):
+    """Esquema inicial: todas las tablas de models.py (no toca las que ya existen)"""
+    db.metadata.create_all(bind=conn)
+
+def _job_tables(conn):
+    db.metadata.create_all(bind=conn, tables=[Job.__table__, JobSchedule.__table__])
+
+def _critical_event_aggregation(conn):
+    """Contador de repeticiones y última ocurrencia en critical_event"""
+    columns = {column['name'] for column in inspect(conn).get_columns('critical_event')}
+    if 'occurrences' not in columns:
+        conn.exec_driver_sql("ALTER TABLE critical_event ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1")
+    if 'last_seen' not in columns:
+        column_type = CriticalEvent.__table__.c.last_seen.type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE critical_event ADD COLUMN last_seen {column_type}")
+        conn.exec_driver_sql("UPDATE critical_event SET last_seen = timestamp")
+    for index in CriticalEvent.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _booking_overlap_constraint(conn):
+    """Reservas solapadas rechazadas por la base: exclusión en PostgreSQL, trigger en SQLite"""
+    if conn.dialect.name == 'sqlite':
+        conn.execute(booking_no_overlap_trigger)
+        return
+    if conn.dialect.name != 'postgresql':
+        return
+    exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+                          {'name': booking_no_overlap.name}).scalar()
+    if not exists:
+        # Falla si ya hay reservas activas solapadas: hay que cancelarlas antes de migrar
+        conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        conn.execute(AddConstraint(booking_no_overlap))
+
+def _booking_overlap_update_trigger(conn):
+    """SQLite: el trigger de solapamiento también en UPDATE (PostgreSQL ya lo cubre la exclusión)"""
+    if conn.dialect.name == 'sqlite':
+        conn.execute(booking_no_overlap_update_trigger)
+
+def _version_columns(conn):
+    """Columna version de court y booking (concurrencia optimista)"""
+    for table in ('court', 'booking'):
+        columns = {column['name'] for column in inspect(conn).get_columns(table)}
+        if 'version' not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+def _idempotency_reservations(conn):
+    """status_code y body nulos en idempotency_record: la fila se inserta al empezar la petición"""
+    columns = {column['name']: column for column in inspect(conn).get_columns('idempotency_record')}
+    if columns['status_code']['nullable'] and columns['body']['nullable']:
+        return
+    if conn.dialect.name != 'sqlite':
+        conn.exec_driver_sql("ALTER TABLE idempotency_record ALTER COLUMN status_code DROP NOT NULL")
+        conn.exec_driver_sql("ALTER TABLE idempotency_record ALTER COLUMN body DROP NOT NULL")
+        return
+    # SQLite no modifica restricciones de columnas: recrear la tabla conservando las filas
+    table = IdempotencyRecord.__table__
+    names = ', '.join(column.name for column in table.columns)
+    conn.exec_driver_sql("ALTER TABLE idempotency_record RENAME TO idempotency_record_old")
+    for index in table.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    table.create(bind=conn)
+    conn.exec_driver_sql(f"INSERT INTO idempotency_record ({names}) SELECT {names} FROM idempotency_record_old")
+    conn.exec_driver_sql("DROP TABLE idempotency_record_old")
+
+def _connection_invalidation_table(conn):
+    db.metadata.create_all(bind=conn, tables=[ConnectionInvalidation.__table__])
+
+# (versión, descripción, función que recibe la conexión). Solo se agregan al final
+MIGRATIONS = [
+    (1, 'Esquema inicial', _baseline),
+    (2, 'Cola persistente de trabajos y recurrentes', _job_tables),
+    (3, 'Agregación de eventos críticos repetidos', _critical_event_aggregation),
+    (4, 'Rechazo de reservas solapadas en la base', _booking_overlap_constraint),
+    (5, 'Versión de canchas y reservas para actualizaciones condicionales', _version_columns),
+    (6, 'Rechazo de reservas solapadas también al modificarlas', _booking_overlap_update_trigger),
+    (7, 'Reserva atómica de claves de idempotencia', _idempotency_reservations),
+    (8, 'Invalidaciones de conexiones SocketIO compartidas entre workers', _connection_invalidation_table),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def current_version():
+    """Última migración aplicada; 0 si la base no está versionada"""
+    table = SchemaVersion.__table__
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(db.select(db.func.max(table.c.version))).scalar() or 0
+    except exc.DBAPIError:
+        # Sin tabla schema_version: base vacía o creada antes del versionado
+        return 0
+
+def check_schema():
+    """Verificación de arranque: una consulta, falla si hay migraciones pendientes"""
+    version = current_version()
+    if version < SCHEMA_VERSION:
+        raise SchemaError(
+            f"La base está en la versión {version} del esquema y la aplicación requiere la "
+            f"{SCHEMA_VERSION}. Ejecutar: python schema.py upgrade"
+        )
+    if version > SCHEMA_VERSION:
+        # Despliegue escalonado: las migraciones nuevas deben ser compatibles con la versión anterior
+        app.logger.warning(f"Esquema en versión {version}, más nueva que la de esta aplicación ({SCHEMA_VERSION})")
+    return version
+
+def upgrade(sample_courts=True, log=print):
+    """Aplica las migraciones pendientes. Devuelve (versión anterior, versión actual)"""
+    table = SchemaVersion.__table__
+    with db.engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        previous = 0
+        if table.name in existing:
+            previous = conn.execute(db.select(db.func.max(table.c.version))).scalar() or 0
+
+        if not existing:
+            # Base nueva: el esquema inicial ya incluye todas las columnas actuales
+            _baseline(conn)
+            pending = MIGRATIONS
+        else:
+            pending = [m for m in MIGRATIONS if m[0] > previous]
+            for version, description, migrate in pending:
+                log(f"  migración {version}: {description}")
+                migrate(conn)
+
+        if pending:
+            conn.execute(table.insert(), [{'version': v, 'description': d} for v, d, _ in pending])
+
+    if previous == 0:
+        # Datos iniciales, solo al crear o versionar la base por primera vez
+        create_admin_user()
+        if sample_courts:
+            add_sample_courts()
+
+    if pending:
+        log(f"Esquema actualizado de la versión {previous} a la {SCHEMA_VERSION}")
+    else:
+        log(f"Esquema al día (versión {SCHEMA_VERSION})")
+    return previous, SCHEMA_VERSION
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    upgrade_parser = subparsers.add_parser('upgrade', help='Aplicar las migraciones pendientes')
+    upgrade_parser.add_argument('--no-sample-courts', action='store_true', help='No cargar canchas de ejemplo en una base nueva')
+    subparsers.add_parser('status', help='Mostrar la versión del esquema')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'upgrade':
+            upgrade(sample_courts=not args.no_sample_courts)
+        else:
+            version = current_version()
+            state = 'al día' if version == SCHEMA_VERSION else 'migraciones pendientes' if version < SCHEMA_VERSION else 'más nueva que la aplicación'
+            print(f"Versión del esquema: {version} (aplicación: {SCHEMA_VERSION}, {state})")
+
+if __name__ == '__main__':
+    main()
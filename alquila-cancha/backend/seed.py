@@ -0,0 +1,383 @@
+"""Carga masiva de datos: genera o importa canchas, usuarios, reservas y pagos
+
+Inserta por lotes (executemany) dentro de una única transacción y, en SQLite,
+con los PRAGMA relajados mientras dura la carga. Pensado para dar de alta clubes
+completos y para generar volúmenes realistas en pruebas de rendimiento.
+
+Uso:
+    python seed.py generate --scale medium
+    python seed.py import courts clubes/canchas.csv
+    python seed.py import bookings reservas.ndjson --batch-size 50000
+"""
+from datetime import date, datetime, time as dtime, timedelta
+import argparse
+import csv
+import functools
+import itertools
+import json
+import random
+import time
+from sqlalchemy import types, text, literal
+from werkzeug.security import generate_password_hash
+from config import app, db
+from models import Court, User, Booking, Payment, AuditLog, ChangeLog
+
+TABLES = {
+    'courts': Court.__table__,
+    'users': User.__table__,
+    'bookings': Booking.__table__,
+    'payments': Payment.__table__,
+    'audit': AuditLog.__table__
+}
+
+# Tablas cuyas altas deben verse en /api/changes
+CHANGE_TYPES = {'courts': 'court', 'users': 'user', 'bookings': 'booking', 'payments': 'payment'}
+
+SCALES = {
+    'small': {'courts': 200, 'users': 1000, 'bookings': 50_000, 'audit': 50_000},
+    'medium': {'courts': 2000, 'users': 10_000, 'bookings': 500_000, 'audit': 500_000},
+    'large': {'courts': 5000, 'users': 50_000, 'bookings': 2_000_000, 'audit': 2_000_000},
+}
+
+class SeedError(Exception):
+    pass
+
+def _coercer(column_type):
+    """Conversión de texto (CSV/NDJSON) al tipo de la columna; None si la columna es de texto"""
+    if isinstance(column_type, types.DateTime):
+        return datetime.fromisoformat
+    if isinstance(column_type, types.Date):
+        return date.fromisoformat
+    if isinstance(column_type, types.Time):
+        return dtime.fromisoformat
+    if isinstance(column_type, types.Boolean):
+        return lambda value: value.strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    if isinstance(column_type, types.Integer):
+        return int
+    if isinstance(column_type, types.Float):
+        return float
+    return None
+
+class BulkLoader:
+    """Inserta filas por lotes en una única transacción"""
+
+    def __init__(self, batch_size=10_000, relax_pragmas=True, track_changes=False, check_overlaps=True, log=print):
+        self.batch_size = batch_size
+        self.relax_pragmas = relax_pragmas
+        self.track_changes = track_changes
+        self.check_overlaps = check_overlaps
+        self.log = log
+        self.counts = {}
+        self._password_hashes = {}
+
+    def __enter__(self):
+        self.conn = db.engine.connect()
+        self.is_sqlite = self.conn.dialect.name == 'sqlite'
+        if self.is_sqlite and self.relax_pragmas:
+            # Fuera de la transacción: synchronous no se puede cambiar dentro de una
+            self.conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            self.conn.exec_driver_sql('PRAGMA cache_size=-200000')
+            self.conn.exec_driver_sql('PRAGMA temp_store=MEMORY')
+            self.conn.commit()
+        self.transaction = self.conn.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.transaction.commit()
+            else:
+                self.transaction.rollback()
+        finally:
+            if self.is_sqlite and self.relax_pragmas:
+                self.conn.exec_driver_sql('PRAGMA synchronous=FULL')
+                self.conn.commit()
+            self.conn.close()
+        return False
+
+    def max_id(self, name):
+        table = TABLES[name]
+        return self.conn.execute(db.select(db.func.max(table.c.id))).scalar() or 0
+
+    def _hash_password(self, password):
+        # Hashear es lento: reutilizar el hash de contraseñas repetidas
+        if password not in self._password_hashes:
+            self._password_hashes[password] = generate_password_hash(password)
+        return self._password_hashes[password]
+
+    def _columns(self, table, keys):
+        """Columnas a insertar: las presentes en la fila más las que tienen default"""
+        columns = [c for c in table.columns if c.name in keys or (c.default is not None and not c.primary_key)]
+        unknown = set(keys) - {c.name for c in table.columns}
+        if unknown:
+            raise SeedError(f"Columnas desconocidas para {table.name}: {', '.join(sorted(unknown))}")
+        return columns
+
+    def _converter(self, name, columns, bind_processors):
+        """Arma, una sola vez por carga, la función que pasa una fila (dict) a tupla de valores"""
+        missing = object()
+        plan = []
+        for column in columns:
+            default = column.default
+            if default is None:
+                make_default = lambda: None
+            elif default.is_callable:
+                make_default = functools.partial(default.arg, None)
+            else:
+                make_default = functools.partial(lambda value: value, default.arg)
+            process = None
+            if bind_processors:
+                process = column.type.dialect_impl(self.conn.dialect).bind_processor(self.conn.dialect)
+                if process:
+                    # Fechas y horas se repiten mucho: memorizar su conversión
+                    process = functools.lru_cache(maxsize=8192)(process)
+            plan.append((column.name, _coercer(column.type), process, make_default))
+
+        hash_passwords = name == 'users'
+
+        def convert(row):
+            if hash_passwords and 'password' in row:
+                row = dict(row)
+                row['password_hash'] = self._hash_password(row.pop('password'))
+            values = []
+            for key, coerce, process, make_default in plan:
+                value = row.get(key, missing)
+                if value is missing:
+                    value = make_default()
+                elif value.__class__ is str and coerce:
+                    value = coerce(value) if value != '' else None
+                elif value == '':
+                    value = None
+                if process and value is not None:
+                    value = process(value)
+                values.append(value)
+            return tuple(values)
+
+        return convert
+
+    def load(self, name, rows):
+        """Inserta las filas (dicts) en la tabla; devuelve la cantidad insertada"""
+        table = TABLES[name]
+        first_id = self.max_id(name)
+        started = time.time()
+        total = 0
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        keys = set(first)
+        if name == 'users' and 'password' in keys:
+            keys = (keys - {'password'}) | {'password_hash'}
+        columns = self._columns(table, keys)
+
+        if self.is_sqlite:
+            # Camino rápido: executemany del driver con tuplas ya convertidas
+            convert = self._converter(name, columns, bind_processors=True)
+            statement = (f"INSERT INTO {table.name} ({', '.join(c.name for c in columns)}) "
+                         f"VALUES ({', '.join('?' for _ in columns)})")
+            execute = lambda batch: self.conn.exec_driver_sql(statement, [convert(row) for row in batch])
+        else:
+            convert = self._converter(name, columns, bind_processors=False)
+            names = [c.name for c in columns]
+            execute = lambda batch: self.conn.execute(table.insert(), [dict(zip(names, convert(row))) for row in batch])
+
+        batch = []
+        for row in itertools.chain([first], rows):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                execute(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            execute(batch)
+            total += len(batch)
+
+        if name == 'bookings' and self.check_overlaps:
+            self._check_overlaps(first_id)
+        if self.track_changes and name in CHANGE_TYPES:
+            # Las inserciones por Core no pasan por el listener after_flush del change_log
+            self.conn.execute(ChangeLog.__table__.insert().from_select(
+                ['resource_type', 'resource_id', 'action', 'timestamp'],
+                db.select(literal(CHANGE_TYPES[name]), table.c.id, literal('upsert'),
+                          literal(datetime.utcnow())).where(table.c.id > first_id)
+            ))
+
+        elapsed = time.time() - started
+        self.counts[name] = self.counts.get(name, 0) + total
+        self.log(f"  {name:<9} {total:>10,} filas en {elapsed:6.2f}s ({total / elapsed if elapsed else 0:,.0f} filas/s)")
+        return total
+
+    def _check_overlaps(self, first_id):
+        """Rechaza la carga si alguna reserva nueva se solapa con otra activa de la misma cancha y día"""
+        conflicts = self.conn.execute(text(
+            "SELECT a.id, b.id, b.court_id, b.booking_date FROM booking b "
+            "JOIN booking a ON a.court_id = b.court_id AND a.booking_date = b.booking_date AND a.id < b.id "
+            "WHERE b.id > :first_id AND a.status != 'cancelled' AND b.status != 'cancelled' "
+            "AND a.start_time < b.end_time AND b.start_time < a.end_time LIMIT 10"
+        ), {'first_id': first_id}).all()
+        if conflicts:
+            details = ', '.join(f"#{b} con #{a} (cancha {court}, {day})" for a, b, court, day in conflicts)
+            raise SeedError(f"Reservas solapadas: {details}")
+
+def read_rows(path):
+    """Filas de un archivo .csv (con encabezado) o .ndjson / .jsonl (un objeto por línea)"""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif path.endswith(('.ndjson', '.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        raise SeedError('Formato no soportado (usar .csv, .ndjson o .jsonl)')
+
+# Generación de datos sintéticos
+COURT_TYPES = ['Fútbol 5', 'Fútbol 7', 'Fútbol 11', 'Pádel', 'Tenis']
+LOCATIONS = ['Palermo', 'Recoleta', 'Belgrano', 'Caballito', 'Flores', 'Almagro', 'Núñez', 'Boedo']
+HOURS_PER_DAY = 14  # turnos de 8 a 22
+AUDIT_ACTIONS = ['login_success', 'create_booking', 'update_booking', 'deposit_payment_completed', 'login_failed']
+
+def generate_courts(count):
+    for i in range(count):
+        yield {
+            'name': f'Cancha {i}',
+            'location': f'{LOCATIONS[i % len(LOCATIONS)]}, CABA',
+            'court_type': COURT_TYPES[i % len(COURT_TYPES)],
+            'price': 2000 + (i % 40) * 100,
+            'rating': round(3.5 + (i % 15) / 10, 1),
+            'description': 'Cancha generada'
+        }
+
+def generate_users(count, prefix, password_hash):
+    for i in range(count):
+        yield {
+            'username': f'{prefix}_{i}',
+            'email': f'{prefix}_{i}@seed.local',
+            'password_hash': password_hash,
+            'role': 'visitante'
+        }
+
+def generate_bookings(count, court_ids, user_ids, prefix, until, rng):
+    """Turnos sin solapamiento: recorre canchas y luego días/horas hacia atrás desde `until`"""
+    for k in range(count):
+        slot = k // len(court_ids)
+        day = until - timedelta(days=1 + slot // HOURS_PER_DAY)
+        hour = 8 + slot % HOURS_PER_DAY
+        user_index = rng.randrange(len(user_ids))
+        status = rng.choices(['confirmed', 'pending', 'cancelled'], weights=[70, 20, 10])[0]
+        yield {
+            'court_id': court_ids[k % len(court_ids)],
+            'user_id': user_ids[user_index],
+            'user_name': f'{prefix}_{user_index}',
+            'user_email': f'{prefix}_{user_index}@seed.local',
+            'booking_date': day,
+            'start_time': dtime(hour, 0),
+            'end_time': dtime(hour + 1, 0),
+            'created_at': datetime.combine(day - timedelta(days=3), dtime(12, 0)),
+            'status': status,
+            'payment_status': 'paid' if status == 'confirmed' else 'pending',
+            'total_amount': 3000.0,
+            'deposit_amount': 1500.0
+        }
+
+def generate_payments(paid_bookings):
+    for booking_id, user_id, created_at in paid_bookings:
+        yield {
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'amount': 1500.0,
+            'payment_type': 'deposit',
+            'payment_method': 'credit_card',
+            'transaction_id': f'TXN_SEED_{booking_id}',
+            'status': 'completed',
+            'created_at': created_at,
+            'processed_at': created_at
+        }
+
+def generate_audit(count, user_ids, prefix, rng):
+    start = datetime(2024, 1, 1)
+    for k in range(count):
+        user_index = rng.randrange(len(user_ids))
+        action = AUDIT_ACTIONS[k % len(AUDIT_ACTIONS)]
+        yield {
+            'user_id': user_ids[user_index],
+            'username': f'{prefix}_{user_index}',
+            'action': action,
+            'resource_type': 'booking',
+            'resource_id': k,
+            'details': f'Evento generado {k}',
+            'ip_address': f'10.0.{k % 256}.{(k // 256) % 256}',
+            'user_agent': 'seed',
+            'timestamp': start + timedelta(seconds=k * 7),
+            'success': action != 'login_failed',
+            'error_message': None
+        }
+
+def generate(scale='small', user_prefix='seed_user', password='seed123', bookings_until=None,
+             seed_value=42, batch_size=10_000, log=print):
+    """Genera un dataset completo; las reservas caen antes de `bookings_until`"""
+    sizes = SCALES[scale] if isinstance(scale, str) else scale
+    rng = random.Random(seed_value)
+    until = bookings_until or date.today()
+    started = time.time()
+
+    # Las reservas generadas no se solapan entre sí por construcción
+    with BulkLoader(batch_size=batch_size, check_overlaps=False, log=log) as loader:
+        first_court = loader.max_id('courts')
+        loader.load('courts', generate_courts(sizes['courts']))
+        court_ids = list(range(first_court + 1, first_court + 1 + sizes['courts']))
+
+        first_user = loader.max_id('users')
+        loader.load('users', generate_users(sizes['users'], user_prefix, generate_password_hash(password)))
+        user_ids = list(range(first_user + 1, first_user + 1 + sizes['users']))
+
+        first_booking = loader.max_id('bookings')
+        loader.load('bookings', generate_bookings(sizes['bookings'], court_ids, user_ids, user_prefix, until, rng))
+
+        bookings = Booking.__table__
+        paid = loader.conn.execute(db.select(bookings.c.id, bookings.c.user_id, bookings.c.created_at).where(
+            bookings.c.id > first_booking, bookings.c.payment_status == 'paid'
+        )).all()
+        loader.load('payments', generate_payments(paid))
+
+        loader.load('audit', generate_audit(sizes['audit'], user_ids, user_prefix, rng))
+
+    total = sum(loader.counts.values())
+    elapsed = time.time() - started
+    log(f"  total     {total:>10,} filas en {elapsed:6.2f}s ({total / elapsed if elapsed else 0:,.0f} filas/s)")
+    return loader.counts
+
+def import_file(name, path, batch_size=10_000, log=print):
+    """Importa un CSV/NDJSON a la tabla indicada; las altas quedan registradas en change_log"""
+    with BulkLoader(batch_size=batch_size, track_changes=True, log=log) as loader:
+        loader.load(name, read_rows(path))
+    return loader.counts.get(name, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='Generar datos sintéticos')
+    generate_parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    generate_parser.add_argument('--user-prefix', default='seed_user')
+    generate_parser.add_argument('--password', default='seed123', help='Contraseña de todos los usuarios generados')
+    generate_parser.add_argument('--batch-size', type=int, default=10_000)
+
+    import_parser = subparsers.add_parser('import', help='Importar un archivo CSV o NDJSON')
+    import_parser.add_argument('table', choices=sorted(TABLES))
+    import_parser.add_argument('path')
+    import_parser.add_argument('--batch-size', type=int, default=10_000)
+
+    args = parser.parse_args()
+    with app.app_context():
+        try:
+            if args.command == 'generate':
+                generate(args.scale, args.user_prefix, args.password, batch_size=args.batch_size)
+            else:
+                import_file(args.table, args.path, args.batch_size)
+        except SeedError as e:
+            parser.exit(1, f"Error: {e}\n")
+
+if __name__ == '__main__':
+    main()
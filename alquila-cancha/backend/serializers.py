@@ -0,0 +1,225 @@
+"""Serialización de modelos para las respuestas JSON
+
+Cada Serializer declara los campos de la respuesta como (clave, columna,
+formato, valor por defecto) y se compila una sola vez en una función que
+convierte una fila (tupla de columnas de un select) en un dict, sin instanciar
+objetos del ORM ni llamar a strftime campo por campo. Las relaciones que
+aparecen en la respuesta (nombre de la cancha, usuario que resolvió un evento)
+se traen con outer joins en la misma consulta.
+
+FastJSONProvider hace que jsonify use orjson cuando está instalado.
+"""
+import json
+from datetime import date
+from math import ceil
+from operator import methodcaller
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from config import app, db
+from models import User, Court, Booking, Payment, AuditLog, CriticalEvent
+
+try:
+    import orjson
+except ImportError:
+    # orjson es opcional: sin él se usa el encoder de la librería estándar
+    orjson = None
+
+# Formatos: producen las mismas cadenas que strftime('%Y-%m-%d'), ('%H:%M') y ('%Y-%m-%d %H:%M:%S')
+DATE = date.isoformat
+TIME = methodcaller('isoformat', 'minutes')
+DATETIME = methodcaller('isoformat', ' ', 'seconds')
+
+def JSON(text):
+    return json.loads(text) if text else None
+
+class Serializer:
+    """Campos de la respuesta de un modelo, compilados en una función fila -> dict"""
+
+    def __init__(self, model, fields, joins=()):
+        self.model = model
+        self.fields = [tuple(field) + (None,) * (4 - len(field)) for field in fields]
+        self.joins = list(joins)  # (tabla o alias, condición) para outer joins
+        self.columns = [column for _, column, _, _ in self.fields]
+        self.row = self._compile()
+
+    def _compile(self):
+        namespace = {}
+        items = []
+        for i, (key, _, fmt, default) in enumerate(self.fields):
+            value = f"_r[{i}]"
+            if fmt is not None:
+                namespace[f"_f{i}"] = fmt
+                value = f"_f{i}(_r[{i}])"
+            if fmt is not None or default is not None:
+                namespace[f"_d{i}"] = default
+                value = f"(_d{i} if _r[{i}] is None else {value})"
+            items.append(f"{key!r}: {value}")
+        source = "def row(_r):\n    return {" + ", ".join(items) + "}\n"
+        exec(source, namespace)
+        return namespace['row']
+
+    def only(self, *keys):
+        """Serializer con un subconjunto de los campos (en el orden dado)"""
+        by_key = {field[0]: field for field in self.fields}
+        return Serializer(self.model, [by_key[key] for key in keys], self.joins)
+
+    def extend(self, *fields, joins=()):
+        """Serializer con campos adicionales al final"""
+        return Serializer(self.model, self.fields + list(fields), self.joins + list(joins))
+
+    def select(self, *extra):
+        """Select de las columnas del serializer; las columnas extra van al final y no se serializan"""
+        stmt = db.select(*self.columns, *extra).select_from(self.model)
+        for target, onclause in self.joins:
+            stmt = stmt.outerjoin(target, onclause)
+        return stmt
+
+    def all(self, stmt):
+        row = self.row
+        return [row(r) for r in db.session.execute(stmt)]
+
+    def first(self, stmt):
+        r = db.session.execute(stmt.limit(1)).first()
+        return self.row(r) if r is not None else None
+
+    def paginate(self, stmt, page, per_page):
+        """Página de resultados y metadatos con las mismas claves que usaba Flask-SQLAlchemy"""
+        page = page if page and page > 0 else 1
+        per_page = per_page if per_page and per_page > 0 else 20
+        total = db.session.execute(
+            db.select(func.count()).select_from(stmt.order_by(None).subquery())
+        ).scalar()
+        items = self.all(stmt.limit(per_page).offset((page - 1) * per_page))
+        return items, {
+            'page': page,
+            'pages': ceil(total / per_page) if total else 0,
+            'per_page': per_page,
+            'total': total
+        }
+
+COURT = Serializer(Court, [
+    ('id', Court.id),
+    ('name', Court.name),
+    ('location', Court.location),
+    ('type', Court.court_type),
+    ('price', Court.price),
+    ('rating', Court.rating),
+    ('image', Court.image),
+    ('version', Court.version)
+])
+
+COURT_DETAIL = COURT.extend(('description', Court.description))
+
+BOOKING = Serializer(Booking, [
+    ('id', Booking.id),
+    ('court_id', Booking.court_id),
+    ('court_name', Court.name, None, 'N/A'),
+    ('user_name', Booking.user_name),
+    ('user_email', Booking.user_email),
+    ('date', Booking.booking_date, DATE),
+    ('start_time', Booking.start_time, TIME),
+    ('end_time', Booking.end_time, TIME),
+    ('status', Booking.status),
+    ('payment_status', Booking.payment_status),
+    ('total_amount', Booking.total_amount),
+    ('deposit_amount', Booking.deposit_amount),
+    ('created_at', Booking.created_at, DATETIME),
+    ('version', Booking.version)
+], joins=[(Court, Booking.court_id == Court.id)])
+
+# Turnos de una cancha (/api/courts/<id>/schedule)
+BOOKING_SCHEDULE = BOOKING.only(
+    'id', 'date', 'start_time', 'end_time', 'user_name', 'user_email', 'status', 'payment_status'
+)
+
+PAYMENT = Serializer(Payment, [
+    ('id', Payment.id),
+    ('booking_id', Payment.booking_id),
+    ('amount', Payment.amount),
+    ('payment_type', Payment.payment_type),
+    ('payment_method', Payment.payment_method),
+    ('status', Payment.status),
+    ('transaction_id', Payment.transaction_id),
+    ('created_at', Payment.created_at, DATETIME),
+    ('processed_at', Payment.processed_at, DATETIME),
+    ('error_message', Payment.error_message)
+])
+
+PAYMENT_STATUS = PAYMENT.only(
+    'id', 'amount', 'status', 'transaction_id', 'created_at', 'processed_at', 'error_message'
+)
+
+# Pagos del usuario con el nombre de la cancha reservada
+PAYMENT_WITH_COURT = PAYMENT.extend(
+    ('court_name', Court.name, None, 'N/A'),
+    joins=[(Booking, Payment.booking_id == Booking.id), (Court, Booking.court_id == Court.id)]
+)
+
+USER = Serializer(User, [
+    ('id', User.id),
+    ('username', User.username),
+    ('email', User.email),
+    ('role', User.role),
+    ('created_at', User.created_at, DATETIME)
+])
+
+AUDIT_LOG = Serializer(AuditLog, [
+    ('id', AuditLog.id),
+    ('username', AuditLog.username),
+    ('action', AuditLog.action),
+    ('resource_type', AuditLog.resource_type),
+    ('resource_id', AuditLog.resource_id),
+    ('details', AuditLog.details),
+    ('ip_address', AuditLog.ip_address),
+    ('timestamp', AuditLog.timestamp, DATETIME),
+    ('success', AuditLog.success),
+    ('error_message', AuditLog.error_message)
+])
+
+_resolver = aliased(User)
+
+CRITICAL_EVENT = Serializer(CriticalEvent, [
+    ('id', CriticalEvent.id),
+    ('event_type', CriticalEvent.event_type),
+    ('description', CriticalEvent.description),
+    ('severity', CriticalEvent.severity),
+    ('ip_address', CriticalEvent.ip_address),
+    ('timestamp', CriticalEvent.timestamp, DATETIME),
+    ('last_seen', CriticalEvent.last_seen, DATETIME),
+    ('occurrences', CriticalEvent.occurrences),
+    ('resolved', CriticalEvent.resolved),
+    ('resolved_by', _resolver.username),
+    ('resolved_at', CriticalEvent.resolved_at, DATETIME),
+    ('additional_data', CriticalEvent.additional_data, JSON)
+], joins=[(_resolver, CriticalEvent.resolved_by == _resolver.id)])
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify con orjson si está instalado; cae al encoder estándar para lo que orjson no soporta
+
+    Las fechas pasan por el mismo default que Flask (formato HTTP), así que la
+    salida es equivalente; la única diferencia es que orjson escribe los
+    caracteres no ASCII en UTF-8 en lugar de escaparlos.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = orjson is not None and app.config.get('JSON_FAST_ENCODER', True)
+
+    def dumps(self, obj, **kwargs):
+        indent = kwargs.get('indent')
+        if not self.fast or indent not in (None, 2) or set(kwargs) - {'indent', 'separators', 'sort_keys'}:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # Enteros de más de 64 bits, claves no ordenables, etc.
+            return super().dumps(obj, **kwargs)
+
+app.json = FastJSONProvider(app)
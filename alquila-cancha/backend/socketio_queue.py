@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import socketio
+
+class SQLiteManager(socketio.PubSubManager):
+    """Cola de mensajes SocketIO sobre un archivo SQLite compartido
+
+    Alternativa local a Redis/Kombu para repartir eventos entre varios workers
+    de la misma máquina y para pruebas. Cada worker publica en una tabla y
+    lee por sondeo los mensajes con id mayor al último visto.
+
+    URL: sqlite:///ruta/al/bus.db (ruta relativa) o sqlite:////ruta/absoluta.db
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio_bus.db', channel='flask-socketio', write_only=False,
+                 logger=None, json=None, poll_interval=0.02, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._setup()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _setup(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS socketio_message ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'channel TEXT NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'created_at REAL NOT NULL)'
+        )
+
+    def _publish(self, data):
+        self._connection().execute(
+            'INSERT INTO socketio_message (channel, payload, created_at) VALUES (?, ?, ?)',
+            (self.channel, json.dumps(data), time.time())
+        )
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _listen(self):
+        conn = self._connection()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_message').fetchone()[0]
+        last_prune = time.time()
+
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_message WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+
+            for message_id, payload in rows:
+                last_id = message_id
+                yield payload
+
+            # Borrar mensajes viejos; todos los workers ya los leyeron
+            if time.time() - last_prune > self.retention:
+                last_prune = time.time()
+                conn.execute('DELETE FROM socketio_message WHERE created_at < ?', (last_prune - self.retention,))
+
+            if not rows:
+                self._sleep(self.poll_interval)
+
+def socketio_options(url):
+    """Opciones para SocketIO según la URL de la cola de mensajes (None = solo en proceso)"""
+    if not url:
+        return {}
+    if url.startswith('sqlite:'):
+        return {'client_manager': SQLiteManager(url)}
+    # redis://, rediss://, kafka://, zmq+tcp://, amqp:// ... los resuelve Flask-SocketIO
+    return {'message_queue': url}
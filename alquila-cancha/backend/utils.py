@@ -1,169 +1,240 @@
-from flask import request, session, jsonify
-from flask_socketio import emit, join_room
-from datetime import datetime
+from flask import request, session, jsonify, Response, abort
+from flask_socketio import emit, join_room, leave_room
+from datetime import datetime, timedelta
 import json
-import multiprocessing
+import hmac
+import os
 import time
 import uuid
 import random
-from config import app, socketio
-from models import User, log_audit, Payment, Booking
-# Variables globales para gestores (se inicializarán en app.py)
-process_manager = None
-thread_pool = None
-resource_monitor = None
-
-def get_thread_pool():
-    """Obtiene el thread pool global"""
-    global thread_pool
-    return thread_pool
-
-def get_process_manager():
-    """Obtiene el process manager global"""
-    global process_manager
-    return process_manager
-
-def get_resource_monitor():
-    """Obtiene el resource monitor global"""
-    global resource_monitor
-    return resource_monitor
+from sqlalchemy.orm.exc import StaleDataError
+from config import app, db, socketio
+from config import get_process_manager, get_thread_pool, get_resource_monitor, PoolSaturatedError
+from models import User, log_audit, Payment, Booking, OutboxEvent, Job, JobSchedule, critical_events
 from routes import admin_required, login_required
+from idempotency import idempotent
+from outbox import outbox_dispatcher
+from availability import court_room, slot_updates
+from connections import connection_registry, invalidation_feed
+from metrics import request_metrics, sql_timer, sql_profiler, render_prometheus
+import read_routing
+from profiler import request_profiler
+import serializers
+from jobs import JOB_TYPES, CronSchedule, enqueue_job, cancel_job, job_scheduler, serialize_job, serialize_schedule
 
 # Eventos de SocketIO
 @socketio.on('connect')
 def handle_connect():
-    print(f'Cliente conectado: {request.sid}')
+    app.logger.debug("Cliente conectado: %s", request.sid)
+    
+    # Resolver identidad y rol una sola vez; los demás eventos usan el cache
+    user = User.query.get(session['user_id']) if 'user_id' in session else None
+    identity = connection_registry.register(request.sid, user, session.get('login_id'))
+    if identity:
+        invalidation_feed.start()  # Logout y cambios de rol hechos en otros workers
     
     # Si es administrador, unir a la sala de admin
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_admin():
-            socketio.emit('admin_connected', {'message': 'Administrador conectado'}, room=request.sid)
+    if identity and identity.is_admin():
+        socketio.emit('admin_connected', {'message': 'Administrador conectado'}, room=request.sid)
 
 @socketio.on('join_admin_room')
 def handle_join_admin_room():
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_admin():
-            socketio.join_room('admin_room')
-            emit('joined_admin_room', {'message': 'Te uniste a la sala de administradores'})
+    identity = connection_registry.get(request.sid)
+    if identity and identity.is_admin():
+        join_room('admin_room')
+        emit('joined_admin_room', {'message': 'Te uniste a la sala de administradores'})
 
 @socketio.on('join_user_room')
 def handle_join_user_room(data):
     """Une al usuario a su sala personal para notificaciones"""
-    if 'user_id' in session:
-        user_id = data.get('user_id') or session['user_id']
-        socketio.join_room(f'user_{user_id}')
+    identity = connection_registry.get(request.sid)
+    if identity:
+        # Solo los administradores pueden escuchar la sala de otro usuario
+        user_id = (data or {}).get('user_id') if identity.is_admin() else None
+        join_room(f'user_{user_id or identity.user_id}')
         emit('joined_user_room', {'message': f'Te uniste a tu sala personal'})
 
+@socketio.on('join_court_room')
+def handle_join_court_room(data):
+    """Suscribe al cliente a la disponibilidad de una cancha en un día y envía el estado actual"""
+    try:
+        court_id = int(data['court_id'])
+        booking_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        emit('court_availability_error', {'message': 'court_id y date (YYYY-MM-DD) requeridos'})
+        return
+
+    join_room(court_room(court_id, booking_date))
+
+    occupied = Booking.query.with_entities(Booking.start_time, Booking.end_time).filter(
+        Booking.court_id == court_id,
+        Booking.booking_date == booking_date,
+        Booking.status != 'cancelled'
+    ).order_by(Booking.start_time).all()
+
+    emit('court_availability', {
+        'court_id': court_id,
+        'date': booking_date.strftime('%Y-%m-%d'),
+        'occupied': [[s.strftime('%H:%M'), e.strftime('%H:%M')] for s, e in occupied]
+    })
+
+@socketio.on('leave_court_room')
+def handle_leave_court_room(data):
+    try:
+        leave_room(court_room(int(data['court_id']), datetime.strptime(data['date'], '%Y-%m-%d').date()))
+    except (KeyError, TypeError, ValueError):
+        pass
+
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f'Cliente desconectado: {request.sid}')
+    app.logger.debug("Cliente desconectado: %s", request.sid)
+    connection_registry.remove(request.sid)
 
 @socketio.on('send_notification')
 def handle_notification(data):
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_admin():
-            socketio.emit('notification', {
-                'message': data['message'],
-                'type': data.get('type', 'info'),
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }, room='admin_room')
+    identity = connection_registry.get(request.sid)
+    if identity and identity.is_admin():
+        socketio.emit('notification', {
+            'message': data['message'],
+            'type': data.get('type', 'info'),
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }, room='admin_room')
 
 @socketio.on('court_added_notification')
 def handle_court_added(data):
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_operator():
-            socketio.emit('court_added', {
-                'court_id': data['court_id'],
-                'court_name': data['court_name'],
-                'added_by': session.get('username', 'Unknown')
-            }, room='admin_room')
-
-# Endpoints para gestión de procesos y tareas
+    identity = connection_registry.get(request.sid)
+    if identity and identity.is_operator():
+        socketio.emit('court_added', {
+            'court_id': data['court_id'],
+            'court_name': data['court_name'],
+            'added_by': identity.username
+        }, room='admin_room')
+
+# Recuperación de eventos perdidos (huecos en la secuencia por sala)
+@app.route('/api/outbox/events', methods=['GET'])
+@login_required
+def get_outbox_events():
+    """Devuelve los eventos de una sala con secuencia mayor a 'after'"""
+    room = request.args.get('room', '')
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 200, type=int), 1000))
+
+    user = User.query.get(session['user_id'])
+    if room == 'admin_room':
+        allowed = user and user.is_admin()
+    elif room.startswith('user_'):
+        allowed = user and room == f"user_{user.id}"
+    else:
+        allowed = bool(room)
+
+    if not allowed:
+        return jsonify({'success': False, 'message': 'No autorizado para esta sala'}), 403
+
+    events = OutboxEvent.query.filter(
+        OutboxEvent.room == room,
+        OutboxEvent.sequence > after
+    ).order_by(OutboxEvent.sequence).limit(limit).all()
+
+    return jsonify({
+        'success': True,
+        'room': room,
+        'events': [{
+            'sequence': event.sequence,
+            'event': event.event,
+            'data': json.loads(event.payload),
+            'status': event.status,
+            'created_at': event.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        } for event in events]
+    })
+
+# Endpoints para gestión de trabajos en segundo plano (cola persistente, ver jobs.py)
 @app.route('/api/tasks/start', methods=['POST'])
 @admin_required
 def start_background_task():
-    """Inicia una tarea en segundo plano"""
-    data = request.get_json()
+    """Encola un trabajo en segundo plano"""
+    data = request.get_json() or {}
     task_type = data.get('task_type')
     
     if not task_type:
         return jsonify({'success': False, 'message': 'Task type required'}), 400
-    
-    task_id = f"{task_type}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-    
-    # Seleccionar la función de tarea apropiada
-    from config import data_integrity_check_task, statistics_calculation_task
-    task_functions = {
-        'data_integrity': data_integrity_check_task,
-        'statistics': statistics_calculation_task
-    }
-    
-    if task_type not in task_functions:
+    if task_type not in JOB_TYPES:
         return jsonify({'success': False, 'message': 'Invalid task type'}), 400
     
-    success, message = process_manager.start_background_task(
-        task_functions[task_type], 
-        task_id
+    payload = data.get('payload') or {}
+    priority = data.get('priority')
+    delay = data.get('delay_seconds', 0)
+    if not isinstance(payload, dict) or (priority is not None and not isinstance(priority, int)) \
+            or not isinstance(delay, (int, float)) or delay < 0:
+        return jsonify({'success': False, 'message': 'payload debe ser un objeto, priority un entero y delay_seconds >= 0'}), 400
+    
+    job = enqueue_job(
+        task_type,
+        payload=payload,
+        priority=priority,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        created_by=session.get('username')
     )
     
-    if success:
-        log_audit(
-            'start_background_task',
-            resource_type='task',
-            details=f'Iniciada tarea {task_type} con ID {task_id}'
-        )
-        return jsonify({
-            'success': True, 
-            'message': message,
-            'task_id': task_id
-        })
-    else:
-        return jsonify({'success': False, 'message': message}), 400
+    log_audit(
+        'start_background_task',
+        resource_type='task',
+        resource_id=job.id,
+        details=f'Encolado trabajo {task_type} con ID {job.id}'
+    )
+    return jsonify({
+        'success': True,
+        'message': 'Task queued',
+        'task_id': job.id
+    })
 
-@app.route('/api/tasks/<task_id>/status', methods=['GET'])
+@app.route('/api/tasks/<int:task_id>/status', methods=['GET'])
 @admin_required
 def get_task_status(task_id):
-    """Obtiene el estado de una tarea"""
-    task_status = process_manager.get_task_status(task_id)
+    """Obtiene el estado de un trabajo"""
+    job = db.session.get(Job, task_id)
     
-    if task_status is None:
+    if job is None:
         return jsonify({'success': False, 'message': 'Task not found'}), 404
     
     return jsonify({
         'success': True,
-        'task_status': task_status
+        'task_status': serialize_job(job)
     })
 
 @app.route('/api/tasks', methods=['GET'])
 @admin_required
 def list_all_tasks():
-    """Lista todas las tareas activas"""
-    process_tasks = process_manager.processes
-    thread_tasks = thread_pool.get_all_active_tasks()
+    """Lista los trabajos más recientes (?status=pending|running|... y ?limit=N)"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    query = Job.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    counts = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+    thread_tasks = get_thread_pool().get_all_active_tasks()
     
     return jsonify({
         'success': True,
-        'process_tasks': process_tasks,
+        'jobs': [serialize_job(job) for job in jobs],
+        'counts': counts,
+        'scheduler': job_scheduler.summary(),
         'thread_tasks': thread_tasks,
-        'total_processes': len(process_tasks),
         'total_threads': len(thread_tasks)
     })
 
-@app.route('/api/tasks/<task_id>/cancel', methods=['DELETE'])
+@app.route('/api/tasks/<int:task_id>/cancel', methods=['DELETE'])
 @admin_required
 def cancel_task(task_id):
-    """Cancela una tarea"""
-    success = process_manager.cancel_task(task_id)
+    """Cancela un trabajo que todavía no empezó"""
+    success = cancel_job(task_id)
     
     if success:
         log_audit(
             'cancel_background_task',
             resource_type='task',
-            details=f'Cancelada tarea con ID {task_id}'
+            resource_id=task_id,
+            details=f'Cancelado trabajo con ID {task_id}'
         )
         return jsonify({'success': True, 'message': 'Task cancelled'})
     else:
@@ -172,30 +243,96 @@ def cancel_task(task_id):
 @app.route('/api/tasks/cleanup', methods=['POST'])
 @admin_required
 def cleanup_tasks():
-    """Limpia tareas completadas"""
-    process_manager.cleanup_completed_tasks()
-    thread_pool.cleanup_completed_tasks()
+    """Elimina los trabajos terminados sin esperar su TTL"""
+    removed = Job.query.filter(Job.status.in_(['completed', 'failed', 'cancelled'])).delete(synchronize_session=False)
+    db.session.commit()
+    get_thread_pool().cleanup_completed_tasks()
     
     log_audit(
         'cleanup_tasks',
-        details='Limpieza de tareas completadas'
+        details=f'Limpieza de tareas completadas ({removed} trabajos)'
     )
     
-    return jsonify({'success': True, 'message': 'Tasks cleaned up'})
+    return jsonify({'success': True, 'message': 'Tasks cleaned up', 'removed': removed})
+
+@app.route('/api/tasks/schedules', methods=['GET'])
+@admin_required
+def list_task_schedules():
+    """Lista los trabajos recurrentes"""
+    schedules = JobSchedule.query.order_by(JobSchedule.name).all()
+    return jsonify({'success': True, 'schedules': [serialize_schedule(schedule) for schedule in schedules]})
+
+@app.route('/api/tasks/schedules/<name>', methods=['POST'])
+@admin_required
+def update_task_schedule(name):
+    """Habilita/deshabilita un recurrente ({"enabled": bool}) o lo ejecuta ya ({"run_now": true})"""
+    schedule = db.session.get(JobSchedule, name)
+    if schedule is None:
+        return jsonify({'success': False, 'message': 'Schedule not found'}), 404
+    
+    data = request.get_json() or {}
+    if 'enabled' in data:
+        if not isinstance(data['enabled'], bool):
+            return jsonify({'success': False, 'message': 'enabled debe ser booleano'}), 400
+        schedule.enabled = data['enabled']
+        if schedule.enabled:
+            # Al rehabilitar no recuperar las ejecuciones perdidas
+            schedule.next_run_at = CronSchedule(schedule.cron).next_after(datetime.utcnow())
+        db.session.commit()
+    
+    job = None
+    if data.get('run_now'):
+        job = enqueue_job(schedule.job_type, payload=json.loads(schedule.payload or '{}'), priority=schedule.priority,
+                          created_by=session.get('username'), schedule_name=schedule.name)
+    
+    log_audit(
+        'update_task_schedule',
+        resource_type='task',
+        details=f'Recurrente {name}: enabled={schedule.enabled}' + (f', ejecutado como trabajo {job.id}' if job else '')
+    )
+    return jsonify({
+        'success': True,
+        'schedule': serialize_schedule(schedule),
+        'task_id': job.id if job else None
+    })
 
 # Endpoint para monitoreo de recursos
 @app.route('/api/system/stats', methods=['GET'])
 @admin_required
 def get_system_stats():
-    """Obtiene estadísticas del sistema"""
+    """Obtiene estadísticas del sistema (?history=N agrega las últimas N muestras)"""
+    resource_monitor = get_resource_monitor()
+    process_manager = get_process_manager()
+    thread_pool = get_thread_pool()
     stats = resource_monitor.get_stats()
     
+    history = request.args.get('history', type=int)
+    if history:
+        stats['history'] = resource_monitor.get_history(history)
+    
     # Agregar información de tareas
     stats.update({
         'active_process_tasks': len(process_manager.processes),
+        'jobs': job_scheduler.summary(),
         'active_thread_tasks': len(thread_pool.active_tasks),
-        'cpu_count': multiprocessing.cpu_count(),
-        'max_thread_workers': thread_pool.executor._max_workers
+        'thread_pool': thread_pool.stats(),
+        'cpu_count': os.cpu_count(),
+        'max_thread_workers': thread_pool.max_workers,
+        'process_pool_started': process_manager.is_started(),
+        'thread_pool_started': thread_pool.is_started(),
+        'outbox': dict(outbox_dispatcher.stats, pending=OutboxEvent.query.filter(
+            OutboxEvent.status.in_(['pending', 'dispatching'])
+        ).count()),
+        'slot_updates': slot_updates.stats,
+        'critical_events': critical_events.stats,
+        'socket_connections': dict(connection_registry.stats, active=connection_registry.active_count()),
+        'database': {
+            'queries': sql_timer.queries,
+            'errors': sql_timer.errors,
+            'total_ms': round(sql_timer.total_time * 1000, 1),
+            'read_routing': read_routing.stats
+        },
+        'endpoints': request_metrics.summary()
     })
     
     return jsonify({
@@ -203,6 +340,127 @@ def get_system_stats():
         'stats': stats
     })
 
+# Perfiles SQL de las peticiones muestreadas
+@app.route('/api/system/sql-profile', methods=['GET'])
+@admin_required
+def get_sql_profile():
+    """Últimas peticiones perfiladas, opcionalmente filtradas por ruta y ordenadas por tiempo en la base"""
+    route = request.args.get('route')
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    
+    profiles = [p for p in list(sql_profiler.recent) if not route or p['route'] == route]
+    if request.args.get('sort') == 'db':
+        profiles.sort(key=lambda p: p['db_ms'], reverse=True)
+    else:
+        profiles.reverse()
+    
+    return jsonify({
+        'success': True,
+        'sample_rate': app.config.get('SQL_PROFILE_SAMPLE_RATE', 0),
+        'slow_query_threshold_ms': app.config.get('SLOW_QUERY_THRESHOLD_MS', 0),
+        'slow_queries': sql_profiler.slow_queries,
+        'profiles': profiles[:limit]
+    })
+
+@app.route('/api/system/sql-profile', methods=['POST'])
+@admin_required
+def set_sql_profile():
+    """Cambia la tasa de muestreo y el umbral de consultas lentas en caliente"""
+    data = request.get_json() or {}
+    
+    try:
+        if 'sample_rate' in data:
+            rate = float(data['sample_rate'])
+            if not 0 <= rate <= 1:
+                raise ValueError
+            app.config['SQL_PROFILE_SAMPLE_RATE'] = rate
+        if 'slow_query_threshold_ms' in data:
+            app.config['SLOW_QUERY_THRESHOLD_MS'] = max(0.0, float(data['slow_query_threshold_ms']))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'sample_rate debe estar entre 0 y 1'}), 400
+    
+    log_audit('sql_profile_config', details=f"Perfilado SQL: muestreo={app.config['SQL_PROFILE_SAMPLE_RATE']}, "
+              f"umbral={app.config['SLOW_QUERY_THRESHOLD_MS']}ms")
+    
+    return jsonify({
+        'success': True,
+        'sample_rate': app.config['SQL_PROFILE_SAMPLE_RATE'],
+        'slow_query_threshold_ms': app.config['SLOW_QUERY_THRESHOLD_MS']
+    })
+
+# Profiler estadístico de peticiones
+@app.route('/api/system/profile', methods=['GET'])
+@admin_required
+def get_profile():
+    """Pilas colapsadas por ruta (?format=collapsed para flamegraph.pl / speedscope)"""
+    route = request.args.get('route')
+    
+    if request.args.get('format') == 'collapsed':
+        return Response(request_profiler.collapsed(route), mimetype='text/plain')
+    
+    return jsonify({
+        'success': True,
+        'profile': request_profiler.summary()
+    })
+
+@app.route('/api/system/profile', methods=['POST'])
+@admin_required
+def toggle_profile():
+    """Inicia, detiene o reinicia el profiler de peticiones"""
+    data = request.get_json() or {}
+    action = data.get('action')  # 'start', 'stop' o 'reset'
+    
+    if action == 'start':
+        if not request_profiler.supported():
+            return jsonify({
+                'success': False,
+                'message': f"El profiler solo funciona con async_mode 'threading' (actual: {socketio.async_mode})"
+            }), 409
+        try:
+            sample_rate = float(data.get('sample_rate', request_profiler.sample_rate))
+            interval_ms = float(data.get('interval_ms', request_profiler.interval * 1000))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'sample_rate e interval_ms deben ser numéricos'}), 400
+        if not 0 < sample_rate <= 1 or interval_ms < 1:
+            return jsonify({'success': False, 'message': 'sample_rate debe estar en (0, 1] e interval_ms >= 1'}), 400
+        
+        request_profiler.start(sample_rate, interval_ms)
+        log_audit('start_profiling', details=f'Profiler iniciado: muestreo={sample_rate}, intervalo={interval_ms}ms')
+        return jsonify({'success': True, 'message': 'Profiling started'})
+    elif action == 'stop':
+        request_profiler.stop()
+        log_audit('stop_profiling', details='Profiler detenido')
+        return jsonify({'success': True, 'message': 'Profiling stopped'})
+    elif action == 'reset':
+        request_profiler.reset()
+        return jsonify({'success': True, 'message': 'Profile reset'})
+    else:
+        return jsonify({'success': False, 'message': 'Invalid action'}), 400
+
+# Métricas en formato de texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expone métricas para Prometheus (token METRICS_TOKEN o sesión de admin)"""
+    token = app.config.get('METRICS_TOKEN')
+    authorized = session.get('role') == 'administrador'
+    if not authorized and token:
+        authorized = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    # Detrás de un proxy inverso todas las peticiones llegan desde localhost: solo con opt-in
+    if not authorized and app.config.get('METRICS_ALLOW_LOCALHOST'):
+        authorized = request.remote_addr in ('127.0.0.1', '::1')
+    if not authorized:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    gauges = {
+        'socket_connections': connection_registry.active_count(),
+        'outbox_pending': OutboxEvent.query.filter(OutboxEvent.status.in_(['pending', 'dispatching'])).count()
+    }
+    pool_stats = get_thread_pool().stats()
+    for name in ('utilization', 'saturation', 'rejected', 'caller_runs'):
+        if pool_stats[name] is not None:
+            gauges[f'thread_pool_{name}'] = pool_stats[name]
+    return Response(render_prometheus(get_resource_monitor(), gauges), mimetype='text/plain; version=0.0.4')
+
 # Endpoint para iniciar/detener monitoreo
 @app.route('/api/system/monitoring', methods=['POST'])
 @admin_required
@@ -212,11 +470,11 @@ def toggle_monitoring():
     action = data.get('action')  # 'start' o 'stop'
     
     if action == 'start':
-        resource_monitor.start_monitoring()
+        get_resource_monitor().start_monitoring()
         log_audit('start_monitoring', details='Iniciado monitoreo de recursos')
         return jsonify({'success': True, 'message': 'Monitoring started'})
     elif action == 'stop':
-        resource_monitor.stop_monitoring()
+        get_resource_monitor().stop_monitoring()
         log_audit('stop_monitoring', details='Detenido monitoreo de recursos')
         return jsonify({'success': True, 'message': 'Monitoring stopped'})
     else:
@@ -266,68 +524,111 @@ def submit_thread_task():
     # Obtener argumentos para la tarea
     args = data.get('args', [])
     
-    task_id, message = thread_pool.submit_task(thread_tasks[task_type], *args)
+    try:
+        task_id, _ = get_thread_pool().submit(thread_tasks[task_type], *args)
+    except PoolSaturatedError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    if task_id:
-        log_audit(
-            'submit_thread_task',
-            resource_type='task',
-            details=f'Enviada tarea {task_type} a pool de hilos con ID {task_id}'
-        )
-        return jsonify({
-            'success': True,
-            'message': message,
-            'task_id': task_id
-        })
-    else:
-        return jsonify({'success': False, 'message': message}), 400
+    log_audit(
+        'submit_thread_task',
+        resource_type='task',
+        details=f'Enviada tarea {task_type} a pool de hilos con ID {task_id}'
+    )
+    return jsonify({
+        'success': True,
+        'message': 'Task submitted successfully',
+        'task_id': task_id
+    })
 
 @app.route('/api/tasks/thread/<task_id>/result', methods=['GET'])
 @admin_required
 def get_thread_task_result(task_id):
-    """Obtiene el resultado de una tarea de hilo"""
-    result, message = thread_pool.get_task_result(task_id)
+    """Obtiene el resultado de una tarea de hilo (202 mientras sigue en cola o en ejecución)"""
+    thread_pool = get_thread_pool()
+    task = thread_pool.get_task(task_id)
     
-    if result is not None and message != "Task not found":
-        return jsonify({
-            'success': True,
-            'result': result,
-            'message': message
-        })
-    else:
-        return jsonify({'success': False, 'message': message}), 404
+    if task is None:
+        return jsonify({'success': False, 'message': 'Task not found'}), 404
+    if task['status'] in ('queued', 'running'):
+        return jsonify({'success': True, 'message': 'Task pending', 'task': task}), 202
+    
+    result, message = thread_pool.get_task_result(task_id)
+    return jsonify({
+        'success': task['status'] == 'completed',
+        'result': result,
+        'message': message,
+        'task': task
+    })
+
+def record_payment_result(payment_id, booking_id, approved, error_message=None):
+    """Guarda el resultado de la pasarela en el pago y en la reserva. Devuelve (payment, booking)
+
+    El resultado de un cobro nunca se descarta: si otra escritura cambió la reserva
+    entre la lectura y el UPDATE (StaleDataError por la columna version), se recarga
+    y se vuelve a aplicar sobre la versión vigente. El estado de pago no choca con
+    un cambio de estado hecho por un operador.
+    """
+    transaction_id = f"TXN_{uuid.uuid4().hex[:8].upper()}" if approved else None
+    processed_at = datetime.now()
+
+    for attempt in range(app.config.get('PAYMENT_COMMIT_ATTEMPTS', 5)):
+        payment = db.session.get(Payment, payment_id, populate_existing=True)
+        booking = db.session.get(Booking, booking_id, populate_existing=True)
+        payment.processed_at = processed_at
+        if approved:
+            payment.status = 'completed'
+            payment.transaction_id = transaction_id
+            if booking:
+                booking.payment_status = 'paid'
+        else:
+            payment.status = 'failed'
+            payment.error_message = error_message
+            if booking:
+                booking.status = 'cancelled'
+                booking.payment_status = 'failed'
+        try:
+            db.session.commit()
+            return payment, booking
+        except StaleDataError:
+            db.session.rollback()
+            app.logger.warning("Reserva %s modificada durante el pago %s, reintento %s", booking_id, payment_id, attempt + 1)
+
+    # La reserva cambia sin parar: el pago se registra igual y la reserva queda para revisión manual
+    payment = db.session.get(Payment, payment_id, populate_existing=True)
+    payment.status = 'completed' if approved else 'failed'
+    payment.transaction_id = transaction_id
+    payment.error_message = error_message
+    payment.processed_at = processed_at
+    db.session.commit()
+    app.logger.error("No se pudo actualizar la reserva %s con el resultado del pago %s", booking_id, payment_id)
+    return payment, db.session.get(Booking, booking_id)
 
 # Sistema de procesamiento de pagos con hilos
 def process_deposit_payment(payment_id, booking_id, user_id, amount, payment_method):
     """Procesa el pago de la seña en un hilo separado"""
-    print(f"DEBUG - Iniciando procesamiento de pago en hilo: payment_id={payment_id}, booking_id={booking_id}")
+    app.logger.debug("Procesando pago en hilo: payment_id=%s booking_id=%s", payment_id, booking_id)
     
     # Crear nueva sesión para este hilo
-    from config import app, db
     with app.app_context():
         try:
             # Simular procesamiento de pago (en producción sería integración con pasarela de pago)
-            processing_time = random.uniform(1, 3)  # 1-3 segundos de procesamiento
-            print(f"DEBUG - Simulando procesamiento por {processing_time:.1f} segundos")
+            processing_time = random.uniform(*app.config['PAYMENT_GATEWAY_DELAY'])  # Demora simulada de la pasarela
+            app.logger.debug("Simulando procesamiento por %.1f segundos", processing_time)
             time.sleep(processing_time)
-            print(f"DEBUG - Procesamiento completado, verificando aprobación")
             
             # Simular aprobación/rechazo (90% aprobación)
             approved = random.random() < 0.9
             
-            payment = Payment.query.get(payment_id)
+            # Pago y reserva se guardan juntos, reintentando si la reserva cambió en el medio
+            payment, booking = record_payment_result(
+                payment_id, booking_id, approved,
+                None if approved else 'Tarjeta rechazada por el banco emisor'
+            )
             
             if approved:
-                # Actualizar pago como completado
-                payment.status = 'completed'
-                payment.transaction_id = f"TXN_{uuid.uuid4().hex[:8].upper()}"
-                payment.processed_at = datetime.now()
-                
-                # Actualizar reserva
-                booking = Booking.query.get(booking_id)
-                booking.payment_status = 'paid'
-                
-                print(f"DEBUG - Pago aprobado: {payment.transaction_id}")
+                app.logger.debug("Pago aprobado: %s", payment.transaction_id)
                 
                 # Enviar notificación via SocketIO
                 socketio.emit('payment_successful', {
@@ -346,17 +647,7 @@ def process_deposit_payment(payment_id, booking_id, user_id, amount, payment_met
                 }
                 
             else:
-                # Actualizar pago como fallido
-                payment.status = 'failed'
-                payment.error_message = 'Tarjeta rechazada por el banco emisor'
-                payment.processed_at = datetime.now()
-                
-                # Cancelar reserva
-                booking = Booking.query.get(booking_id)
-                booking.status = 'cancelled'
-                booking.payment_status = 'failed'
-                
-                print(f"DEBUG - Pago rechazado")
+                app.logger.debug("Pago rechazado: payment_id=%s", payment_id)
                 
                 # Enviar notificación via SocketIO
                 socketio.emit('payment_failed', {
@@ -376,20 +667,15 @@ def process_deposit_payment(payment_id, booking_id, user_id, amount, payment_met
                 }
             
         except Exception as e:
-            print(f"DEBUG - Error en procesamiento de pago: {e}")
+            app.logger.error(f"Error en procesamiento de pago: {e}")
+            db.session.rollback()
             
-            # Actualizar pago como fallido
-            payment = Payment.query.get(payment_id)
-            if payment:
-                payment.status = 'failed'
-                payment.error_message = str(e)
-                payment.processed_at = datetime.utcnow()
-            
-            # Cancelar reserva
-            booking = Booking.query.get(booking_id)
-            if booking:
-                booking.status = 'cancelled'
-                booking.payment_status = 'failed'
+            # Pago fallido y reserva cancelada
+            try:
+                record_payment_result(payment_id, booking_id, False, str(e))
+            except Exception as record_error:
+                db.session.rollback()
+                app.logger.error(f"Error registrando el pago fallido {payment_id}: {record_error}")
             
             # Enviar notificación de error
             socketio.emit('payment_error', {
@@ -408,26 +694,22 @@ def process_deposit_payment(payment_id, booking_id, user_id, amount, payment_met
 
 @app.route('/api/payments/deposit', methods=['POST'])
 @login_required
+@idempotent
 def create_deposit_payment():
     """Crea y procesa un pago de seña"""
-    print("DEBUG - Iniciando proceso de pago de seña")
-    
     try:
         data = request.get_json()
-        print(f"DEBUG - Datos recibidos: {data}")
         
         booking_id = data.get('booking_id')
         payment_method = data.get('payment_method', 'credit_card')
         
-        print(f"DEBUG - booking_id: {booking_id}, payment_method: {payment_method}")
-        print(f"DEBUG - user_id en sesión: {session.get('user_id')}")
+        app.logger.debug("Pago de seña: booking_id=%s payment_method=%s user_id=%s",
+                         booking_id, payment_method, session.get('user_id'))
         
         # Obtener reserva
         booking = Booking.query.get(booking_id)
-        print(f"DEBUG - Reserva encontrada: {booking}")
         
         if not booking:
-            print("DEBUG - Reserva no encontrada")
             return jsonify({
                 'success': False,
                 'message': 'Reserva no encontrada'
@@ -471,68 +753,42 @@ def create_deposit_payment():
         socketio.emit('join_payment_room', {'user_id': session['user_id']})
         
         # Procesar pago directamente (sincrónico temporalmente)
-        print(f"DEBUG - Procesando pago sincrónicamente")
-        
         try:
             # Simular procesamiento directamente aquí (sin llamar a otra función)
-            processing_time = random.uniform(1, 3)
-            print(f"DEBUG - Simulando procesamiento por {processing_time:.1f} segundos")
+            processing_time = random.uniform(*app.config['PAYMENT_GATEWAY_DELAY'])
+            app.logger.debug("Simulando procesamiento por %.1f segundos", processing_time)
             time.sleep(processing_time)
             
             # Simular aprobación/rechazo (90% aprobación)
             approved = random.random() < 0.9
-            print(f"DEBUG - Aprobación: {approved}")
-            
-            if approved:
-                # Actualizar pago como completado
-                payment.status = 'completed'
-                payment.transaction_id = f"TXN_{uuid.uuid4().hex[:8].upper()}"
-                payment.processed_at = datetime.now()
-                
-                # Actualizar reserva
-                booking.payment_status = 'paid'
-                
-                print(f"DEBUG - Pago aprobado: {payment.transaction_id}")
-            else:
-                # Actualizar pago como fallido
-                payment.status = 'failed'
-                payment.error_message = 'Tarjeta rechazada por el banco emisor'
-                payment.processed_at = datetime.now()
-                
-                # Cancelar reserva
-                booking.status = 'cancelled'
-                booking.payment_status = 'failed'
-                
-                print(f"DEBUG - Pago rechazado")
-            
-            db.session.commit()
-            print(f"DEBUG - Cambios guardados en base de datos")
             
-            # Refrescar el objeto payment desde la base de datos
-            db.session.refresh(payment)
+            # Pago y reserva se guardan juntos, reintentando si la reserva cambió durante la demora
+            payment, booking = record_payment_result(
+                payment.id, booking_id, approved,
+                None if approved else 'Tarjeta rechazada por el banco emisor'
+            )
             
             # Registrar auditoría
             log_audit(
                 'deposit_payment_completed',
                 resource_type='payment',
                 resource_id=payment.id,
-                details=f'Procesamiento de seña ${booking.deposit_amount} completado para reserva {booking_id}'
+                details=f'Procesamiento de seña ${payment.amount} completado para reserva {booking_id}'
             )
             
-            print(f"DEBUG - Estado final del pago: {payment.status}")
-            print(f"DEBUG - Transaction ID: {payment.transaction_id}")
+            app.logger.debug("Pago %s: estado=%s transaction_id=%s", payment.id, payment.status, payment.transaction_id)
             
             return jsonify({
                 'success': True,
                 'message': 'Pago procesado',
                 'payment_id': payment.id,
-                'amount': booking.deposit_amount,
+                'amount': payment.amount,
                 'payment_status': payment.status,
                 'transaction_id': payment.transaction_id
             })
             
         except Exception as e:
-            print(f"DEBUG - Error procesando pago: {e}")
+            app.logger.error(f"Error procesando pago: {e}")
             return jsonify({
                 'success': False,
                 'message': 'Error al procesar pago',
@@ -542,10 +798,7 @@ def create_deposit_payment():
     except Exception as e:
         from config import db
         db.session.rollback()
-        print(f"DEBUG - Error en procesamiento de pago: {str(e)}")
-        print(f"DEBUG - Type de error: {type(e)}")
-        import traceback
-        print(f"DEBUG - Traceback: {traceback.format_exc()}")
+        app.logger.exception(f"Error en procesamiento de pago: {str(e)}")
         return jsonify({
             'success': False,
             'message': 'Error al iniciar procesamiento de pago',
@@ -557,10 +810,15 @@ def create_deposit_payment():
 def get_payment_status(payment_id):
     """Obtiene el estado de un pago"""
     try:
-        payment = Payment.query.get_or_404(payment_id)
+        # La columna extra (dueño del pago) no se serializa
+        row = db.session.execute(
+            serializers.PAYMENT_STATUS.select(Payment.user_id).where(Payment.id == payment_id)
+        ).first()
+        if row is None:
+            abort(404)
         
         # Verificar que el usuario sea el dueño del pago
-        if payment.user_id != session['user_id']:
+        if row[-1] != session['user_id']:
             return jsonify({
                 'success': False,
                 'message': 'No autorizado para ver este pago'
@@ -568,15 +826,7 @@ def get_payment_status(payment_id):
         
         return jsonify({
             'success': True,
-            'payment': {
-                'id': payment.id,
-                'amount': payment.amount,
-                'status': payment.status,
-                'transaction_id': payment.transaction_id,
-                'created_at': payment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'processed_at': payment.processed_at.strftime('%Y-%m-%d %H:%M:%S') if payment.processed_at else None,
-                'error_message': payment.error_message
-            }
+            'payment': serializers.PAYMENT_STATUS.row(row)
         })
         
     except Exception as e:
@@ -591,23 +841,15 @@ def get_payment_status(payment_id):
 def get_user_payments():
     """Obtiene todos los pagos del usuario actual"""
     try:
-        payments = Payment.query.filter_by(user_id=session['user_id']).order_by(Payment.created_at.desc()).all()
+        payments = serializers.PAYMENT_WITH_COURT.all(
+            serializers.PAYMENT_WITH_COURT.select()
+            .where(Payment.user_id == session['user_id'])
+            .order_by(Payment.created_at.desc())
+        )
         
         return jsonify({
             'success': True,
-            'payments': [{
-                'id': payment.id,
-                'booking_id': payment.booking_id,
-                'amount': payment.amount,
-                'payment_type': payment.payment_type,
-                'payment_method': payment.payment_method,
-                'status': payment.status,
-                'transaction_id': payment.transaction_id,
-                'created_at': payment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'processed_at': payment.processed_at.strftime('%Y-%m-%d %H:%M:%S') if payment.processed_at else None,
-                'error_message': payment.error_message,
-                'court_name': payment.booking.court.name if payment.booking and payment.booking.court else 'N/A'
-            } for payment in payments]
+            'payments': payments
         })
         
     except Exception as e:
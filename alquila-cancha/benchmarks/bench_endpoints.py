@@ -0,0 +1,343 @@
+"""Benchmark de carga de los endpoints principales
+
+Crea (o reutiliza) una base con el dataset sintético de benchmarks/dataset.py y
+mide /book, /search, /api/courts, /api/bookings, login y pagos de seña con dos
+drivers:
+
+  testclient  peticiones secuenciales con el test client de Flask (sin red)
+  http        N hilos concurrentes contra un servidor HTTP real (werkzeug en
+              un hilo, o --url para apuntar a un servidor ya levantado)
+
+Informa throughput y latencia p50/p95/p99 por escenario y compara contra
+benchmarks/baseline.json para que las regresiones se vean.
+
+Uso:
+    python benchmarks/bench_endpoints.py
+    python benchmarks/bench_endpoints.py --scale medium --requests 500 --concurrency 16
+    python benchmarks/bench_endpoints.py --driver http --url http://localhost:5002
+    python benchmarks/bench_endpoints.py --save-baseline
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from dataset import BENCH_PASSWORD, BOOKING_HORIZON, HOURS_PER_DAY, SCALES
+
+# Contador global de turnos libres para /book (después de la última reserva existente)
+_slot_counter = itertools.count()
+_slot_lock = threading.Lock()
+_free_from = BOOKING_HORIZON
+
+def _next_free_slot(court_count):
+    with _slot_lock:
+        k = next(_slot_counter)
+    court_id = 1 + k % court_count
+    slot = k // court_count
+    day = _free_from + timedelta(days=1 + slot // HOURS_PER_DAY)
+    hour = 8 + slot % HOURS_PER_DAY
+    return {
+        'court_id': court_id,
+        'date': day.strftime('%Y-%m-%d'),
+        'start_time': f'{hour:02d}:00',
+        'end_time': f'{hour + 1:02d}:00',
+        'name': 'Bench',
+        'email': 'bench@bench.local'
+    }
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+# Cada escenario devuelve (método, ruta, opciones de la petición, estado esperado)
+def scenario_login(ctx, i):
+    user = f'bench_user_{i % ctx["users"]}'
+    return 'POST', '/login', {'form': {'username': user, 'password': BENCH_PASSWORD}}, 302
+
+def scenario_search(ctx, i):
+    return 'GET', f'/search?q=Bench {i % 50}&type=Fútbol', {}, 200
+
+def scenario_api_courts(ctx, i):
+    return 'GET', '/api/courts', {}, 200
+
+def scenario_api_bookings(ctx, i):
+    return 'GET', '/api/bookings', {}, 200
+
+def scenario_book(ctx, i):
+    return 'POST', '/book', {'json': _next_free_slot(ctx['courts'])}, 200
+
+def scenario_payment(ctx, i):
+    return 'POST', '/api/payments/deposit', {'json': {'booking_id': None, 'payment_method': 'credit_card'}}, 200
+
+SCENARIOS = {
+    'login': (scenario_login, False),
+    'search': (scenario_search, False),
+    'api_courts': (scenario_api_courts, False),
+    'api_bookings': (scenario_api_bookings, True),
+    'book': (scenario_book, False),
+    'payment': (scenario_payment, True),
+}
+
+class TestClientDriver:
+    """Peticiones secuenciales en proceso, sin red"""
+    name = 'testclient'
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, user=None):
+        client = self.app.test_client()
+        if user:
+            client.post('/login', data={'username': user, 'password': BENCH_PASSWORD})
+        return client
+
+    def request(self, client, method, path, options):
+        if 'form' in options:
+            response = client.open(path, method=method, data=options['form'])
+        elif 'json' in options:
+            response = client.open(path, method=method, json=options['json'])
+        else:
+            response = client.open(path, method=method)
+        return response.status_code, response.get_json(silent=True)
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HTTPDriver:
+    """Peticiones HTTP reales; cada sesión tiene su propio cookie jar"""
+    name = 'http'
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def session(self, user=None):
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+        if user:
+            self.request(opener, 'POST', '/login', {'form': {'username': user, 'password': BENCH_PASSWORD}})
+        return opener
+
+    def request(self, opener, method, path, options):
+        body = None
+        headers = {}
+        if 'form' in options:
+            body = urllib.parse.urlencode(options['form']).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif 'json' in options:
+            body = json.dumps(options['json']).encode()
+            headers['Content-Type'] = 'application/json'
+        url = self.base_url + urllib.parse.quote(path, safe='/?=&')
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with opener.open(req, timeout=60) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+def run_scenario(driver, name, ctx, requests, concurrency):
+    """Ejecuta un escenario y devuelve throughput y percentiles de latencia"""
+    build, needs_login = SCENARIOS[name]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    user_counter = itertools.count()
+
+    def worker(indexes):
+        user = f'bench_user_{next(user_counter) % ctx["users"]}' if needs_login else None
+        session = driver.session(user)
+        local = []
+        for i in indexes:
+            method, path, options, expected = build(ctx, i)
+            if name == 'payment':
+                # Preparación no medida: una reserva propia para pagar
+                _, booked = driver.request(session, 'POST', '/book', {'json': _next_free_slot(ctx['courts'])})
+                options['json']['booking_id'] = (booked or {}).get('booking_id')
+            t0 = time.perf_counter()
+            status, _ = driver.request(session, method, path, options)
+            local.append(time.perf_counter() - t0)
+            if status != expected:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    workers = max(1, concurrency)
+    chunks = [range(w, requests, workers) for w in range(workers)]
+    start = time.perf_counter()
+    if workers == 1:
+        worker(chunks[0])
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2)
+    }
+
+def prepare_app(args):
+    """Configura el entorno, importa la app y carga el dataset si hace falta"""
+    global _free_from
+    workdir = args.workdir or tempfile.mkdtemp(prefix='golistica_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, f'bench_{args.scale}.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.chdir(workdir)  # logs/ se crea en el directorio de trabajo
+
+    from config import app, db
+    import schema
+    with app.app_context():
+        schema.upgrade()
+
+    import app as app_module  # registra todas las rutas
+    from models import User, Booking
+    from sqlalchemy import func
+    import dataset
+
+    app.config['PAYMENT_GATEWAY_DELAY'] = (0, 0)
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+
+    with app.app_context():
+        if not User.query.filter(User.username == 'bench_user_0').first():
+            print(f"Cargando dataset '{args.scale}' en {db_path}")
+            dataset.seed(db, args.scale)
+        else:
+            print(f"Reutilizando dataset en {db_path}")
+        # Con un dataset reutilizado, reservar después de lo que dejaron corridas anteriores
+        _free_from = max(BOOKING_HORIZON, db.session.query(func.max(Booking.booking_date)).scalar() or BOOKING_HORIZON)
+    return app
+
+def start_local_server(app):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def compare(results, baseline, tolerance):
+    """Marca escenarios con p95 o throughput peores que la línea base más allá de la tolerancia"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {result['p95_ms']}ms vs {base['p95_ms']}ms")
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {result['throughput']}/s vs {base['throughput']}/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--workdir', help='Directorio para la base y los logs (se reutiliza el dataset si existe)')
+    parser.add_argument('--driver', choices=['testclient', 'http', 'both'], default='both')
+    parser.add_argument('--url', help='Servidor ya levantado para el driver http (por defecto uno local)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='Peticiones por escenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Hilos del driver http')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar estos resultados como línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Margen antes de marcar regresión')
+    parser.add_argument('--output', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+    # prepare_app cambia de directorio: resolver rutas antes
+    args.baseline = os.path.abspath(args.baseline)
+    args.output = os.path.abspath(args.output) if args.output else None
+
+    app = prepare_app(args)
+    courts = 24 + SCALES[args.scale]['courts']  # canchas de ejemplo + sintéticas
+    ctx = {'courts': courts, 'users': SCALES[args.scale]['users']}
+
+    drivers = []
+    if args.driver in ('testclient', 'both'):
+        drivers.append((TestClientDriver(app), 1))
+    if args.driver in ('http', 'both'):
+        url = args.url
+        if not url:
+            _, url = start_local_server(app)
+        drivers.append((HTTPDriver(url), args.concurrency))
+
+    results = {}
+    header = f"{'driver':<11} {'escenario':<13} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for driver, concurrency in drivers:
+        for name in args.scenarios.split(','):
+            r = run_scenario(driver, name, ctx, args.requests, concurrency)
+            results[f'{args.scale}/{driver.name}/{name}'] = r
+            print(f"{driver.name:<11} {name:<13} {r['requests']:>6} {r['errors']:>5} {r['throughput']:>9.1f} "
+                  f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    exit_code = 0
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f).get('results', {})
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'machine': f'{platform.system()} {platform.machine()} python {platform.python_version()}',
+                'created': date.today().isoformat(),
+                'results': baseline
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Línea base guardada en {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get('results', {}), args.tolerance)
+        print(f"\nComparación con {os.path.basename(args.baseline)} ({baseline.get('machine')}, "
+              f"tolerancia {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  REGRESIÓN {line}")
+        if not regressions:
+            print("  sin regresiones")
+        exit_code = 1 if regressions else 0
+
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Serialización de respuestas grandes: ORM + strftime vs serializers.py
+
+Carga reservas y registros de auditoría sintéticos y mide, para N filas, el
+camino anterior (instancias del ORM, dict armado a mano con strftime y json de
+la librería estándar) contra backend/serializers.py (select de columnas,
+función fila -> dict compilada y orjson si está instalado). Separa el tiempo
+de consulta + armado de dicts del de codificación JSON, y verifica que ambos
+caminos produzcan los mismos datos.
+
+Uso:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --rows 50000 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+def legacy_bookings(Booking):
+    return [{
+        'id': booking.id,
+        'court_id': booking.court_id,
+        'court_name': booking.court.name if booking.court else 'N/A',
+        'user_name': booking.user_name,
+        'user_email': booking.user_email,
+        'date': booking.booking_date.strftime('%Y-%m-%d'),
+        'start_time': booking.start_time.strftime('%H:%M'),
+        'end_time': booking.end_time.strftime('%H:%M'),
+        'status': booking.status,
+        'payment_status': booking.payment_status,
+        'total_amount': booking.total_amount,
+        'deposit_amount': booking.deposit_amount,
+        'created_at': booking.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'version': booking.version
+    } for booking in Booking.query.all()]
+
+def legacy_audit_logs(AuditLog, rows):
+    return [{
+        'id': log.id,
+        'username': log.username,
+        'action': log.action,
+        'resource_type': log.resource_type,
+        'resource_id': log.resource_id,
+        'details': log.details,
+        'ip_address': log.ip_address,
+        'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'success': log.success,
+        'error_message': log.error_message
+    } for log in AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(rows).all()]
+
+def measure(build, encode, repeat, db):
+    """Mediana en ms de (consulta + dicts) y de codificación; devuelve también el último resultado"""
+    build_times, encode_times = [], []
+    for _ in range(repeat):
+        db.session.expunge_all()  # sin identity map caliente entre corridas
+        started = time.perf_counter()
+        data = build()
+        built = time.perf_counter()
+        encode(data)
+        build_times.append((built - started) * 1000)
+        encode_times.append((time.perf_counter() - built) * 1000)
+    return statistics.median(build_times), statistics.median(encode_times), data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000, help='Reservas y registros de auditoría por respuesta')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workdir', help='Directorio para la base y los logs (por defecto uno temporal)')
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='golistica_serialization_'))
+    os.makedirs(workdir, exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, f'serialization_{args.rows}.db')
+    os.chdir(workdir)
+
+    from config import app, db
+    import schema
+    with app.app_context():
+        schema.upgrade(sample_courts=False, log=lambda message: None)
+
+    import app as app_module  # registra todas las rutas
+    import dataset
+    import serializers
+    from models import Booking, AuditLog
+
+    stdlib_dumps = lambda data: json.dumps(data, sort_keys=True, separators=(',', ':'))
+    with app.app_context():
+        if not Booking.query.first():
+            dataset.seed(db, {'courts': 200, 'users': 1000, 'bookings': args.rows, 'audit': args.rows}, log=lambda message: None)
+
+        cases = [
+            ('bookings', lambda: legacy_bookings(Booking),
+             lambda: serializers.BOOKING.all(serializers.BOOKING.select())),
+            ('audit-logs', lambda: legacy_audit_logs(AuditLog, args.rows),
+             lambda: serializers.AUDIT_LOG.all(
+                 serializers.AUDIT_LOG.select().order_by(AuditLog.timestamp.desc()).limit(args.rows))),
+        ]
+
+        encoder = 'orjson' if app.json.fast else 'json'
+        print(f"{args.rows} filas, mediana de {args.repeat} corridas (encoder nuevo: {encoder})\n")
+        print(f"{'respuesta':<12} {'camino':<8} {'dicts ms':>9} {'json ms':>9} {'total ms':>9}")
+        print('-' * 51)
+        for name, legacy, fast in cases:
+            old_build, old_encode, old_data = measure(legacy, stdlib_dumps, args.repeat, db)
+            new_build, new_encode, new_data = measure(fast, app.json.dumps, args.repeat, db)
+            if old_data != new_data:
+                sys.exit(f"{name}: los datos serializados difieren entre los dos caminos")
+            print(f"{name:<12} {'antes':<8} {old_build:>9.1f} {old_encode:>9.1f} {old_build + old_encode:>9.1f}")
+            print(f"{'':<12} {'ahora':<8} {new_build:>9.1f} {new_encode:>9.1f} {new_build + new_encode:>9.1f}"
+                  f"   x{(old_build + old_encode) / (new_build + new_encode):.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark de reparto de eventos SocketIO entre workers
+
+Mide la latencia de emisión (desde socketio.emit en el publicador hasta que el
+evento se entregó a todos los clientes locales de cada worker) y los eventos
+entregados por segundo, a medida que crece la cantidad de clientes conectados.
+
+Los clientes son simulados: se registran en el client manager de cada worker y
+se cuenta cada paquete que el servidor les enviaría, sin red de por medio.
+
+Uso:
+    python benchmarks/bench_socketio_fanout.py
+    python benchmarks/bench_socketio_fanout.py --workers 4 --clients 10,100,1000 --events 200
+    python benchmarks/bench_socketio_fanout.py --queue redis://localhost:6379/0
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import socketio
+from socketio_queue import socketio_options
+
+def _make_server(queue_url):
+    options = socketio_options(queue_url)
+    if 'message_queue' in options:
+        url = options['message_queue']
+        manager_class = socketio.RedisManager if url.startswith(('redis://', 'rediss://')) else socketio.KombuManager
+        options = {'client_manager': manager_class(url, channel='flask-socketio')}
+    server = socketio.Server(async_mode='threading', **options)
+    server.manager.initialize()
+    return server
+
+def _attach_clients(server, count, room):
+    """Registra clientes simulados y cuenta los paquetes que reciben"""
+    delivered = [0]
+
+    def fake_send(*args, **kwargs):
+        delivered[0] += 1
+
+    server._send_packet = fake_send
+    server._send_eio_packet = fake_send
+    for i in range(count):
+        sid = server.manager.connect(f'eio_{os.getpid()}_{i}', '/')
+        server.manager.enter_room(sid, '/', room)
+    return delivered
+
+def _subscriber(queue_url, clients, room, expected, ready, results):
+    server = _make_server(queue_url)
+    delivered = _attach_clients(server, clients, room)
+    latencies = []
+
+    # Medir cuando termina el reparto local de cada evento recibido por la cola
+    original = server.manager._handle_emit
+
+    def timed_handle_emit(message):
+        original(message)
+        data = message['data'][0] if isinstance(message['data'], list) else message['data']
+        latencies.append(time.time() - data['sent_at'])
+
+    server.manager._handle_emit = timed_handle_emit
+    ready.set()
+
+    deadline = time.time() + 60
+    while len(latencies) < expected and time.time() < deadline:
+        time.sleep(0.01)
+    results.put({'latencies': latencies, 'delivered': delivered[0]})
+
+def run_case(queue_url, workers, clients, events, room='admin_room'):
+    """Ejecuta un caso y devuelve métricas agregadas"""
+    per_worker = max(1, clients // workers)
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    readies = []
+    procs = []
+    for _ in range(workers):
+        ready = ctx.Event()
+        proc = ctx.Process(target=_subscriber, args=(queue_url, per_worker, room, events, ready, results))
+        proc.start()
+        readies.append(ready)
+        procs.append(proc)
+    for ready in readies:
+        ready.wait(30)
+    time.sleep(0.5)  # dar tiempo a que los listeners arranquen
+
+    publisher = _make_server(queue_url)
+    emit_times = []
+    start = time.time()
+    for i in range(events):
+        t0 = time.time()
+        publisher.emit('new_booking', {'booking_id': i, 'sent_at': t0}, room=room)
+        emit_times.append(time.time() - t0)
+
+    collected = [results.get(timeout=90) for _ in procs]
+    elapsed = time.time() - start
+    for proc in procs:
+        proc.terminate()
+        proc.join()
+
+    latencies = sorted(l for r in collected for l in r['latencies'])
+    delivered = sum(r['delivered'] for r in collected)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return {
+        'clients': per_worker * workers,
+        'events': events,
+        'emit_ms_mean': statistics.mean(emit_times) * 1000,
+        'latency_ms_p50': pct(0.50),
+        'latency_ms_p95': pct(0.95),
+        'latency_ms_p99': pct(0.99),
+        'delivered': delivered,
+        'delivered_per_sec': delivered / elapsed if elapsed else 0,
+        'lost': per_worker * workers * events - delivered
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue', help='URL de la cola (por defecto un SQLite temporal)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', default='10,100,1000', help='Lista de cantidades de clientes totales')
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    queue_url = args.queue
+    if not queue_url:
+        queue_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='socketio_bench_'), 'bus.db')
+
+    print(f"cola={queue_url} workers={args.workers} eventos={args.events}")
+    header = f"{'clientes':>9} {'emit ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'entregas/s':>12} {'perdidos':>9}"
+    print(header)
+    print('-' * len(header))
+    for clients in [int(c) for c in args.clients.split(',')]:
+        r = run_case(queue_url, args.workers, clients, args.events)
+        print(f"{r['clients']:>9} {r['emit_ms_mean']:>8.3f} {r['latency_ms_p50']:>8.2f} {r['latency_ms_p95']:>8.2f} "
+              f"{r['latency_ms_p99']:>8.2f} {r['delivered_per_sec']:>12.0f} {r['lost']:>9}")
+
+if __name__ == '__main__':
+    main()
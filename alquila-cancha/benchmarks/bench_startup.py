@@ -0,0 +1,61 @@
+"""Arranque en frío: tiempo desde un proceso nuevo hasta servir la primera petición
+
+Lanza varias veces `python backend/app.py --startup-report` contra una base ya
+migrada y mide el tiempo de pared de cada proceso (intérprete, imports,
+verificación del esquema y GET /). Compara la mediana contra --budget-ms y
+termina con código 1 si lo excede, para que las regresiones de arranque se
+vean antes de un despliegue.
+
+Uso:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..', 'backend'))
+
+def run_backend(script, args, env, workdir):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(BACKEND_DIR, script)] + args, cwd=workdir, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"{script} {' '.join(args)} falló:\n{result.stderr[-2000:]}")
+    return elapsed, result.stdout
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=2000, help='Objetivo para la mediana del arranque en frío')
+    parser.add_argument('--workdir', help='Directorio para la base y los logs (por defecto uno temporal)')
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='golistica_startup_'))
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(workdir, 'startup.db'))
+    run_backend('schema.py', ['upgrade'], env, workdir)
+
+    timings = []
+    report = ''
+    for _ in range(args.runs):
+        elapsed, report = run_backend('app.py', ['--startup-report'], env, workdir)
+        timings.append(elapsed * 1000)
+
+    print("Desglose de la última corrida (dentro del proceso):\n")
+    print(report)
+    median = statistics.median(timings)
+    print(f"proceso completo, {args.runs} corridas: mediana={median:.0f} ms "
+          f"min={min(timings):.0f} ms max={max(timings):.0f} ms (objetivo {args.budget_ms:.0f} ms)")
+    if median > args.budget_ms:
+        print("EXCEDE el objetivo de arranque en frío")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
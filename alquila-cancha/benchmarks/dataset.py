@@ -0,0 +1,30 @@
+"""Dataset sintético para los benchmarks
+
+Delegado en backend/seed.py (inserts por lotes con executemany dentro de una
+única transacción y PRAGMA de SQLite relajados durante la carga).
+
+Todos los usuarios sintéticos se llaman bench_user_<n> y tienen la contraseña
+BENCH_PASSWORD. Las reservas generadas caen antes de BOOKING_HORIZON, así los
+escenarios que reservan pueden usar fechas posteriores sin conflictos.
+"""
+from datetime import date
+
+BENCH_PASSWORD = 'bench123'
+BOOKING_HORIZON = date(2029, 12, 31)
+HOURS_PER_DAY = 14  # turnos de 8 a 22
+
+SCALES = {
+    'small': {'courts': 200, 'users': 1000, 'bookings': 50_000, 'audit': 50_000},
+    'medium': {'courts': 2000, 'users': 10_000, 'bookings': 500_000, 'audit': 500_000},
+    'large': {'courts': 5000, 'users': 50_000, 'bookings': 2_000_000, 'audit': 2_000_000},
+}
+
+def seed(db, scale='small', batch_size=10_000, seed_value=42, log=print):
+    """Carga el dataset de la escala indicada. Devuelve filas insertadas por tabla"""
+    # Importar aquí: seed carga los modelos y debe hacerlo en el directorio de trabajo del benchmark
+    import seed as seed_module
+
+    sizes = SCALES[scale] if isinstance(scale, str) else scale
+    return seed_module.generate(sizes, user_prefix='bench_user', password=BENCH_PASSWORD,
+                                bookings_until=BOOKING_HORIZON, seed_value=seed_value,
+                                batch_size=batch_size, log=log)
@@ -6,6 +6,8 @@ let currentUser = null;
 let bookingsData = [];
 let usersData = [];
 let courtsData = [];
+let changesCursor = null;
+let lastAdminSequence = null;
 
 // Inicializar conexión SocketIO
 socket.on('connect', () => {
@@ -14,17 +16,33 @@ socket.on('connect', () => {
     loadDashboardData();
 });
 
+// Detectar eventos perdidos en admin_room usando el número de secuencia del outbox
+function trackSequence(data) {
+    if (typeof data.sequence !== 'number') return;
+    if (lastAdminSequence !== null && data.sequence > lastAdminSequence + 1) {
+        console.warn(`Eventos perdidos en admin_room: ${lastAdminSequence + 1}-${data.sequence - 1}`);
+    }
+    lastAdminSequence = Math.max(lastAdminSequence || 0, data.sequence);
+}
+
 // Eventos de SocketIO
 socket.on('new_booking', (data) => {
+    trackSequence(data);
     showNotification(`Nueva reserva: ${data.user_name}`, 'success');
-    loadBookings();
-    updateStats();
+    syncChanges();
 });
 
 socket.on('booking_updated', (data) => {
+    trackSequence(data);
     showNotification(`Reserva actualizada: ${data.status}`, 'info');
-    loadBookings();
-    updateStats();
+    syncChanges();
+});
+
+['bulk_booking', 'booking_deleted', 'court_added'].forEach(eventName => {
+    socket.on(eventName, (data) => {
+        trackSequence(data);
+        syncChanges();
+    });
 });
 
 socket.on('notification', (data) => {
@@ -51,6 +69,14 @@ function showNotification(message, type = 'info') {
 
 // Cargar datos del dashboard
 async function loadDashboardData() {
+    // Tomar el cursor antes de la carga completa para no perder cambios intermedios
+    try {
+        const response = await fetch('/api/changes');
+        changesCursor = (await response.json()).cursor;
+    } catch (error) {
+        changesCursor = null;
+    }
+
     await Promise.all([
         loadUsers(),
         loadCourts(),
@@ -92,6 +118,53 @@ async function loadBookings() {
     }
 }
 
+// Reemplazar/eliminar filas por id con los cambios recibidos
+function applyRowChanges(rows, changed, deletedIds) {
+    const byId = new Map(rows.map(row => [row.id, row]));
+    deletedIds.forEach(id => byId.delete(id));
+    changed.forEach(row => byId.set(row.id, row));
+    return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+}
+
+// Sincronizar solo lo que cambió desde el último cursor
+async function syncChanges() {
+    if (changesCursor === null) {
+        await loadDashboardData();
+        return;
+    }
+
+    try {
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/changes?since=${changesCursor}`);
+            const data = await response.json();
+
+            if (data.reset) {
+                await loadDashboardData();
+                return;
+            }
+
+            changesCursor = data.cursor;
+            hasMore = data.has_more;
+
+            if (data.changes.bookings.length || data.deleted.bookings.length) {
+                bookingsData = applyRowChanges(bookingsData, data.changes.bookings, data.deleted.bookings);
+                renderBookingsRows(bookingsData);
+            }
+            if (data.changes.courts.length || data.deleted.courts.length) {
+                courtsData = applyRowChanges(courtsData, data.changes.courts, data.deleted.courts);
+                updateCourtsTable();
+            }
+            if ((data.changes.users.length || data.deleted.users.length) && Array.isArray(usersData)) {
+                usersData = applyRowChanges(usersData, data.changes.users, data.deleted.users);
+            }
+        }
+        updateStats();
+    } catch (error) {
+        console.error('Error al sincronizar cambios:', error);
+    }
+}
+
 // Actualizar estadísticas
 function updateStats() {
     document.getElementById('total-users').textContent = usersData.length;
@@ -183,14 +256,22 @@ function updateBookingsTable() {
     `).join('');
 }
 
+// Encabezados del PUT: If-Match con la versión mostrada, para no pisar cambios de otro usuario
+function ifMatchHeaders(row) {
+    const headers = { 'Content-Type': 'application/json' };
+    if (row && row.version !== undefined) {
+        headers['If-Match'] = `"v${row.version}"`;
+    }
+    return headers;
+}
+
 // Actualizar estado de reserva
 async function updateBookingStatus(bookingId, status) {
     try {
+        const booking = bookingsData.find(b => b.id === bookingId);
         const response = await fetch(`/api/bookings/${bookingId}`, {
             method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json',
-            },
+            headers: ifMatchHeaders(booking),
             body: JSON.stringify({ status })
         });
         
@@ -198,6 +279,11 @@ async function updateBookingStatus(bookingId, status) {
         
         if (result.success) {
             showNotification('Reserva actualizada correctamente', 'success');
+            if (booking) booking.version = result.version;
+        } else if (response.status === 412) {
+            // Otro usuario la modificó: mostrar el estado vigente
+            showNotification(result.message, 'warning');
+            loadBookings();
         } else {
             showNotification('Error al actualizar reserva', 'error');
         }
@@ -379,9 +465,7 @@ function showEditCourtModal(court) {
         try {
             const response = await fetch(`/api/courts/${court.id}`, {
                 method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
+                headers: ifMatchHeaders(court),
                 body: JSON.stringify(data)
             });
             
@@ -391,6 +475,11 @@ function showEditCourtModal(court) {
                 showNotification('Cancha actualizada correctamente', 'success');
                 modal.remove();
                 loadCourts(); // Recargar la lista de canchas
+            } else if (response.status === 412) {
+                // Otro usuario la modificó: recargar antes de volver a editar
+                showNotification(result.message, 'warning');
+                modal.remove();
+                loadCourts();
             } else {
                 showNotification(result.message || 'Error al actualizar cancha', 'error');
             }
@@ -783,38 +872,42 @@ async function loadUsers() {
 async function loadBookings() {
     try {
         const response = await fetch('/api/bookings');
-        const bookings = await response.json();
-        
-        const tbody = document.querySelector('#bookings-table tbody');
-        tbody.innerHTML = '';
-        
-        bookings.forEach(booking => {
-            const row = document.createElement('tr');
-            const statusBadge = {
-                'pending': '<span class="status-badge pending">Pendiente</span>',
-                'confirmed': '<span class="status-badge confirmed">Confirmada</span>',
-                'cancelled': '<span class="status-badge cancelled">Cancelada</span>'
-            }[booking.status] || booking.status;
-            
-            row.innerHTML = `
-                <td>${booking.id}</td>
-                <td>${booking.user_name || 'N/A'}</td>
-                <td>${booking.user_email || 'N/A'}</td>
-                <td>${booking.court_name}</td>
-                <td>${booking.date}</td>
-                <td>${booking.start_time} - ${booking.end_time}</td>
-                <td>${statusBadge}</td>
-                <td>
-                    <button class="btn btn-action btn-delete" onclick="deleteBooking(${booking.id})">Eliminar</button>
-                </td>
-            `;
-            tbody.appendChild(row);
-        });
+        bookingsData = await response.json();
+        renderBookingsRows(bookingsData);
     } catch (error) {
         console.error('Error al cargar reservas:', error);
     }
 }
 
+function renderBookingsRows(bookings) {
+    const tbody = document.querySelector('#bookings-table tbody');
+    if (!tbody) return;
+    tbody.innerHTML = '';
+    
+    bookings.forEach(booking => {
+        const row = document.createElement('tr');
+        const statusBadge = {
+            'pending': '<span class="status-badge pending">Pendiente</span>',
+            'confirmed': '<span class="status-badge confirmed">Confirmada</span>',
+            'cancelled': '<span class="status-badge cancelled">Cancelada</span>'
+        }[booking.status] || booking.status;
+        
+        row.innerHTML = `
+            <td>${booking.id}</td>
+            <td>${booking.user_name || 'N/A'}</td>
+            <td>${booking.user_email || 'N/A'}</td>
+            <td>${booking.court_name}</td>
+            <td>${booking.date}</td>
+            <td>${booking.start_time} - ${booking.end_time}</td>
+            <td>${statusBadge}</td>
+            <td>
+                <button class="btn btn-action btn-delete" onclick="deleteBooking(${booking.id})">Eliminar</button>
+            </td>
+        `;
+        tbody.appendChild(row);
+    });
+}
+
 function editUser(userId) {
     // Implementar edición de usuario
     showNotification('Función de edición de usuario en desarrollo', 'info');
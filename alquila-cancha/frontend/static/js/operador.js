@@ -6,6 +6,7 @@
 let currentUser = null;
 let bookingsData = [];
 let courtsData = [];
+let changesCursor = null;
 
 // Eventos de SocketIO comentados para evitar errores
 /*
@@ -16,14 +17,12 @@ socket.on('connect', () => {
 
 socket.on('new_booking', (data) => {
     showNotification(`Nueva reserva recibida: ${data.user_name}`, 'success');
-    loadBookings();
-    updateStats();
+    syncChanges();
 });
 
 socket.on('booking_updated', (data) => {
     showNotification(`Reserva actualizada: ${data.status}`, 'info');
-    loadBookings();
-    updateStats();
+    syncChanges();
 });
 
 socket.on('notification', (data) => {
@@ -51,6 +50,14 @@ function showNotification(message, type = 'info') {
 
 // Cargar datos del dashboard
 async function loadDashboardData() {
+    // Tomar el cursor antes de la carga completa para no perder cambios intermedios
+    try {
+        const response = await fetch('/api/changes');
+        changesCursor = (await response.json()).cursor;
+    } catch (error) {
+        changesCursor = null;
+    }
+
     await Promise.all([
         loadBookings(),
         loadCourts(),
@@ -80,6 +87,50 @@ async function loadCourts() {
     }
 }
 
+// Reemplazar/eliminar filas por id con los cambios recibidos
+function applyRowChanges(rows, changed, deletedIds) {
+    const byId = new Map(rows.map(row => [row.id, row]));
+    deletedIds.forEach(id => byId.delete(id));
+    changed.forEach(row => byId.set(row.id, row));
+    return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+}
+
+// Sincronizar solo lo que cambió desde el último cursor
+async function syncChanges() {
+    if (changesCursor === null) {
+        await loadDashboardData();
+        return;
+    }
+
+    try {
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/changes?since=${changesCursor}`);
+            const data = await response.json();
+
+            if (data.reset) {
+                await loadDashboardData();
+                return;
+            }
+
+            changesCursor = data.cursor;
+            hasMore = data.has_more;
+
+            if (data.changes.bookings.length || data.deleted.bookings.length) {
+                bookingsData = applyRowChanges(bookingsData, data.changes.bookings, data.deleted.bookings);
+                updateBookingsTable();
+            }
+            if (data.changes.courts.length || data.deleted.courts.length) {
+                courtsData = applyRowChanges(courtsData, data.changes.courts, data.deleted.courts);
+                updateCourtsGrid();
+            }
+        }
+        updateStats();
+    } catch (error) {
+        console.error('Error al sincronizar cambios:', error);
+    }
+}
+
 // Actualizar estadísticas
 function updateStats() {
     const today = new Date().toISOString().split('T')[0];
@@ -169,6 +220,7 @@ async function confirmBooking(bookingId) {
         
         if (result.success) {
             showNotification('Reserva confirmada correctamente', 'success');
+            syncChanges();
         } else {
             showNotification('Error al confirmar reserva', 'error');
         }
@@ -194,6 +246,7 @@ async function cancelBooking(bookingId) {
             
             if (result.success) {
                 showNotification('Reserva cancelada correctamente', 'success');
+                syncChanges();
             } else {
                 showNotification('Error al cancelar reserva', 'error');
             }
@@ -459,7 +512,7 @@ async function submitNewCourt(formData) {
         if (response.ok) {
             showNotification('Cancha agregada correctamente', 'success');
             closeModal();
-            loadCourts();
+            syncChanges();
         } else {
             showNotification('Error al agregar cancha', 'error');
         }
@@ -540,13 +593,10 @@ function showOperatorSection(sectionId) {
         // Cargar datos específicos de la sección
         switch(sectionId) {
             case 'dashboard':
-                loadDashboardData();
-                break;
             case 'bookings':
-                loadBookings();
-                break;
             case 'courts':
-                loadCourts();
+                // Los datos ya están cargados: traer solo lo que cambió
+                syncChanges();
                 break;
             case 'reports':
                 // No requiere carga inicial
@@ -10,6 +10,7 @@ if (window.location.pathname.includes('/user') ||
     let currentUser = null;
     let bookingsData = [];
     let courtsData = [];
+    let changesCursor = null;
     
     // Inicializar conexión SocketIO
     socket.on('connect', () => {
@@ -20,7 +21,7 @@ if (window.location.pathname.includes('/user') ||
     // Eventos de SocketIO
     socket.on('booking_updated', (data) => {
         showNotification(`Tu reserva ha sido ${data.status}`, 'info');
-        loadBookings();
+        syncChanges();
     });
     
     socket.on('notification', (data) => {
@@ -30,24 +31,76 @@ if (window.location.pathname.includes('/user') ||
     // Eventos de pagos
     socket.on('payment_successful', (data) => {
         showNotification(`¡Seña procesada correctamente! ID: ${data.transaction_id}`, 'success');
-        loadBookings();
+        syncChanges();
         loadUserPayments();
     });
     
     socket.on('payment_failed', (data) => {
         showNotification(`Pago rechazado: ${data.error}`, 'error');
-        loadBookings();
+        syncChanges();
     });
     
     socket.on('payment_error', (data) => {
         showNotification(`Error en pago: ${data.error}`, 'error');
-        loadBookings();
+        syncChanges();
     });
     
     // Unirse a sala de usuario para notificaciones personalizadas
     socket.on('connect', () => {
         socket.emit('join_user_room', {user_id: currentUser?.id});
     });
+    
+    // Disponibilidad en vivo de la cancha/fecha elegida en el formulario de reserva
+    let availabilityRoom = null;
+    let occupiedSlots = [];
+    
+    function subscribeCourtAvailability(courtId, date) {
+        if (availabilityRoom) {
+            socket.emit('leave_court_room', availabilityRoom);
+        }
+        availabilityRoom = null;
+        occupiedSlots = [];
+        renderCourtAvailability();
+        
+        if (!courtId || !date) return;
+        availabilityRoom = {court_id: parseInt(courtId), date: date};
+        socket.emit('join_court_room', availabilityRoom);
+    }
+    
+    function isCurrentAvailabilityRoom(data) {
+        return availabilityRoom &&
+            data.court_id === availabilityRoom.court_id &&
+            data.date === availabilityRoom.date;
+    }
+    
+    function renderCourtAvailability() {
+        const availability = document.getElementById('court-availability');
+        if (!availability) return;
+        
+        if (!availabilityRoom) {
+            availability.textContent = '';
+        } else if (occupiedSlots.length === 0) {
+            availability.textContent = 'Sin reservas para ese día';
+        } else {
+            availability.textContent = 'Ocupado: ' + occupiedSlots.map(slot => `${slot[0]}-${slot[1]}`).join(', ');
+        }
+    }
+    
+    socket.on('court_availability', (data) => {
+        if (!isCurrentAvailabilityRoom(data)) return;
+        occupiedSlots = data.occupied;
+        renderCourtAvailability();
+    });
+    
+    socket.on('slot_update', (data) => {
+        if (!isCurrentAvailabilityRoom(data)) return;
+        const removed = new Set(data.removed.map(slot => slot.join('-')));
+        occupiedSlots = occupiedSlots
+            .filter(slot => !removed.has(slot.join('-')))
+            .concat(data.added)
+            .sort((a, b) => a[0].localeCompare(b[0]));
+        renderCourtAvailability();
+    });
 
     // Sistema de notificaciones
     function showNotification(message, type = 'info') {
@@ -69,6 +122,14 @@ if (window.location.pathname.includes('/user') ||
 
     // Cargar datos del usuario
     async function loadUserData() {
+        // Tomar el cursor antes de la carga completa para no perder cambios intermedios
+        try {
+            const response = await fetch('/api/changes');
+            changesCursor = (await response.json()).cursor;
+        } catch (error) {
+            changesCursor = null;
+        }
+        
         await Promise.all([
             loadCurrentUser(),
             loadBookings(),
@@ -96,10 +157,7 @@ if (window.location.pathname.includes('/user') ||
             
             // Filtrar solo las reservas del usuario actual
             if (currentUser) {
-                bookingsData = allBookings.filter(booking => 
-                    booking.user_name === currentUser.username || 
-                    booking.user_email === currentUser.email
-                );
+                bookingsData = allBookings.filter(isOwnBooking);
             }
             
             updateBookingsList();
@@ -107,6 +165,56 @@ if (window.location.pathname.includes('/user') ||
             console.error('Error al cargar reservas:', error);
         }
     }
+    
+    function isOwnBooking(booking) {
+        return currentUser !== null && (
+            booking.user_name === currentUser.username || 
+            booking.user_email === currentUser.email
+        );
+    }
+    
+    // Reemplazar/eliminar filas por id con los cambios recibidos
+    function applyRowChanges(rows, changed, deletedIds) {
+        const byId = new Map(rows.map(row => [row.id, row]));
+        deletedIds.forEach(id => byId.delete(id));
+        changed.forEach(row => byId.set(row.id, row));
+        return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+    }
+    
+    // Sincronizar solo lo que cambió desde el último cursor
+    async function syncChanges() {
+        if (changesCursor === null) {
+            await loadUserData();
+            return;
+        }
+        
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const response = await fetch(`/api/changes?since=${changesCursor}`);
+                const data = await response.json();
+                
+                if (data.reset) {
+                    await loadUserData();
+                    return;
+                }
+                
+                changesCursor = data.cursor;
+                hasMore = data.has_more;
+                
+                if (data.changes.bookings.length || data.deleted.bookings.length) {
+                    bookingsData = applyRowChanges(bookingsData, data.changes.bookings.filter(isOwnBooking), data.deleted.bookings);
+                    updateBookingsList();
+                }
+                if (data.changes.courts.length || data.deleted.courts.length) {
+                    courtsData = applyRowChanges(courtsData, data.changes.courts, data.deleted.courts);
+                    updateRecommendedCourts(courtsData.slice(0, 4));
+                }
+            }
+        } catch (error) {
+            console.error('Error al sincronizar cambios:', error);
+        }
+    }
 
     // Cargar canchas recomendadas
     async function loadRecommendedCourts() {
@@ -396,7 +504,7 @@ if (window.location.pathname.includes('/user') ||
                         }
                         
                         showNotification('Pago creado con éxito. Tu reserva está confirmada.', 'success');
-                        loadBookings();
+                        syncChanges();
                         return;
                     } else if (payment.status === 'failed') {
                         // Fracaso
@@ -412,7 +520,7 @@ if (window.location.pathname.includes('/user') ||
                         }
                         
                         showNotification('Pago rechazado. Tu reserva ha sido cancelada.', 'error');
-                        loadBookings();
+                        syncChanges();
                         return;
                     }
                 }
@@ -486,6 +594,7 @@ if (window.location.pathname.includes('/user') ||
                     <div class="form-group">
                         <label>Fecha</label>
                         <input type="date" name="date" required>
+                        <small id="court-availability"></small>
                     </div>
                     <div class="form-group">
                         <label>Hora inicio</label>
@@ -505,6 +614,14 @@ if (window.location.pathname.includes('/user') ||
         
         document.body.appendChild(modal);
         
+        // Suscribirse a la disponibilidad al elegir cancha y fecha
+        const bookingForm = document.getElementById('new-booking-form');
+        bookingForm.addEventListener('change', (e) => {
+            if (e.target.name === 'court_id' || e.target.name === 'date') {
+                subscribeCourtAvailability(bookingForm.elements.court_id.value, bookingForm.elements.date.value);
+            }
+        });
+        
         // Manejar envío del formulario
         document.getElementById('new-booking-form').addEventListener('submit', async (e) => {
             e.preventDefault();
@@ -537,7 +654,7 @@ if (window.location.pathname.includes('/user') ||
                 // Usar la función global showNotification
                 window.showNotification('Reserva creada con éxito', 'success');
                 closeModal();
-                loadBookings();
+                syncChanges();
             } else {
                 window.showNotification(result.message, 'error');
             }
@@ -575,7 +692,7 @@ if (window.location.pathname.includes('/user') ||
                 
                 if (result.success) {
                     showNotification('Reserva cancelada correctamente', 'success');
-                    loadBookings();
+                    syncChanges();
                 } else {
                     showNotification('Error al cancelar reserva', 'error');
                 }
@@ -844,11 +961,11 @@ async function submitDepositPayment(bookingId, paymentMethod) {
             if (result.payment_status === 'completed') {
                 console.log('DEBUG - Mostrando notificación de éxito');
                 showNotification('Pago creado con éxito. Tu reserva está confirmada.', 'success');
-                if (typeof loadBookings === 'function') loadBookings();
+                if (typeof syncChanges === 'function') syncChanges();
             } else if (result.payment_status === 'failed') {
                 console.log('DEBUG - Mostrando notificación de error');
                 showNotification('Pago rechazado. Tu reserva ha sido cancelada.', 'error');
-                if (typeof loadBookings === 'function') loadBookings();
+                if (typeof syncChanges === 'function') syncChanges();
             } else {
                 console.log('DEBUG - Estado desconocido:', result.payment_status);
                 showNotification('Estado de pago desconocido', 'warning');
@@ -917,7 +1034,7 @@ async function checkPaymentStatus(paymentId) {
                     }
                     
                     showNotification('Pago creado con éxito. Tu reserva está confirmada.', 'success');
-                    if (typeof loadBookings === 'function') loadBookings();
+                    if (typeof syncChanges === 'function') syncChanges();
                     return;
                 } else if (payment.status === 'failed') {
                     // Fracaso
@@ -933,7 +1050,7 @@ async function checkPaymentStatus(paymentId) {
                     }
                     
                     showNotification('Pago rechazado. Tu reserva ha sido cancelada.', 'error');
-                    if (typeof loadBookings === 'function') loadBookings();
+                    if (typeof syncChanges === 'function') syncChanges();
                     return;
                 }
             }